@@ -0,0 +1,163 @@
+"""
+Audit log retention: archive expired rows to gzip NDJSON, then delete them.
+
+Rows are read with a keyset scan on (created_at, id) in `chunk_size` pieces,
+so memory stays flat however many rows expire. They go into archive parts of
+at most `rows_per_file` rows. A part is written to a temporary name, fsynced
+and renamed, and only then are its rows deleted, `delete_batch_size` ids per
+statement and each in its own short transaction. An interrupted run leaves
+either a complete part whose rows still exist (re-archived next run) or
+nothing.
+
+    <archive_dir>/<org slug>/audit-<first created_at>-<first id>.ndjson.gz
+
+Each line is one entry (see `_row`); `iter_archive` streams a part back.
+"""
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.audit.models import AuditLog
+
+FIELDS = ("id", "org_id", "actor_id", "actor__email", "action", "flag_key", "env_key", "metadata", "created_at")
+
+
+def retention_days(org):
+    days = org.audit_retention_days if org is not None else None
+    return settings.AUDIT_RETENTION_DAYS if days is None else days
+
+
+def cutoff_for(org, now=None):
+    """Entries older than this are expired; None when the org keeps everything."""
+    days = retention_days(org)
+    if not days:
+        return None
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def expired(org, cutoff):
+    qs = AuditLog.objects.filter(created_at__lt=cutoff)
+    return qs.filter(org=org) if org is not None else qs.filter(org__isnull=True)
+
+
+def _row(values):
+    return {
+        "id": values["id"],
+        "org_id": values["org_id"],
+        "actor_id": values["actor_id"],
+        # the actor row may be gone by the time anyone reads the archive
+        "actor_email": values["actor__email"],
+        "action": values["action"],
+        "flag_key": values["flag_key"],
+        "env_key": values["env_key"],
+        "metadata": values["metadata"],
+        "created_at": values["created_at"].isoformat(),
+    }
+
+
+def _chunks(qs, chunk_size):
+    last = None
+    while True:
+        page = qs
+        if last is not None:
+            page = page.filter(created_at__gte=last[0]).exclude(created_at=last[0], id__lte=last[1])
+        rows = list(page.order_by("created_at", "id").values(*FIELDS)[:chunk_size])
+        if not rows:
+            return
+        yield rows
+        last = (rows[-1]["created_at"], rows[-1]["id"])
+
+
+def _delete(ids, batch_size, pause):
+    deleted = 0
+    for i in range(0, len(ids), batch_size):
+        deleted += AuditLog.objects.filter(id__in=ids[i:i + batch_size]).delete()[0]
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+class _Part:
+    def __init__(self, directory, first):
+        stamp = first["created_at"].strftime("%Y%m%dT%H%M%S")
+        self.path = os.path.join(directory, f"audit-{stamp}-{first['id']}.ndjson.gz")
+        self._tmp = self.path + ".tmp"
+        self._raw = open(self._tmp, "wb")
+        self._gz = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        self.ids = []
+
+    def write(self, rows):
+        self._gz.write("".join(json.dumps(_row(r), separators=(",", ":")) + "\n" for r in rows).encode())
+        self.ids.extend(r["id"] for r in rows)
+
+    def commit(self):
+        self._gz.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        os.replace(self._tmp, self.path)
+
+
+def archive_and_prune(org, cutoff, archive_dir, chunk_size=2000, rows_per_file=100_000,
+                      delete_batch_size=1000, pause=0.0):
+    """
+    Archive then delete `org`'s entries older than `cutoff` (org=None handles
+    entries detached from a deleted org). Returns (archived, deleted, paths).
+    """
+    directory = os.path.join(archive_dir, org.slug if org is not None else "_detached")
+    os.makedirs(directory, exist_ok=True)
+    archived = deleted = 0
+    paths = []
+    part = None
+    for rows in _chunks(expired(org, cutoff), chunk_size):
+        if part is None:
+            part = _Part(directory, rows[0])
+        part.write(rows)
+        archived += len(rows)
+        if len(part.ids) >= rows_per_file:
+            part.commit()
+            paths.append(part.path)
+            deleted += _delete(part.ids, delete_batch_size, pause)
+            part = None
+    if part is not None:
+        part.commit()
+        paths.append(part.path)
+        deleted += _delete(part.ids, delete_batch_size, pause)
+    return archived, deleted, paths
+
+
+def iter_archive(path, action=None, actor=None, flag=None, env=None, since=None, until=None):
+    """
+    Stream entries from an archive part, optionally filtered like /api/audit/.
+    Naive `since`/`until` are taken to be in the current time zone.
+    """
+    if since and timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    if until and timezone.is_naive(until):
+        until = timezone.make_aware(until)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if action and entry["action"] not in action:
+                continue
+            if actor is not None and entry["actor_id"] != actor:
+                continue
+            if flag and entry["flag_key"] != flag:
+                continue
+            if env and entry["env_key"] != env:
+                continue
+            if since or until:
+                created_at = parse_datetime(entry["created_at"])
+                if since and created_at < since:
+                    continue
+                if until and created_at >= until:
+                    continue
+            yield entry
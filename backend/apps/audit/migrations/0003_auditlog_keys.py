@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audit", "0002_auditlog_created_at_default"),
+        ("core", "0002_environment_config_version"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="auditlog",
+            options={"ordering": ["-created_at", "-id"]},
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="env_key",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+        migrations.AddField(
+            model_name="auditlog",
+            name="flag_key",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
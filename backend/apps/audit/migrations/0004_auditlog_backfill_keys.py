@@ -0,0 +1,40 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 2000
+
+
+def backfill_keys(apps, schema_editor):
+    # Keyset batches, each in its own short transaction (the migration is not
+    # atomic): on a large audit table no lock is held for the whole backfill,
+    # and an interrupted run can simply be started again.
+    AuditLog = apps.get_model("audit", "AuditLog")
+    db = schema_editor.connection.alias
+    rows = AuditLog.objects.using(db).only("id", "metadata").order_by("id")
+    last_id = 0
+    while True:
+        with transaction.atomic(using=db):
+            batch = list(rows.filter(id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            changed = []
+            for log in batch:
+                meta = log.metadata if isinstance(log.metadata, dict) else {}
+                log.flag_key = str(meta.get("flag") or "")[:64]
+                log.env_key = str(meta.get("env") or "")[:64]
+                if log.flag_key or log.env_key:
+                    changed.append(log)
+            AuditLog.objects.using(db).bulk_update(changed, ["flag_key", "env_key"])
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("audit", "0003_auditlog_keys"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexOnline(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL, so writes to the audit log are
+    not blocked while an index builds; a plain CREATE INDEX elsewhere (SQLite
+    in development and tests has no concurrent build).
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ("audit", "0004_auditlog_backfill_keys"),
+    ]
+
+    operations = [
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["created_at", "id"], name="audit_created_idx"),
+        ),
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["org", "created_at", "id"], name="audit_org_created_idx"),
+        ),
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["org", "action", "created_at", "id"], name="audit_org_action_idx"),
+        ),
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["org", "actor", "created_at", "id"], name="audit_org_actor_idx"),
+        ),
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["org", "flag_key", "created_at", "id"], name="audit_org_flag_idx"),
+        ),
+        AddIndexOnline(
+            model_name="auditlog",
+            index=models.Index(fields=["org", "env_key", "created_at", "id"], name="audit_org_env_idx"),
+        ),
+    ]
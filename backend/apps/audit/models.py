@@ -1,16 +1,30 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from apps.core.models import Organization
 
 class AuditLog(models.Model):
     org = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="audit_logs", null=True, blank=True)
     actor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
     action = models.CharField(max_length=100)
+    # Copied from metadata["flag"] / metadata["env"] so they can be filtered by index
+    flag_key = models.CharField(max_length=64, blank=True, default="")
+    env_key = models.CharField(max_length=64, blank=True, default="")
     metadata = models.JSONField(default=dict)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the action happens, not when the batched writer flushes it.
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        ordering = ["-created_at"]
+        ordering = ["-created_at", "-id"]
+        # Every listing is a keyset scan on (created_at, id), usually within one org
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="audit_created_idx"),
+            models.Index(fields=["org", "created_at", "id"], name="audit_org_created_idx"),
+            models.Index(fields=["org", "action", "created_at", "id"], name="audit_org_action_idx"),
+            models.Index(fields=["org", "actor", "created_at", "id"], name="audit_org_actor_idx"),
+            models.Index(fields=["org", "flag_key", "created_at", "id"], name="audit_org_flag_idx"),
+            models.Index(fields=["org", "env_key", "created_at", "id"], name="audit_org_env_idx"),
+        ]
 
     def __str__(self):
         return f"{self.action} ({self.created_at})"
@@ -7,4 +7,6 @@ class AuditLogSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = AuditLog
-        fields = ["id", "org", "actor", "actor_email", "actor_full_name", "action", "metadata", "created_at"]
+        fields = [
+            "id", "org", "actor", "actor_email", "actor_full_name", "action", "flag_key", "env_key", "metadata", "created_at",
+        ]
@@ -1,5 +1,11 @@
-from apps.audit.models import AuditLog
+from django.conf import settings
+
+from apps.audit.writer import make_entry, write_entries, writer
 
 def audit(actor, org, action, metadata=None):
     metadata = metadata or {}
-    AuditLog.objects.create(actor=actor, org=org, action=action, metadata=metadata)
+    entry = make_entry(actor, org, action, metadata)
+    if settings.AUDIT_WRITER_MODE == "sync":
+        write_entries([entry])
+    else:
+        writer.submit(entry)
@@ -0,0 +1,254 @@
+import importlib
+import io
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.audit.archive import iter_archive
+from apps.audit.models import AuditLog
+from apps.audit.services import audit
+from apps.audit.writer import AuditWriter, make_entry
+from apps.core.models import Membership, Organization
+
+
+class AuditWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("audit@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Acme")
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spill_path = Path(tmp.name) / "spill.ndjson"
+
+    def test_sync_mode_writes_inline(self):
+        with override_settings(AUDIT_WRITER_MODE="sync"):
+            audit(self.user, self.org, "flag.create", {"flag": "a"})
+        self.assertEqual(AuditLog.objects.get().metadata, {"flag": "a"})
+
+    def test_flush_writes_one_batch(self):
+        # Exercise the queue without the background thread (it would use its
+        # own connection, outside the test transaction).
+        w = AuditWriter(batch_size=100, flush_interval=1, queue_size=10, spill_path=self.spill_path)
+        for i in range(5):
+            w._queue.put_nowait(make_entry(self.user, self.org, "flag.update", {"i": i}))
+        with self.assertNumQueries(3):  # org + actor existence, one INSERT
+            w.flush()
+        self.assertEqual(AuditLog.objects.count(), 5)
+        self.assertEqual(w.stats()["written"], 5)
+
+    def test_overflow_spills_and_replays(self):
+        w = AuditWriter(batch_size=100, flush_interval=1, queue_size=1, spill_path=self.spill_path)
+        w._queue.put_nowait(make_entry(self.user, self.org, "flag.update", {}))
+        w._ensure_started = lambda: None
+        with self.captureOnCommitCallbacks(execute=True):
+            w.submit(make_entry(self.user, self.org, "flag.delete", {"flag": "b"}))
+        self.assertEqual(w.stats()["spilled"], 1)
+        self.assertEqual(AuditLog.objects.count(), 0)
+
+        self.assertEqual(w.replay_spill(), 1)
+        self.assertFalse(self.spill_path.exists())
+        self.assertEqual(AuditLog.objects.get().action, "flag.delete")
+
+    @override_settings(AUDIT_WRITER_MODE="async")
+    def test_queued_only_when_the_transaction_commits(self):
+        w = AuditWriter(spill_path=self.spill_path)
+        w._ensure_started = lambda: None
+        with mock.patch("apps.audit.services.writer", w):
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertRaises(ValueError), transaction.atomic():
+                    audit(self.user, self.org, "flag.delete", {"flag": "a"})
+                    raise ValueError("rolled back")
+            self.assertEqual(w.stats()["queued"], 0)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                audit(self.user, self.org, "flag.delete", {"flag": "b"})
+                self.assertEqual(w.stats()["queued"], 0)
+            self.assertEqual(w.stats()["queued"], 1)
+
+    def test_invalid_spill_lines_are_set_aside(self):
+        w = AuditWriter(batch_size=2, spill_path=self.spill_path)
+        w._spill([make_entry(self.user, self.org, "flag.update", {"i": i}) for i in range(3)])
+        good = self.spill_path.read_text().splitlines(keepends=True)
+        bad = ['{"truncated": \n', '{"action": "flag.update"}\n', json.dumps({**json.loads(good[0]), "created_at": "yesterday"}) + "\n"]
+        self.spill_path.write_text("".join([good[0], bad[0], good[1], bad[1], bad[2], good[2]]))
+
+        with self.assertLogs("apps.audit.writer", "ERROR") as logs:
+            self.assertEqual(w.replay_spill(), 3)
+        self.assertEqual(len(logs.records), 3)
+        self.assertEqual(sorted(AuditLog.objects.values_list("metadata__i", flat=True)), [0, 1, 2])
+        self.assertFalse(self.spill_path.exists())
+        self.assertEqual(Path(f"{self.spill_path}.rejected").read_text(), "".join(bad))
+        self.assertEqual(w.stats()["rejected"], 3)
+
+    def test_missing_org_is_detached(self):
+        w = AuditWriter(spill_path=self.spill_path)
+        gone = Organization.objects.create(name="Gone")
+        w._queue.put_nowait(make_entry(self.user, gone, "org.delete", {"org_id": gone.id}))
+        gone.delete()
+        w.flush()
+        self.assertIsNone(AuditLog.objects.get().org_id)
+
+
+class AuditLogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Acme")
+        other = Organization.objects.create(name="Other")
+        Membership.objects.create(org=cls.org, user=cls.user, role="viewer")
+        t0 = timezone.now()
+        # Ties on created_at are broken by id, so pages must neither skip nor repeat.
+        AuditLog.objects.bulk_create(
+            AuditLog(
+                org=cls.org, actor=cls.user if i % 2 else None,
+                action="flagstate.toggle" if i % 3 else "rule.update",
+                flag_key=f"flag-{i % 4}", env_key="prod" if i % 5 else "dev",
+                metadata={}, created_at=t0 - timedelta(minutes=i // 3),
+            )
+            for i in range(120)
+        )
+        AuditLog.objects.create(org=other, action="flag.create")
+        cls.t0 = t0
+
+    def setUp(self):
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, params):
+        ids, url = [], "/api/audit/"
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [row["id"] for row in response.data["results"]]
+            url, params = response.data["next"], None
+        return ids
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        ids = self.walk({"limit": 7})
+        expected = list(AuditLog.objects.filter(org=self.org).order_by("-created_at", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_page_cost_is_constant(self):
+        first = self.client.get("/api/audit/", {"limit": 10})
+        with self.assertNumQueries(2):  # role map, page
+            self.client.get("/api/audit/", {"limit": 10, "cursor": first.data["cursor"]})
+
+    def test_filters(self):
+        qs = AuditLog.objects.filter(org=self.org)
+        cases = [
+            ({"action": "rule.update"}, qs.filter(action="rule.update")),
+            ({"action": "rule.update,flag.create"}, qs.filter(action="rule.update")),
+            ({"actor": self.user.id}, qs.filter(actor=self.user)),
+            ({"flag": "flag-1", "env": "dev"}, qs.filter(flag_key="flag-1", env_key="dev")),
+            (
+                {"since": (self.t0 - timedelta(minutes=10)).isoformat(), "until": (self.t0 - timedelta(minutes=2)).isoformat()},
+                qs.filter(created_at__gte=self.t0 - timedelta(minutes=10), created_at__lt=self.t0 - timedelta(minutes=2)),
+            ),
+        ]
+        for params, expected in cases:
+            with self.subTest(params=params):
+                ids = self.walk({**params, "limit": 9})
+                self.assertEqual(sorted(ids), sorted(expected.values_list("id", flat=True)))
+
+    def test_bad_params_are_rejected(self):
+        for params in ({"cursor": "nope"}, {"since": "yesterday"}, {"actor": "me"}, {"limit": "x"}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get("/api/audit/", params).status_code, 400)
+
+    def test_keys_are_extracted_from_metadata(self):
+        with override_settings(AUDIT_WRITER_MODE="sync"):
+            audit(self.user, self.org, "flagstate.toggle", {"flag": "checkout", "env": "staging"})
+        response = self.client.get("/api/audit/", {"flag": "checkout", "env": "staging"})
+        self.assertEqual([r["action"] for r in response.data["results"]], ["flagstate.toggle"])
+
+
+class RetentionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.now = now = timezone.now()
+        cls.short = Organization.objects.create(name="Short", audit_retention_days=30)
+        cls.forever = Organization.objects.create(name="Forever", audit_retention_days=0)
+        for org in (cls.short, cls.forever):
+            AuditLog.objects.bulk_create(
+                AuditLog(org=org, action="flag.update", flag_key=f"f{i % 3}", created_at=now - timedelta(days=i))
+                for i in range(100)
+            )
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.archive_dir = tmp.name
+
+    def test_archives_then_deletes_expired_entries(self):
+        out = io.StringIO()
+        call_command(
+            "prune_audit_logs", archive_dir=self.archive_dir, chunk_size=7, rows_per_file=25,
+            delete_batch_size=4, stdout=out,
+        )
+        kept = AuditLog.objects.filter(org=self.short)
+        self.assertEqual(kept.count(), 30)  # days 0..29
+        self.assertEqual(AuditLog.objects.filter(org=self.forever).count(), 100)
+
+        paths = sorted(Path(self.archive_dir, self.short.slug).glob("*.ndjson.gz"))
+        self.assertEqual(len(paths), 3)  # 70 rows in parts of 25
+        entries = [e for p in paths for e in iter_archive(p)]
+        self.assertEqual(len(entries), 70)
+        self.assertEqual(len({e["id"] for e in entries}), 70)
+        self.assertFalse(kept.filter(id__in=[e["id"] for e in entries]).exists())
+        self.assertEqual(len([e for p in paths for e in iter_archive(p, flag="f1")]), 23)
+
+    def test_read_archive_with_naive_bounds(self):
+        call_command("prune_audit_logs", archive_dir=self.archive_dir, stdout=io.StringIO())
+        paths = sorted(str(p) for p in Path(self.archive_dir, self.short.slug).glob("*.ndjson.gz"))
+        since = (self.now - timedelta(days=60)).date()
+        until = (self.now - timedelta(days=40)).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+        aware = [timezone.make_aware(datetime.combine(since, time())), timezone.make_aware(until)]
+        expected = sum(1 for i in range(30, 100) if aware[0] <= self.now - timedelta(days=i) < aware[1])
+        self.assertEqual(expected, 20)
+
+        out = io.StringIO()
+        call_command(
+            "read_audit_archive", *paths, "--since", since.isoformat(), "--until", until.strftime("%Y-%m-%dT%H:%M"),
+            stdout=out,
+        )
+        self.assertEqual(len(out.getvalue().splitlines()), expected)
+        naive = [datetime.combine(since, time()), until]
+        self.assertEqual(len([e for p in paths for e in iter_archive(p, since=naive[0], until=naive[1])]), expected)
+
+    def test_dry_run_changes_nothing(self):
+        out = io.StringIO()
+        call_command("prune_audit_logs", archive_dir=self.archive_dir, dry_run=True, stdout=out)
+        self.assertIn("would prune 70", out.getvalue())
+        self.assertEqual(AuditLog.objects.count(), 200)
+        self.assertEqual(list(Path(self.archive_dir).iterdir()), [])
+
+
+class AuditMigrationTests(TestCase):
+    def test_backfill_keys_in_batches(self):
+        org = Organization.objects.create(name="Old")
+        metas = [{"flag": "f1", "env": "prod"}, {"flag": "f2"}, {}, ["legacy"], {"env": "e" * 80}] * 3
+        AuditLog.objects.bulk_create(AuditLog(org=org, action="flag.update", metadata=m) for m in metas)
+        migration = importlib.import_module("apps.audit.migrations.0004_auditlog_backfill_keys")
+        schema_editor = type("SchemaEditor", (), {"connection": connection})()
+        with mock.patch.object(migration, "BATCH_SIZE", 4), CaptureQueriesContext(connection) as ctx:
+            migration.backfill_keys(apps, schema_editor)
+        selects = [q for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 5)  # 15 rows in batches of 4, then an empty batch
+        keys = list(AuditLog.objects.order_by("id").values_list("flag_key", "env_key"))
+        self.assertEqual(keys, [("f1", "prod"), ("f2", ""), ("", ""), ("", ""), ("", "e" * 64)] * 3)
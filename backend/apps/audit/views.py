@@ -1,18 +1,71 @@
+from django.utils.dateparse import parse_datetime
 from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from rest_framework.response import Response
 from apps.audit.models import AuditLog
+from apps.audit.pagination import KeysetPagination
 from apps.audit.serializers import AuditLogSerializer
+from apps.audit.writer import writer as audit_writer
+from apps.core.permissions import member_org_ids
+
+
+def _datetime_param(params, name):
+    raw = params.get(name)
+    if not raw:
+        return None
+    value = parse_datetime(raw)
+    if value is None:
+        raise ValidationError({name: "Expected an ISO 8601 datetime."})
+    return value
+
 
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    GET /api/audit/?org_id=&action=&actor=&flag=&env=&since=&until=&limit=&cursor=
+
+    Newest first, keyset-paginated: follow `next` (or pass `cursor`) for the
+    following page. `action` takes a comma-separated list; `since` is
+    inclusive and `until` exclusive.
+    """
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
-        qs = AuditLog.objects.all()
+        params = self.request.query_params
+        qs = AuditLog.objects.select_related("actor")
         if not user.is_superuser:
-            qs = qs.filter(org__memberships__user=user).distinct()
-        org_id = self.request.query_params.get("org_id")
+            qs = qs.filter(org_id__in=member_org_ids(self.request))
+        org_id = params.get("org_id")
         if org_id:
             qs = qs.filter(org_id=org_id)
+
+        actions = [a for a in params.get("action", "").split(",") if a]
+        if len(actions) == 1:
+            qs = qs.filter(action=actions[0])
+        elif actions:
+            qs = qs.filter(action__in=actions)
+        actor = params.get("actor")
+        if actor:
+            if not actor.isdigit():
+                raise ValidationError({"actor": "Expected a user id."})
+            qs = qs.filter(actor_id=actor)
+        if params.get("flag"):
+            qs = qs.filter(flag_key=params["flag"])
+        if params.get("env"):
+            qs = qs.filter(env_key=params["env"])
+        since = _datetime_param(params, "since")
+        if since:
+            qs = qs.filter(created_at__gte=since)
+        until = _datetime_param(params, "until")
+        if until:
+            qs = qs.filter(created_at__lt=until)
         return qs
+
+    # GET /api/audit/writer/ -> queued / written / spilled / dropped counts (this worker)
+    @action(detail=False, methods=["get"], permission_classes=[IsAdminUser])
+    def writer(self, request):
+        return Response(audit_writer.stats())
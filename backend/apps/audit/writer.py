@@ -0,0 +1,281 @@
+"""
+Batched, asynchronous audit log writer.
+
+`audit()` puts entries on an in-process queue and returns; inside a
+transaction, once it commits, so a rolled-back change leaves no audit entry
+(as with a sync write). A daemon thread drains the queue and writes with a single bulk_create once AUDIT_BATCH_SIZE
+entries are waiting or AUDIT_FLUSH_INTERVAL seconds have passed, so the
+request that performed the action never waits on the audit insert.
+
+Nothing is silently lost:
+- entries that do not fit in the queue (AUDIT_QUEUE_SIZE) and batches the
+  database rejects are appended to AUDIT_SPILL_PATH as NDJSON, and are
+  replayed by the next writer thread to start (or `replay_audit_spill`);
+- the queue is flushed at interpreter exit.
+Only entries that cannot even be spilled are dropped, and counted. Spill
+lines that are not valid entries are moved to AUDIT_SPILL_PATH.rejected
+rather than retried on every replay.
+
+AUDIT_WRITER_MODE=sync writes inline (tests, scripts, debugging).
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.core import metrics
+
+log = logging.getLogger(__name__)
+
+
+def make_entry(actor, org, action, metadata):
+    return {
+        "actor_id": getattr(actor, "pk", None),
+        "org_id": getattr(org, "pk", None),
+        "action": action,
+        "flag_key": str(metadata.get("flag") or "")[:64],
+        "env_key": str(metadata.get("env") or "")[:64],
+        "metadata": metadata,
+        "created_at": timezone.now(),
+    }
+
+
+def write_entries(entries):
+    """bulk_create entries (dicts from make_entry) in one INSERT."""
+    from django.contrib.auth import get_user_model
+
+    from apps.audit.models import AuditLog
+    from apps.core.models import Organization
+
+    # The org or actor may be gone by flush time ("org.delete" is audited just
+    # before the delete). Keep the entry, detached, like SET_NULL would.
+    org_ids = {e["org_id"] for e in entries if e["org_id"] is not None}
+    actor_ids = {e["actor_id"] for e in entries if e["actor_id"] is not None}
+    if org_ids:
+        org_ids = set(Organization.objects.filter(id__in=org_ids).values_list("id", flat=True))
+    if actor_ids:
+        actor_ids = set(get_user_model().objects.filter(id__in=actor_ids).values_list("id", flat=True))
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            org_id=e["org_id"] if e["org_id"] in org_ids else None,
+            actor_id=e["actor_id"] if e["actor_id"] in actor_ids else None,
+            action=e["action"],
+            flag_key=e["flag_key"],
+            env_key=e["env_key"],
+            metadata=e["metadata"],
+            created_at=e["created_at"],
+        )
+        for e in entries
+    ])
+
+
+def _dump(entry):
+    return json.dumps({**entry, "created_at": entry["created_at"].isoformat()}, default=str)
+
+
+ENTRY_KEYS = frozenset(("actor_id", "org_id", "action", "flag_key", "env_key", "metadata", "created_at"))
+
+
+def _load(line):
+    """The entry _dump wrote; ValueError if `line` is not one."""
+    entry = json.loads(line)
+    if not isinstance(entry, dict) or not ENTRY_KEYS <= entry.keys():
+        raise ValueError("not an audit entry")
+    created_at = entry["created_at"]
+    entry["created_at"] = parse_datetime(created_at) if isinstance(created_at, str) else None
+    if entry["created_at"] is None:
+        raise ValueError(f"invalid created_at {created_at!r}")
+    return entry
+
+
+class AuditWriter:
+    def __init__(self, batch_size=None, flush_interval=None, queue_size=None, spill_path=None):
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.AUDIT_FLUSH_INTERVAL
+        self.spill_path = str(spill_path or settings.AUDIT_SPILL_PATH)
+        self._queue = queue.Queue(maxsize=queue_size or settings.AUDIT_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed_flushes = 0
+
+    # --- producer side -----------------------------------------------------------
+
+    def submit(self, entry):
+        """Queue `entry` once the current transaction commits (now, outside one)."""
+        transaction.on_commit(lambda: self._enqueue(entry))
+
+    def _enqueue(self, entry):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self._spill([entry])
+
+    def _ensure_started(self):
+        # Threads do not survive fork: a pre-forked worker starts its own.
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self._queue.maxsize)
+                atexit.register(self.close)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+            self._thread.start()
+
+    # --- consumer side -----------------------------------------------------------
+
+    def _run(self):
+        try:
+            self.replay_spill()
+            while not self._stop.is_set():
+                batch = self._take(block=True)
+                if batch:
+                    self._write(batch)
+        finally:
+            connection.close()
+
+    def _take(self, block):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            write_entries(batch)
+        except Exception:
+            log.exception("audit flush of %d entries failed; spilling to %s", len(batch), self.spill_path)
+            self.failed_flushes += 1
+            self._spill(batch)
+        else:
+            self.written += len(batch)
+
+    def flush(self):
+        """Write everything queued so far from the calling thread."""
+        while True:
+            batch = self._take(block=False)
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    # --- spill file --------------------------------------------------------------
+
+    def _spill(self, entries):
+        try:
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                f.write("".join(_dump(e) + "\n" for e in entries))
+        except OSError:
+            log.exception("audit spill to %s failed; dropping %d entries", self.spill_path, len(entries))
+            self.dropped += len(entries)
+        else:
+            self.spilled += len(entries)
+
+    def replay_spill(self):
+        """
+        Insert entries left in the spill file. The file is renamed first, so
+        concurrent workers never replay the same entries twice. Lines that
+        are not entries are logged and moved to <spill path>.rejected.
+        Returns the number of entries written.
+        """
+        claimed = f"{self.spill_path}.{os.getpid()}.replay"
+        try:
+            os.replace(self.spill_path, claimed)
+        except FileNotFoundError:
+            return 0
+        written = 0
+        done = 0  # leading non-empty lines written or rejected
+        rejected = set()
+        try:
+            with open(claimed, encoding="utf-8") as f:
+                batch = []
+                for i, line in enumerate(filter(str.strip, f)):
+                    try:
+                        batch.append(_load(line))
+                    except ValueError as e:
+                        log.error("audit spill entry %d is invalid (%s); moving it to %s.rejected",
+                                  i + 1, e, self.spill_path)
+                        self._reject(line)
+                        rejected.add(i)
+                    if len(batch) >= self.batch_size:
+                        write_entries(batch)
+                        written += len(batch)
+                        batch = []
+                        done = i + 1
+                if batch:
+                    write_entries(batch)
+                    written += len(batch)
+        except Exception:
+            # Put the unwritten tail back for the next attempt.
+            log.exception("audit spill replay failed after %d entries", written)
+            with open(claimed, encoding="utf-8") as f:
+                rest = [line for i, line in enumerate(filter(str.strip, f)) if i >= done and i not in rejected]
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                f.writelines(rest)
+        os.remove(claimed)
+        self.written += written
+        return written
+
+    def _reject(self, line):
+        with open(f"{self.spill_path}.rejected", "a", encoding="utf-8") as f:
+            f.write(line if line.endswith("\n") else line + "\n")
+        self.rejected += 1
+
+    def stats(self):
+        return {
+            "mode": settings.AUDIT_WRITER_MODE,
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed_flushes": self.failed_flushes,
+        }
+
+
+writer = AuditWriter()
+
+metrics.Gauge(
+    "flagship_audit_writer_queued", "Audit entries waiting in this worker's queue.",
+    lambda: [((), writer._queue.qsize())],
+)
+metrics.Gauge(
+    "flagship_audit_writer_entries_total", "Audit entries handled by this worker's writer, by outcome.",
+    lambda: [((outcome,), getattr(writer, outcome)) for outcome in ("written", "spilled", "dropped", "rejected")],
+    labelnames=("outcome",), kind="counter",
+)
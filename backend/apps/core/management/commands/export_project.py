@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from apps.core.management.commands.import_flags import get_project
+from apps.flags.snapshot import CHUNK_SIZE, export_project
+
+
+class Command(BaseCommand):
+    help = "Write a project's flags, per-environment states and rules as an NDJSON snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("project", help="Project id or <org slug>/<project key>")
+        parser.add_argument("-o", "--output", default="-", help="File to write (default: stdout)")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Flags read per query")
+
+    def handle(self, *args, **options):
+        project = get_project(options["project"])
+        out = sys.stdout if options["output"] == "-" else open(options["output"], "w", encoding="utf-8")
+        try:
+            for line in export_project(project, chunk_size=options["chunk_size"]):
+                out.write(line)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,87 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Project
+from apps.flags.bulk import import_flags
+from apps.flags.serializers import BulkFlagImportSerializer
+
+MAX_ERRORS_SHOWN = 20
+
+
+def get_project(ref):
+    """Project by id or "<org slug>/<project key>"."""
+    qs = Project.objects.select_related("org")
+    if ref.isdigit():
+        project = qs.filter(id=ref).first()
+    else:
+        org_slug, _, key = ref.partition("/")
+        project = qs.filter(org__slug=org_slug, key=key).first()
+    if project is None:
+        raise CommandError(f"No project {ref}.")
+    return project
+
+
+class Command(BaseCommand):
+    help = (
+        "Create many flags in a project from a JSON file (a list of definitions or {\"flags\": [...]}) "
+        "or NDJSON (.ndjson/.jsonl, one definition per line), in one transaction. "
+        "Same format as POST /api/flags/bulk/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Definitions file, or - for stdin")
+        parser.add_argument("--project", required=True, help="Project id or <org slug>/<project key>")
+        parser.add_argument("--on-conflict", choices=["error", "skip"], default="error")
+        parser.add_argument("--actor", help="Email of the user the audit entry is attributed to")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only")
+
+    def handle(self, *args, **options):
+        project = get_project(options["project"])
+        actor = None
+        if options["actor"]:
+            actor = get_user_model().objects.filter(email=options["actor"]).first()
+            if actor is None:
+                raise CommandError(f"No user with email {options['actor']}.")
+
+        definitions = self.read(options["path"])
+        serializer = BulkFlagImportSerializer(
+            data={"project": project.id, "flags": definitions, "on_conflict": options["on_conflict"]},
+            context={"max_flags": None},
+        )
+        if not serializer.is_valid():
+            raise CommandError(self.format_errors(serializer.errors))
+        data = serializer.validated_data
+        skipped = len(data["existing"])
+        if options["dry_run"]:
+            self.stdout.write(f"{len(definitions) - skipped} flags valid, {skipped} existing would be skipped")
+            return
+        flags = import_flags(project, data["flags"], actor, data["existing"])
+        self.stdout.write(f"Created {len(flags)} flags in {project.org.slug}/{project.key}, skipped {skipped}")
+
+    def read(self, path):
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            if path.endswith((".ndjson", ".jsonl")):
+                return [json.loads(line) for line in f if line.strip()]
+            data = json.load(f)
+        except ValueError as e:
+            raise CommandError(f"{path}: invalid JSON: {e}")
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        return data["flags"] if isinstance(data, dict) else data
+
+    def format_errors(self, errors):
+        flag_errors = errors.get("flags")
+        if isinstance(flag_errors, list):
+            return " ".join(flag_errors)
+        if not isinstance(flag_errors, dict):
+            return json.dumps(errors)
+        lines = [f"flag {i}: {json.dumps(e)}" for i, e in sorted(flag_errors.items(), key=lambda item: int(item[0]))]
+        shown = lines[:MAX_ERRORS_SHOWN]
+        if len(lines) > len(shown):
+            shown.append(f"... and {len(lines) - len(shown)} more")
+        return f"{len(lines)} invalid definition(s), nothing imported:\n" + "\n".join(shown)
@@ -0,0 +1,44 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.management.commands.import_flags import get_project
+from apps.flags.snapshot import CHUNK_SIZE, SnapshotError, import_project
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring a project in line with an NDJSON snapshot from export_project: only differences are "
+        "written, in one transaction. Running it twice changes nothing the second time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Snapshot file, or - for stdin")
+        parser.add_argument("--project", required=True, help="Target project id or <org slug>/<project key>")
+        parser.add_argument("--prune", action="store_true", help="Delete flags the snapshot does not contain")
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes, write nothing")
+        parser.add_argument("--actor", help="Email of the user the audit entry is attributed to")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Flags compared per query")
+
+    def handle(self, *args, **options):
+        project = get_project(options["project"])
+        actor = None
+        if options["actor"]:
+            actor = get_user_model().objects.filter(email=options["actor"]).first()
+            if actor is None:
+                raise CommandError(f"No user with email {options['actor']}.")
+        f = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8")
+        try:
+            changes = import_project(
+                project, f, actor,
+                prune=options["prune"], dry_run=options["dry_run"], chunk_size=options["chunk_size"],
+            )
+        except SnapshotError as e:
+            raise CommandError(f"{e}; nothing imported")
+        finally:
+            if f is not sys.stdin:
+                f.close()
+        prefix = "Would apply" if options["dry_run"] else "Applied"
+        self.stdout.write(f"{prefix} to {project.org.slug}/{project.key}: {json.dumps(changes)}")
@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.audit.archive import archive_and_prune, cutoff_for, expired, retention_days
+from apps.core.models import Organization
+from apps.flags.stream import expired_events, prune_events
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive audit entries older than each organization's retention to gzip NDJSON, "
+        "then delete them in small batches. Also deletes SDK stream change events older than "
+        "SDK_STREAM_EVENT_RETENTION_HOURS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", action="append", default=[], help="Org slug or id (repeatable; default: all)")
+        parser.add_argument("--archive-dir", default=settings.AUDIT_ARCHIVE_DIR)
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Rows read per query")
+        parser.add_argument("--rows-per-file", type=int, default=100_000)
+        parser.add_argument("--delete-batch-size", type=int, default=1000, help="Rows deleted per statement")
+        parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between delete batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        orgs = Organization.objects.order_by("id")
+        if options["org"]:
+            ids = [o for o in options["org"] if o.isdigit()]
+            slugs = [o for o in options["org"] if not o.isdigit()]
+            orgs = orgs.filter(id__in=ids) | orgs.filter(slug__in=slugs)
+            if not orgs.exists():
+                raise CommandError("No matching organizations.")
+            targets = list(orgs)
+        else:
+            # None: entries whose org has been deleted, kept for the default retention
+            targets = list(orgs) + [None]
+
+        now = timezone.now()
+        total = 0
+        for org in targets:
+            label = org.slug if org is not None else "(no org)"
+            cutoff = cutoff_for(org, now)
+            if cutoff is None:
+                self.stdout.write(f"{label}: retention disabled, skipped")
+                continue
+            if options["dry_run"]:
+                n = expired(org, cutoff).count()
+                total += n
+                self.stdout.write(f"{label}: {n} entries older than {retention_days(org)} days")
+                continue
+            archived, deleted, paths = archive_and_prune(
+                org, cutoff, options["archive_dir"],
+                chunk_size=options["chunk_size"],
+                rows_per_file=options["rows_per_file"],
+                delete_batch_size=options["delete_batch_size"],
+                pause=options["pause"],
+            )
+            total += deleted
+            self.stdout.write(f"{label}: archived {archived}, deleted {deleted}")
+            for path in paths:
+                self.stdout.write(f"  {path}")
+        if not options["org"]:
+            # change events are not per org; they are only needed for stream replay
+            if options["dry_run"]:
+                events = expired_events(now).count()
+            else:
+                events = prune_events(now)
+            self.stdout.write(f"stream change events: {events} older than "
+                              f"{settings.SDK_STREAM_EVENT_RETENTION_HOURS} hours")
+        verb = "would prune" if options["dry_run"] else "pruned"
+        self.stdout.write(self.style.SUCCESS(f"Done: {verb} {total} entries"))
@@ -0,0 +1,52 @@
+import json
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from apps.audit.archive import iter_archive
+
+
+def _datetime(value):
+    """ISO 8601 datetime or date (midnight); without an offset, in the current time zone."""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            parsed = datetime.combine(date, time()) if date else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise CommandError(f"Invalid datetime: {value}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+class Command(BaseCommand):
+    help = "Stream entries from audit archive files (prune_audit_logs output) as NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="*.ndjson.gz archive files")
+        parser.add_argument("--action", action="append", default=[])
+        parser.add_argument("--actor", type=int, help="Actor user id")
+        parser.add_argument("--flag")
+        parser.add_argument("--env")
+        parser.add_argument("--since", type=_datetime, help="ISO 8601, inclusive")
+        parser.add_argument("--until", type=_datetime, help="ISO 8601, exclusive")
+
+    def handle(self, *args, **options):
+        for path in options["paths"]:
+            try:
+                entries = iter_archive(
+                    path,
+                    action=set(options["action"]),
+                    actor=options["actor"],
+                    flag=options["flag"],
+                    env=options["env"],
+                    since=options["since"],
+                    until=options["until"],
+                )
+                for entry in entries:
+                    self.stdout.write(json.dumps(entry, separators=(",", ":")))
+            except OSError as e:
+                raise CommandError(f"{path}: {e}")
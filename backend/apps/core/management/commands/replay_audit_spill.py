@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from apps.audit.writer import writer
+
+
+class Command(BaseCommand):
+    help = "Insert audit entries the async writer spilled to AUDIT_SPILL_PATH."
+
+    def handle(self, *args, **options):
+        written = writer.replay_spill()
+        self.stdout.write(f"Replayed {written} audit entries from {writer.spill_path}")
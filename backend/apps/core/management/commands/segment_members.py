@@ -0,0 +1,62 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.management.commands.import_flags import get_project
+from apps.flags.models import Segment
+from apps.flags.segments import SegmentError, apply_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Add and remove members of a user segment from files of user keys (one per line), "
+        "rewriting only the storage buckets the changes touch. Same operation as "
+        "POST /api/segments/<id>/members/, without its per-request key limit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("segment", help="Segment key")
+        parser.add_argument("--project", required=True, help="Project id or <org slug>/<project key>")
+        parser.add_argument("--add", dest="add_path", help="File of keys to add, or - for stdin")
+        parser.add_argument("--remove", dest="remove_path", help="File of keys to remove, or - for stdin")
+        parser.add_argument("--create", action="store_true", help="Create the segment if it does not exist")
+        parser.add_argument("--actor", help="Email of the user the audit entry is attributed to")
+
+    def handle(self, *args, **options):
+        project = get_project(options["project"])
+        actor = None
+        if options["actor"]:
+            actor = get_user_model().objects.filter(email=options["actor"]).first()
+            if actor is None:
+                raise CommandError(f"No user with email {options['actor']}.")
+        if not options["add_path"] and not options["remove_path"]:
+            raise CommandError("Pass --add and/or --remove.")
+
+        key = options["segment"]
+        segment = Segment.objects.filter(project=project, key=key).first()
+        if segment is None:
+            if not options["create"]:
+                raise CommandError(f"No segment {key} in {project.org.slug}/{project.key} (use --create).")
+            segment = Segment.objects.create(project=project, key=key, name=key)
+
+        add = self.read(options["add_path"])
+        remove = self.read(options["remove_path"])
+        try:
+            result = apply_changes(segment, add, remove, actor=actor)
+        except SegmentError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"{project.org.slug}/{project.key}:{key}: added {result['added']:,}, removed {result['removed']:,}, "
+            f"{result['size']:,} members (version {result['version']})"
+        )
+
+    def read(self, path):
+        if not path:
+            return []
+        f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+        try:
+            return [line.strip() for line in f if line.strip()]
+        finally:
+            if f is not sys.stdin:
+                f.close()
@@ -0,0 +1,44 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.flags.warmup import warm
+
+
+class Command(BaseCommand):
+    help = (
+        "Open DB connections and compile the rulesets of the busiest environments (by recorded "
+        "evaluations), reporting what each step costs. Servers do the same at start-up when "
+        "FLAG_WARMUP_ON_START is set; run this to see the warm-up cost or to fill a shared SDK key cache."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit", type=int, default=settings.FLAG_WARMUP_ENVIRONMENTS, help="Environments to warm",
+        )
+        parser.add_argument(
+            "--hours", type=int, default=settings.FLAG_WARMUP_WINDOW_HOURS,
+            help="Rank environments by evaluations over this many hours",
+        )
+        parser.add_argument(
+            "--environment", type=int, action="append", dest="environments",
+            help="Environment id to warm instead of the busiest (repeatable)",
+        )
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        report = warm(limit=options["limit"], hours=options["hours"], environment_ids=options["environments"])
+        if options["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        envs = report["environments"]
+        source = "given" if options["environments"] else f"busiest over {options['hours']}h"
+        self.stdout.write(f"{'connections + urls':<40}{report['connect_ms']:>10.1f} ms")
+        self.stdout.write(f"{'select environments':<40}{report['select_ms']:>10.1f} ms  ({len(envs)} {source})")
+        for env in envs:
+            self.stdout.write(f"  {env['name']:<38}{env['ms']:>10.1f} ms  {env['flags']:,} flags")
+        flags = sum(env["flags"] for env in envs)
+        self.stdout.write(self.style.SUCCESS(
+            f"Warmed {len(envs)} environments, {flags:,} flags in {report['total_ms']:.1f} ms"
+        ))
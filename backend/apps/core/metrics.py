@@ -0,0 +1,230 @@
+"""
+Prometheus metrics in the text exposition format (GET /metrics), without a
+client library.
+
+Metrics live in this worker process; every worker serves its own at /metrics.
+Counters and histograms take a short per-metric lock; everything here is a
+no-op when METRICS_ENABLED is off (the middleware is not installed and
+/metrics returns 404).
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+)
+SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_registry = []
+
+
+def enabled():
+    return settings.METRICS_ENABLED
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        if not settings.METRICS_ENABLED:
+            return
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._values.get(labels)
+            if child is None:
+                # per-bucket (non-cumulative) counts, then sum, then count
+                child = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            child[i] += 1
+            child[-2] += value
+            child[-1] += 1
+
+    def count(self, labels=()):
+        child = self._values.get(labels)
+        return child[-1] if child else 0
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for labels, child in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), child):
+                cumulative += n
+                le = _labels(self.labelnames, labels, f'le="{_number(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(child[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {child[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Read at scrape time from `collect()` -> [(label values tuple, value)].
+    kind="counter" for totals that another component already keeps.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect, labelnames=(), kind="gauge"):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self.kind = kind
+
+    def render(self):
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in self.collect()
+        ]
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def clear():
+    for metric in _registry:
+        metric.clear()
+
+
+# --- metrics -----------------------------------------------------------------
+
+HTTP_REQUESTS = Counter(
+    "flagship_http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status")
+)
+HTTP_DURATION = Histogram(
+    "flagship_http_request_duration_seconds", "Time spent in Django per request.", ("endpoint",)
+)
+DB_QUERIES = Histogram(
+    "flagship_db_queries_per_request", "Database queries per request.", ("endpoint",), buckets=SIZE_BUCKETS
+)
+DB_DURATION = Histogram(
+    "flagship_db_query_duration_seconds_per_request", "Database time per request.", ("endpoint",)
+)
+EVALUATE_STAGE = Histogram(
+    "flagship_evaluate_stage_duration_seconds",
+    "sdk_evaluate time per stage: key_lookup, db_load, clause_match, bucketing, serialization.",
+    ("stage",),
+)
+FLAGS_EVALUATED = Histogram(
+    "flagship_flags_evaluated_per_request", "Flags evaluated per SDK evaluate request.", buckets=SIZE_BUCKETS
+)
+RULES_EVALUATED = Histogram(
+    "flagship_rules_evaluated_per_request", "Targeting rules tried per SDK evaluate request.", buckets=SIZE_BUCKETS
+)
+SDK_REQUESTS = Counter(
+    "flagship_sdk_requests_total", "SDK requests per environment id and endpoint.", ("environment", "endpoint")
+)
+CACHE_REQUESTS = Counter(
+    "flagship_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result")
+)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.inc((cache, "hit" if hit else "miss"))
+
+
+class StageTimer:
+    """Times consecutive stages of one request into EVALUATE_STAGE."""
+    sampled = True
+
+    def __init__(self):
+        self._t = time.perf_counter()
+
+    def mark(self, stage):
+        """Close the stage running since the previous mark (or creation)."""
+        now = time.perf_counter()
+        EVALUATE_STAGE.observe(now - self._t, (stage,))
+        self._t = now
+
+    def add(self, stage, seconds):
+        EVALUATE_STAGE.observe(seconds, (stage,))
+
+    def restart(self):
+        self._t = time.perf_counter()
+
+
+class _NoTimer:
+    sampled = False
+
+    def mark(self, stage):
+        pass
+
+    def add(self, stage, seconds):
+        pass
+
+    def restart(self):
+        pass
+
+
+NO_TIMER = _NoTimer()
+
+
+def evaluate_timer():
+    """A StageTimer for METRICS_EVALUATE_SAMPLE_RATE of requests, else a no-op."""
+    if settings.METRICS_ENABLED and random.random() < settings.METRICS_EVALUATE_SAMPLE_RATE:
+        return StageTimer()
+    return NO_TIMER
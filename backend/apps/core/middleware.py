@@ -0,0 +1,67 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection
+
+from apps.core import metrics
+
+
+class _QueryStats:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+def _endpoint(request):
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency, and DB query count/time per endpoint (URL name).
+    Installed only when METRICS_ENABLED. Async requests (the SSE stream) get
+    counts and latency; their queries run on other threads and are not seen.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        queries = _QueryStats()
+        with connection.execute_wrapper(queries):
+            response = self.get_response(request)
+        self._observe(request, response, time.perf_counter() - start, queries)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._observe(request, response, time.perf_counter() - start, None)
+        return response
+
+    def _observe(self, request, response, seconds, queries):
+        endpoint = _endpoint(request)
+        metrics.HTTP_REQUESTS.inc((endpoint, request.method, str(response.status_code)))
+        metrics.HTTP_DURATION.observe(seconds, (endpoint,))
+        if queries is not None:
+            metrics.DB_QUERIES.observe(queries.count, (endpoint,))
+            metrics.DB_DURATION.observe(queries.seconds, (endpoint,))
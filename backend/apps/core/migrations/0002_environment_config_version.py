@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="environment",
+            name="config_version",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -16,6 +16,8 @@ def gen_key(prefix=""):
 class Organization(models.Model):
     name = models.CharField(max_length=255)
     slug = models.SlugField(max_length=255, unique=True)
+    # Days of audit log to keep (prune_audit_logs); null = AUDIT_RETENTION_DAYS, 0 = forever
+    audit_retention_days = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -63,6 +65,8 @@ class Environment(models.Model):
     key = models.SlugField(max_length=64)
     client_sdk_key = models.CharField(max_length=128, unique=True, default="", blank=True)
     server_sdk_key = models.CharField(max_length=128, unique=True, default="", blank=True)
+    # Bumped on every flag state/rule change; cached rulesets are keyed on it.
+    config_version = models.PositiveBigIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
 from rest_framework.permissions import BasePermission
+from apps.core.metrics import cache_lookup
 from apps.core.models import Membership
 
 ROLE_ORDER = {
@@ -8,6 +13,66 @@ ROLE_ORDER = {
     "owner": 3,
 }
 
+
+def _role_cache_key(user_id):
+    return f"roles:{user_id}"
+
+
+def _shared_cache():
+    """The role cache if every worker shares it (CACHE_URL), else None."""
+    cache = caches[settings.ROLE_CACHE_ALIAS]
+    return None if isinstance(cache, LocMemCache) else cache
+
+
+def role_map(request):
+    """
+    {org_id: role} for the requesting user, resolved once per request. With
+    a shared cache (CACHE_URL) it is also cached across requests for
+    ROLE_CACHE_TTL, and Membership saves/deletes invalidate it in every
+    worker. A per-process cache could not see another worker's invalidation,
+    leaving a removed or demoted member their old role there, so with the
+    default LocMemCache the map is read from the database on every request.
+    """
+    cached = getattr(request, "_role_map", None)
+    if cached is not None:
+        return cached
+    user = request.user
+    if not user or not user.is_authenticated:
+        roles = {}
+    else:
+        cache = _shared_cache()
+        roles = None
+        if cache is not None:
+            roles = cache.get(_role_cache_key(user.pk))
+            cache_lookup("role_map", roles is not None)
+        if roles is None:
+            roles = dict(Membership.objects.filter(user_id=user.pk).values_list("org_id", "role"))
+            if cache is not None:
+                cache.set(_role_cache_key(user.pk), roles, settings.ROLE_CACHE_TTL)
+    request._role_map = roles
+    return roles
+
+
+def member_org_ids(request):
+    """Org ids the user belongs to, for `org_id__in` tenant filters."""
+    return list(role_map(request))
+
+
+def has_role(request, org_id, min_role):
+    """Whether the user holds at least min_role in org_id (superusers always do)."""
+    if request.user.is_superuser:
+        return True
+    role = role_map(request).get(org_id)
+    return role is not None and ROLE_ORDER.get(role, 0) >= ROLE_ORDER.get(min_role, 0)
+
+
+def invalidate_role_map(user_id):
+    key = _role_cache_key(user_id)
+    caches[settings.ROLE_CACHE_ALIAS].delete(key)
+    # Again once the change is visible: a request may have cached the old map in between.
+    transaction.on_commit(lambda: caches[settings.ROLE_CACHE_ALIAS].delete(key))
+
+
 class HasMinRole(BasePermission):
     """
     Set view.min_role = "developer"/"admin"/"owner"
@@ -19,7 +84,10 @@ class HasMinRole(BasePermission):
         org_id = view.kwargs.get("org_id") or request.data.get("org") or request.query_params.get("org_id")
         if not org_id:
             return True
-        m = Membership.objects.filter(org_id=org_id, user=request.user).first()
-        if not m:
+        try:
+            role = role_map(request).get(int(org_id))
+        except (TypeError, ValueError):
+            return False
+        if not role:
             return False
-        return ROLE_ORDER.get(m.role, 0) >= ROLE_ORDER.get(min_role, 0)
+        return ROLE_ORDER.get(role, 0) >= ROLE_ORDER.get(min_role, 0)
@@ -0,0 +1,155 @@
+"""
+SDK key -> Environment resolution, cached in the "sdk" cache alias.
+
+What is cached depends on whether the cache is shared by every worker:
+
+- Shared (SDK_CACHE_URL, Redis). Two entries per environment:
+  sdk-key:<field>:<hash of key> -> environment id and sdk-env:<id> -> the
+  Environment row, including its config_version. Any environment save
+  (rotate_keys included), delete or flag config change drops sdk-env:<id>
+  for every worker; a mapping whose key no longer matches the environment
+  is ignored, so rotated keys stop resolving immediately. A hit costs no
+  queries.
+
+- Per process (the default LocMemCache, an LRU bounded by
+  SDK_KEY_CACHE_MAX_ENTRIES). Another worker's invalidation cannot reach
+  it, so a cached row would serve a stale config_version (stale rulesets,
+  304s for old ETags) and a rotated or revoked key for SDK_KEY_CACHE_TTL.
+  Known keys are therefore read from the database on every lookup, one
+  indexed query for the few columns the SDK endpoints use; only unknown
+  keys are cached.
+
+Unknown keys map to 0 for SDK_KEY_NEGATIVE_TTL in both modes, so key
+guessing does not reach the database.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from apps.core.metrics import cache_lookup
+from apps.core.models import Environment
+
+CLIENT = "client_sdk_key"
+SERVER = "server_sdk_key"
+
+
+def _cache():
+    return caches[settings.SDK_KEY_CACHE_ALIAS]
+
+
+def _key_entry(field, key):
+    return f"sdk-key:{field}:{hashlib.sha256(key.encode('utf-8')).hexdigest()[:40]}"
+
+
+def _env_entry(environment_id):
+    return f"sdk-env:{environment_id}"
+
+
+def _cached_environment(cache, field, key):
+    """(found, env) from the cache alone; found is False when the database must be asked."""
+    key_entry = _key_entry(field, key)
+    env_id = cache.get(key_entry)
+    if env_id == 0:
+        cache_lookup("sdk_key", True)
+        return True, None
+    if env_id is not None:
+        env = cache.get(_env_entry(env_id))
+        if env is not None and getattr(env, field) == key:
+            cache_lookup("sdk_key", True)
+            return True, env
+    cache_lookup("sdk_key", False)
+    return False, None
+
+
+def _remember(cache, field, key, env):
+    if env is None:
+        cache.set(_key_entry(field, key), 0, settings.SDK_KEY_NEGATIVE_TTL)
+    else:
+        cache.set_many({_key_entry(field, key): env.id, _env_entry(env.id): env}, settings.SDK_KEY_CACHE_TTL)
+
+
+# Columns of an environment returned by a per-process lookup: what the SDK
+# endpoints read (rulesets, ETags, streams).
+FIELDS = ("id", "key", "project_id", "config_version", CLIENT, SERVER)
+
+
+def _shared(cache):
+    return not isinstance(cache, LocMemCache)
+
+
+def _query(field, key):
+    return Environment.objects.filter(**{field: key}).only(*FIELDS)
+
+
+def _cached_unknown(cache, field, key):
+    unknown = cache.get(_key_entry(field, key)) == 0
+    cache_lookup("sdk_key", unknown)
+    return unknown
+
+
+def environment_for_key(field, key):
+    """Environment whose `field` (CLIENT or SERVER) equals `key`, or None."""
+    if not key:
+        return None
+    cache = _cache()
+    if not _shared(cache):
+        if _cached_unknown(cache, field, key):
+            return None
+        env = _query(field, key).first()
+        if env is None:
+            _remember(cache, field, key, None)
+        return env
+    found, env = _cached_environment(cache, field, key)
+    if found:
+        return env
+    env = _query(field, key).first()
+    _remember(cache, field, key, env)
+    return env
+
+
+async def aenvironment_for_key(field, key):
+    """
+    environment_for_key for async views. The default LocMemCache is an
+    in-process dict, so it is read inline on the event loop and the row comes
+    from the async ORM. A shared cache (SDK_CACHE_URL) does network I/O, so
+    the whole lookup runs in one worker thread hop (Django's cache a* methods
+    would hop once per call).
+    """
+    if not key:
+        return None
+    cache = _cache()
+    if not _shared(cache):
+        if _cached_unknown(cache, field, key):
+            return None
+        env = await _query(field, key).afirst()
+        if env is None:
+            _remember(cache, field, key, None)
+        return env
+    return await sync_to_async(environment_for_key)(field, key)
+
+
+def prime_environment(env):
+    """Cache both SDK keys of `env` (process warm-up); a per-process cache holds no known keys."""
+    if not _shared(_cache()):
+        return
+    _cache().set_many(
+        {_key_entry(CLIENT, env.client_sdk_key): env.id, _key_entry(SERVER, env.server_sdk_key): env.id,
+         _env_entry(env.id): env},
+        settings.SDK_KEY_CACHE_TTL,
+    )
+
+
+def invalidate_environments(environment_ids):
+    entries = [_env_entry(i) for i in environment_ids]
+    _cache().delete_many(entries)
+    # Again once the change is visible: a worker may have cached the old row
+    # from the database in between.
+    transaction.on_commit(lambda: _cache().delete_many(entries))
+
+
+def invalidate_keys(*keys):
+    _cache().delete_many([_key_entry(field, k) for k in keys if k for field in (CLIENT, SERVER)])
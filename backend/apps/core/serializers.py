@@ -4,7 +4,7 @@ from apps.core.models import Organization, Project, Environment, Membership
 class OrganizationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Organization
-        fields = ["id", "name", "slug", "created_at"]
+        fields = ["id", "name", "slug", "audit_retention_days", "created_at"]
 
 class MembershipSerializer(serializers.ModelSerializer):
     user_email = serializers.CharField(source="user.email", read_only=True)
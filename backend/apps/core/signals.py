@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core.models import Environment, Membership
+from apps.core.permissions import invalidate_role_map
+from apps.core.sdk_keys import invalidate_environments, invalidate_keys
+
+
+@receiver(post_save, sender=Environment)
+def environment_saved(sender, instance, created, **kwargs):
+    invalidate_environments([instance.id])
+    # Drop any negative entries for the (possibly new) keys.
+    invalidate_keys(instance.client_sdk_key, instance.server_sdk_key)
+
+
+@receiver(post_delete, sender=Environment)
+def environment_deleted(sender, instance, **kwargs):
+    invalidate_environments([instance.id])
+    invalidate_keys(instance.client_sdk_key, instance.server_sdk_key)
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def membership_changed(sender, instance, **kwargs):
+    invalidate_role_map(instance.user_id)
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.core import metrics
+from apps.core.models import Environment, Organization, Project
+from apps.flags.models import FeatureFlag, FlagState, FlagRule
+from apps.flags.ruleset import clear_rulesets, evaluate, evaluate_profiled, get_ruleset
+
+
+@override_settings(EVAL_COUNTER_FLUSH_INTERVAL=0, METRICS_EVALUATE_SAMPLE_RATE=1.0, METRICS_TOKEN="s3cret")
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Metrics")
+        project = Project.objects.create(org=org, name="Web", key="web")
+        cls.env = Environment.objects.create(project=project, name="Production", key="production")
+        for i in range(3):
+            flag = FeatureFlag.objects.create(project=project, key=f"flag-{i}", name=f"Flag {i}")
+            state = FlagState.objects.create(flag=flag, environment=cls.env, enabled=True, rollout_percentage=50)
+            FlagRule.objects.create(state=state, priority=0, clauses=[{"attr": "plan", "op": "equals", "values": ["pro"]}])
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+        metrics.clear()
+
+    def evaluate(self):
+        return APIClient().post(
+            "/api/sdk/evaluate/", {"user": {"key": "u1", "plan": "free"}}, format="json",
+            HTTP_X_CLIENT_KEY=self.env.client_sdk_key,
+        )
+
+    def test_evaluate_is_instrumented(self):
+        self.evaluate()
+        self.evaluate()
+
+        for stage in ("key_lookup", "db_load", "clause_match", "bucketing", "serialization"):
+            with self.subTest(stage=stage):
+                self.assertEqual(metrics.EVALUATE_STAGE.count((stage,)), 2)
+        self.assertEqual(metrics.FLAGS_EVALUATED.count(), 2)
+        self.assertEqual(metrics.SDK_REQUESTS.value((str(self.env.id), "evaluate")), 2)
+        self.assertEqual(metrics.CACHE_REQUESTS.value(("ruleset", "miss")), 1)
+        self.assertEqual(metrics.CACHE_REQUESTS.value(("ruleset", "hit")), 1)
+        self.assertEqual(metrics.CACHE_REQUESTS.value(("sdk_key", "miss")), 2)  # known keys are read fresh
+        self.assertEqual(metrics.HTTP_REQUESTS.value(("sdk-evaluate", "POST", "200")), 2)
+        self.assertEqual(metrics.DB_QUERIES.count(("sdk-evaluate",)), 2)
+
+        body = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret").content.decode()
+        self.assertIn('flagship_evaluate_stage_duration_seconds_count{stage="clause_match"} 2', body)
+        self.assertIn(f'flagship_sdk_requests_total{{environment="{self.env.id}",endpoint="evaluate"}} 2', body)
+        self.assertIn('flagship_db_queries_per_request_bucket{endpoint="sdk-evaluate",le="1"} 1', body)
+        self.assertIn("# TYPE flagship_rulesets_cached gauge", body)
+
+    def test_profiled_evaluation_matches_evaluate(self):
+        ruleset = get_ruleset(self.env)
+        for i in range(200):
+            user = {"key": f"user-{i}", "plan": "pro" if i % 3 else "free"}
+            with self.subTest(user=user):
+                results, rules_tried, _, _ = evaluate_profiled(ruleset, user)
+                self.assertEqual(results, evaluate(ruleset, user))
+                self.assertLessEqual(rules_tried, len(ruleset.flags))
+
+    def test_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong").status_code, 401)
+        response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+
+    @override_settings(METRICS_TOKEN="")
+    def test_not_public_without_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        with self.settings(DEBUG=True):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.evaluate()
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+        self.assertEqual(metrics.SDK_REQUESTS.value((str(self.env.id), "evaluate")), 0)
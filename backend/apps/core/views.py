@@ -1,12 +1,15 @@
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
 from apps.core.models import Organization, Project, Environment, Membership
 from apps.core.serializers import OrganizationSerializer, ProjectSerializer, EnvironmentSerializer, MembershipSerializer
-from apps.core.permissions import HasMinRole
+from apps.core.permissions import HasMinRole, has_role, member_org_ids
+from apps.core.sdk_keys import invalidate_keys
 from apps.audit.services import audit  # ✅ NEW
+from apps.flags.promote import clone_environment, create_default_states, promote
 
 
 class OrganizationViewSet(viewsets.ModelViewSet):
@@ -17,7 +20,7 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_superuser:
             return Organization.objects.all().order_by("-created_at")
-        return Organization.objects.filter(memberships__user=user).distinct().order_by("-created_at")
+        return Organization.objects.filter(id__in=member_org_ids(self.request)).order_by("-created_at")
 
     def perform_create(self, serializer):
         org = serializer.save()
@@ -40,7 +43,7 @@ class MembershipViewSet(viewsets.ModelViewSet):
         org_id = self.request.query_params.get("org_id")
         qs = Membership.objects.all()
         if not user.is_superuser:
-            qs = qs.filter(org__memberships__user=user).distinct()
+            qs = qs.filter(org_id__in=member_org_ids(self.request))
         if org_id:
             qs = qs.filter(org_id=org_id)
         return qs.order_by("-created_at")
@@ -66,7 +69,7 @@ class ProjectViewSet(viewsets.ModelViewSet):
         user = self.request.user
         qs = Project.objects.all()
         if not user.is_superuser:
-            qs = qs.filter(org__memberships__user=user).distinct()
+            qs = qs.filter(org_id__in=member_org_ids(self.request))
         org_id = self.request.query_params.get("org_id")
         if org_id:
             qs = qs.filter(org_id=org_id)
@@ -93,12 +96,67 @@ class EnvironmentViewSet(viewsets.ModelViewSet):
         user = self.request.user
         qs = Environment.objects.select_related("project", "project__org")
         if not user.is_superuser:
-            qs = qs.filter(project__org__memberships__user=user).distinct()
+            qs = qs.filter(project__org_id__in=member_org_ids(self.request))
         project_id = self.request.query_params.get("project_id")
         if project_id:
             qs = qs.filter(project_id=project_id)
         return qs.order_by("-created_at")
 
+    def perform_create(self, serializer):
+        env = serializer.save()
+        # every existing flag gets its (off) state here, as a new flag does in each environment
+        create_default_states(env)
+
+    @action(detail=True, methods=["POST"])
+    def promote(self, request, pk=None):
+        """
+        POST /api/environments/<source id>/promote/
+        {"target": <environment id>, "flags": ["key", ...] (optional), "dry_run": false}
+
+        Copy this environment's flag states and rules to another environment
+        of the same project; only differences are written. With dry_run the
+        diff is returned and nothing changes.
+        """
+        source = self.get_object()
+        if not has_role(request, source.project.org_id, self.min_role):
+            raise PermissionDenied()
+        target_id = request.data.get("target")
+        target = (
+            self.get_queryset().filter(id=target_id, project_id=source.project_id).first()
+            if str(target_id).isdigit() else None
+        )
+        if target is None or target.id == source.id:
+            return Response(
+                {"detail": "target must be another environment of the same project."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        flags = request.data.get("flags")
+        if flags is not None and not (isinstance(flags, list) and all(isinstance(k, str) for k in flags)):
+            return Response({"detail": "flags must be a list of flag keys."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(promote(source, target, flags, request.user, dry_run=request.data.get("dry_run") is True))
+
+    @action(detail=True, methods=["POST"])
+    def clone(self, request, pk=None):
+        """
+        POST /api/environments/<source id>/clone/ {"name": "QA", "key": "qa"}
+
+        Create a new environment in the same project (with its own SDK keys)
+        whose flag states and rules are a copy of this one's.
+        """
+        source = self.get_object()
+        if not has_role(request, source.project.org_id, self.min_role):
+            raise PermissionDenied()
+        serializer = EnvironmentSerializer(
+            data={"project": source.project_id, "name": request.data.get("name"), "key": request.data.get("key")}
+        )
+        serializer.is_valid(raise_exception=True)
+        env, result = clone_environment(
+            source, serializer.validated_data["name"], serializer.validated_data["key"], request.user
+        )
+        return Response(
+            {**EnvironmentSerializer(env).data, "copied": result["summary"]}, status=status.HTTP_201_CREATED
+        )
+
     # ✅ FIX: enforce admin role for rotate_keys (min_role must be set BEFORE permissions run)
     def get_permissions(self):
         if self.action == "rotate_keys":
@@ -108,6 +166,7 @@ class EnvironmentViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["POST"], permission_classes=[IsAuthenticated, HasMinRole])
     def rotate_keys(self, request, pk=None):
         env = self.get_object()
+        invalidate_keys(env.client_sdk_key, env.server_sdk_key)
 
         env.client_sdk_key = ""
         env.server_sdk_key = ""
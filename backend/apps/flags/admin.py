@@ -1,5 +1,5 @@
 from django.contrib import admin
-from apps.flags.models import FeatureFlag, FlagState, FlagRule
+from apps.flags.models import FeatureFlag, FlagState, FlagRule, Segment
 
 @admin.register(FeatureFlag)
 class FeatureFlagAdmin(admin.ModelAdmin):
@@ -14,3 +14,8 @@ class FlagStateAdmin(admin.ModelAdmin):
 @admin.register(FlagRule)
 class FlagRuleAdmin(admin.ModelAdmin):
     list_display = ("id", "state", "priority", "rollout_percentage", "created_at")
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ("id", "project", "key", "name", "size", "version", "updated_at")
+    search_fields = ("key", "name")
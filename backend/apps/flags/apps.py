@@ -1,6 +1,19 @@
 from django.apps import AppConfig
 
+
 class FlagsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.flags"
     label = "flags"
+
+    def ready(self):
+        from apps.flags import signals  # noqa: F401
+
+    def prepare_worker(self):
+        """
+        Called by config.wsgi / config.asgi in server processes once the app
+        is loaded: warm up (FLAG_WARMUP_ON_START) before serving.
+        """
+        from apps.flags import warmup
+
+        warmup.warm_on_start()
@@ -0,0 +1,54 @@
+"""
+Rollout bucketing.
+
+Produces exactly the same 0..99 bucket as `apps.flags.eval.stable_percent`:
+the first 4 bytes of sha256(f"{user_key}:{salt_key}") read as a big-endian
+unsigned int, modulo 100. The hex round-trip is skipped and the ":" + key
+suffix is encoded once per flag/rule (`salt`), so the hot path is a single
+hash plus an unpack.
+
+`bucket_array` buckets many user keys for one flag at once and returns a
+NumPy array (NumPy is optional and only needed for that function).
+"""
+import hashlib
+import struct
+
+_sha256 = hashlib.sha256
+_unpack_u32 = struct.Struct(">I").unpack_from
+
+
+def salt(key: str) -> bytes:
+    """Per-flag (or per-rule) suffix: stable_percent(u, key) == bucket(u, salt(key))."""
+    return b":" + key.encode("utf-8")
+
+
+def rule_salt(flag_key: str, rule_id: int) -> bytes:
+    return salt(f"{flag_key}:rule:{rule_id}")
+
+
+def bucket(user_key: str, salt_bytes: bytes) -> int:
+    return _unpack_u32(_sha256(user_key.encode("utf-8") + salt_bytes).digest())[0] % 100
+
+
+def bucket_bytes(user_key_bytes: bytes, salt_bytes: bytes) -> int:
+    """Like bucket() for callers that already hold the UTF-8 encoded user key."""
+    return _unpack_u32(_sha256(user_key_bytes + salt_bytes).digest())[0] % 100
+
+
+def bucket_list(user_keys, salt_bytes: bytes) -> list:
+    return [bucket(k, salt_bytes) for k in user_keys]
+
+
+def bucket_array(user_keys, salt_bytes: bytes):
+    """
+    Buckets for an iterable of user keys against one flag, as a uint8 NumPy
+    array. Hashing is still one call per key; parsing and the modulo run
+    vectorised over the whole batch.
+    """
+    try:
+        import numpy as np
+    except ImportError as e:
+        raise RuntimeError("bucket_array requires NumPy (pip install numpy)") from e
+
+    prefixes = b"".join(_sha256(k.encode("utf-8") + salt_bytes).digest()[:4] for k in user_keys)
+    return (np.frombuffer(prefixes, dtype=">u4") % 100).astype(np.uint8)
@@ -0,0 +1,86 @@
+"""
+Bulk flag import: many flag definitions, with per-environment states and
+rules, in one transaction and a fixed number of queries.
+
+Definitions are validated up front with BulkFlagImportSerializer (shape,
+clauses, unknown environments, key conflicts), then flags, states and rules
+are each inserted with one bulk_create. Model signals do not fire for
+bulk_create, so the affected environments are bumped once with
+config_changed and one summarized audit entry is written for the import.
+"""
+from django.db import transaction
+
+from apps.audit.services import audit
+from apps.flags.models import FeatureFlag, FlagRule, FlagState
+from apps.flags.signals import config_changed
+
+# Same defaults FeatureFlagViewSet.perform_create gives a new flag
+DEFAULT_STATE = {
+    "enabled": False,
+    "rollout_percentage": 100,
+    "on_variation": {"value": True},
+    "off_variation": {"value": False},
+    "default_variation": {"value": False},
+    "rules": [],
+}
+AUDIT_KEYS_LIMIT = 100
+
+
+def import_flags(project, definitions, actor=None, existing=()):
+    """
+    Create validated `definitions` in `project`, skipping keys in `existing`.
+    Returns the created FeatureFlag objects.
+    """
+    definitions = [d for d in definitions if d["key"] not in existing]
+    envs = list(project.environments.all())
+    with transaction.atomic():
+        flags = FeatureFlag.objects.bulk_create(
+            FeatureFlag(project=project, key=d["key"], name=d["name"] or d["key"], description=d["description"])
+            for d in definitions
+        )
+        pairs = [
+            (flag, env, d["environments"].get(env.key, DEFAULT_STATE))
+            for flag, d in zip(flags, definitions)
+            for env in envs
+        ]
+        states = FlagState.objects.bulk_create(
+            FlagState(
+                flag=flag,
+                environment=env,
+                enabled=st["enabled"],
+                rollout_percentage=st["rollout_percentage"],
+                on_variation=st["on_variation"],
+                off_variation=st["off_variation"],
+                default_variation=st["default_variation"],
+            )
+            for flag, env, st in pairs
+        )
+        FlagRule.objects.bulk_create(
+            FlagRule(
+                state=state,
+                priority=priority,
+                clauses=rule["clauses"],
+                variation=rule["variation"],
+                rollout_percentage=rule["rollout_percentage"],
+            )
+            for state, (_, _, st) in zip(states, pairs)
+            for priority, rule in enumerate(st["rules"])
+        )
+        if flags:
+            config_changed([env.id for env in envs], "flags.imported")
+    if flags:
+        keys = [f.key for f in flags]
+        audit(
+            actor,
+            project.org,
+            "flag.bulk_create",
+            {
+                "project": project.key,
+                "count": len(flags),
+                "skipped": len(existing),
+                "environments": [env.key for env in envs],
+                "flags": keys[:AUDIT_KEYS_LIMIT],
+                "truncated": len(keys) > AUDIT_KEYS_LIMIT,
+            },
+        )
+    return flags
@@ -0,0 +1,212 @@
+"""
+Aggregated evaluation counters: how often each flag served each value, and why.
+
+`counters.record(results)` is called once per evaluated user with the
+{flag_key: result} dict from `ruleset.evaluate`. It takes no lock and touches
+no database: every thread owns a Counter and adds the result objects to it
+with one C-level Counter.update. Ruleset results are shared, identity-hashed
+`Result` objects that already know their environment, flag, value and reason,
+so nothing is built or serialized per evaluation.
+
+A daemon thread swaps the per-thread Counters out every
+EVAL_COUNTER_FLUSH_INTERVAL seconds and at every EVAL_COUNTER_BUCKET_SECONDS
+boundary, so each swapped Counter belongs to exactly one time bucket. One
+interval later (no request can still be adding to them) it folds them into
+(environment, bucket, flag, value, reason) rows and adds those to
+FlagEvaluationCount with one upsert. Evaluations answered with a 304 are not
+counted: nothing was evaluated.
+"""
+import atexit
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from apps.core import metrics
+from apps.core.models import Environment
+from apps.flags.models import FlagEvaluationCount
+
+log = logging.getLogger(__name__)
+
+VALUE_MAX_LENGTH = 255
+
+
+def value_token(value):
+    """Stored form of a served value: compact JSON, hashed down if too long."""
+    raw = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    if len(raw) > VALUE_MAX_LENGTH:
+        raw = raw[:VALUE_MAX_LENGTH - 41] + "~" + hashlib.sha1(raw.encode()).hexdigest()
+    return raw
+
+
+def parse_value(token):
+    try:
+        return json.loads(token)
+    except ValueError:
+        return token
+
+
+class _Shard:
+    __slots__ = ("counts", "thread")
+
+    def __init__(self):
+        self.counts = Counter()
+        self.thread = threading.current_thread()
+
+
+class EvaluationCounters:
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+        self._window_start = time.time()
+        self._pending = []  # (bucket, Counter) swapped out, written on the next flush
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+
+    def record(self, results):
+        if not settings.EVAL_COUNTERS_ENABLED:
+            return
+        try:
+            counts = self._local.shard.counts
+        except AttributeError:
+            counts = self._new_shard().counts
+        counts.update(results.values())
+
+    def _new_shard(self):
+        shard = self._local.shard = _Shard()
+        with self._lock:
+            self._shards.append(shard)
+        self._ensure_started()
+        return shard
+
+    def _ensure_started(self):
+        if settings.EVAL_COUNTER_FLUSH_INTERVAL <= 0:
+            return  # flushed by hand (tests, scripts)
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                atexit.register(self.close)
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="eval-counters", daemon=True)
+            self._thread.start()
+
+    def _swap(self):
+        """Take every thread's Counter; all of it was counted since _window_start."""
+        now = time.time()
+        bucket = int(self._window_start) // settings.EVAL_COUNTER_BUCKET_SECONDS
+        self._window_start = now
+        with self._lock:
+            shards = self._shards
+            # forget threads that have exited once their last counts are taken
+            self._shards = [s for s in shards if s.thread.is_alive()]
+        taken = []
+        for shard in shards:
+            if shard.counts:
+                taken.append((bucket, shard.counts))
+                shard.counts = Counter()
+        return taken
+
+    def _run(self):
+        bucket_seconds = settings.EVAL_COUNTER_BUCKET_SECONDS
+        try:
+            while True:
+                now = time.time()
+                boundary = (now // bucket_seconds + 1) * bucket_seconds
+                if self._stop.wait(min(settings.EVAL_COUNTER_FLUSH_INTERVAL, boundary - now)):
+                    return
+                # Write what was swapped out last time; a request that was
+                # mid-update then has long finished with those Counters.
+                ready, self._pending = self._pending, self._swap()
+                self._write(ready)
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write everything counted so far from the calling thread."""
+        ready, self._pending = self._pending + self._swap(), []
+        self._write(ready)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def _write(self, taken):
+        if not taken:
+            return
+        rows = Counter()
+        for bucket, counts in taken:
+            for result, n in counts.items():
+                key = (result.environment_id, bucket, result.flag_key, value_token(result["value"]), result["reason"])
+                rows[key] += n
+        close_old_connections()
+        try:
+            upsert_counts(rows)
+        except Exception:
+            log.exception("evaluation counter flush of %d rows failed", len(rows))
+            self.failed_flushes += 1
+        else:
+            self.flushed_rows += len(rows)
+
+    def pending(self):
+        """Evaluations counted in memory and not yet flushed (approximate)."""
+        with self._lock:
+            shards = list(self._shards)
+        return sum(sum(s.counts.values()) for s in shards) + sum(sum(c.values()) for _, c in self._pending)
+
+
+def upsert_counts(rows):
+    """
+    Add {(environment_id, bucket, flag_key, value, reason): n} to
+    FlagEvaluationCount. INSERT ... ON CONFLICT DO UPDATE (PostgreSQL and
+    SQLite >= 3.24) so concurrent workers add to the same row atomically.
+    """
+    live = set(Environment.objects.filter(id__in={k[0] for k in rows}).values_list("id", flat=True))
+    bucket_seconds = settings.EVAL_COUNTER_BUCKET_SECONDS
+    params = [
+        (
+            environment_id,
+            connection.ops.adapt_datetimefield_value(
+                datetime.fromtimestamp(bucket * bucket_seconds, tz=dt_timezone.utc)
+            ),
+            flag_key,
+            value,
+            reason,
+            n,
+        )
+        for (environment_id, bucket, flag_key, value, reason), n in rows.items()
+        if environment_id in live
+    ]
+    if not params:
+        return
+    table = connection.ops.quote_name(FlagEvaluationCount._meta.db_table)
+    sql = (
+        f"INSERT INTO {table} (environment_id, bucket_start, flag_key, value, reason, count) "
+        "VALUES (%s, %s, %s, %s, %s, %s) "
+        "ON CONFLICT (environment_id, bucket_start, flag_key, value, reason) "
+        f"DO UPDATE SET count = {table}.count + excluded.count"
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+counters = EvaluationCounters()
+
+metrics.Gauge(
+    "flagship_evaluation_counts_pending", "Evaluations counted in memory, not yet flushed.",
+    lambda: [((), counters.pending())],
+)
@@ -1,4 +1,34 @@
 import hashlib
+import math
+import operator
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+try:
+    from re import _compiler as _sre_compile, _parser as _sre_parse
+except ImportError:  # Python < 3.11
+    import sre_compile as _sre_compile
+    import sre_parse as _sre_parse
+
+OPERATORS = (
+    "equals", "in", "contains", "in_segment",
+    "starts_with", "ends_with", "matches",
+    "lt", "lte", "gt", "gte",
+    "semver_eq", "semver_lt", "semver_lte", "semver_gt", "semver_gte",
+    "date_before", "date_after",
+)
+
+# `matches` patterns: their length and shape are checked on save, and user
+# values longer than MAX_MATCH_INPUT never match (see regex_problem).
+MAX_PATTERN_LENGTH = 256
+MAX_MATCH_INPUT = 512
+MAX_OPEN_REPEATS = 2
+
+
+class ClauseError(ValueError):
+    pass
+
 
 def stable_percent(user_key: str, flag_key: str) -> int:
     raw = f"{user_key}:{flag_key}".encode("utf-8")
@@ -6,7 +36,274 @@ def stable_percent(user_key: str, flag_key: str) -> int:
     n = int(h[:8], 16)
     return n % 100  # 0..99
 
-def clause_match(user: dict, clause: dict) -> bool:
+# --- operand parsing ---------------------------------------------------------
+# Each returns None for values the operator cannot compare. User values are
+# parsed per evaluation, so the string parsers are memoized.
+
+def _number(v):
+    if isinstance(v, float):
+        return v if math.isfinite(v) else None
+    if isinstance(v, int) and not isinstance(v, bool):
+        return v
+    return None
+
+
+_SEMVER = re.compile(
+    r"v?(0|[1-9][0-9]*)(?:\.(0|[1-9][0-9]*))?(?:\.(0|[1-9][0-9]*))?"
+    r"(?:-((?:0|[1-9][0-9]*|[0-9]*[A-Za-z-][0-9A-Za-z-]*)(?:\.(?:0|[1-9][0-9]*|[0-9]*[A-Za-z-][0-9A-Za-z-]*))*))?"
+    r"(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?"
+)
+
+
+@lru_cache(maxsize=4096)
+def _parse_version(v):
+    m = _SEMVER.fullmatch(v)
+    if m is None:
+        return None
+    major, minor, patch, pre = m.groups()
+    # a release sorts after all of its pre-releases; numeric identifiers before alphanumeric ones
+    pre_key = (1,) if pre is None else (0, *((0, int(p)) if p.isdigit() else (1, p) for p in pre.split(".")))
+    return (int(major), int(minor or 0), int(patch or 0), pre_key)
+
+
+def _version(v):
+    """Semantic version (2.0.0 precedence; "v" prefix and missing minor/patch allowed) as a sort key."""
+    return _parse_version(v) if isinstance(v, str) else None
+
+
+_DATE = re.compile(
+    r"([0-9]{4})-([0-9]{2})-([0-9]{2})"
+    r"(?:[Tt ]([0-9]{2}):([0-9]{2})(?::([0-9]{2})(?:\.([0-9]{1,6})[0-9]*)?)?)?"
+    r"([Zz]|[+-][0-9]{2}:[0-9]{2})?"
+)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(v):
+    m = _DATE.fullmatch(v)
+    if m is None:
+        return None
+    year, month, day, hour, minute, second, fraction, offset = m.groups()
+    tz = timezone.utc
+    if offset and offset not in ("Z", "z"):
+        sign = -1 if offset[0] == "-" else 1
+        tz = timezone(sign * timedelta(hours=int(offset[1:3]), minutes=int(offset[4:6])))
+    try:
+        dt = datetime(
+            int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0),
+            int((fraction or "0").ljust(6, "0")), tzinfo=tz,
+        )
+    except ValueError:
+        return None
+    return (dt - _EPOCH) / timedelta(milliseconds=1)
+
+
+def _timestamp(v):
+    """Epoch milliseconds from a number (already epoch ms) or an ISO 8601 date/time (UTC unless offset)."""
+    if isinstance(v, str):
+        return _parse_date(v)
+    return _number(v)
+
+
+# Characters the overlap checks below try, on top of the literals and range
+# ends the pattern itself names: ASCII, Latin, and a few from other scripts
+# and categories (digits, spaces, CJK, emoji).
+_PROBES = "".join(map(chr, range(0x250))) + "\u0660\u0966\u2007\u2028\u3000\u4e2d\uff10\U0001f600"
+_CHAR_OPS = ("LITERAL", "NOT_LITERAL", "ANY", "IN")
+
+
+class _Refused(Exception):
+    pass
+
+
+class _Screen:
+    """
+    Walks a parsed pattern for the shapes that make a backtracking engine
+    blow up. A character set is the frozenset of probe characters it
+    matches. `pending` lists the variable repetitions a later one could
+    still overlap, as (characters, fences): the fences are the single
+    characters matched since, which the earlier repetition can also match.
+    """
+
+    def __init__(self, parsed):
+        self.state = parsed.state
+        self.open_repeats = 0
+        self.probes = set(_PROBES)
+        for item in self.leaves(parsed):
+            self.probes.update(self.named_chars(item))
+
+    def leaves(self, items):
+        for op, av in items:
+            name = str(op)
+            if name in _CHAR_OPS:
+                yield op, av
+            elif name in ("MAX_REPEAT", "MIN_REPEAT"):
+                yield from self.leaves(av[2])
+            elif name == "BRANCH":
+                for branch in av[1]:
+                    yield from self.leaves(branch)
+            elif name == "SUBPATTERN":
+                yield from self.leaves(av[-1])
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                yield from self.leaves(av[1])
+
+    def named_chars(self, item):
+        op, av = item
+        name = str(op)
+        if name in ("LITERAL", "NOT_LITERAL"):
+            codes = [av]
+        elif name == "IN":
+            codes = [c for o, a in av for c in ((a,) if str(o) in ("LITERAL", "NOT_LITERAL") else
+                                                 a if str(o) == "RANGE" else ())]
+        else:
+            codes = []
+        chars = [chr(c) for c in codes]
+        return chars + [c.swapcase() for c in chars]
+
+    def chars(self, items):
+        leaves = list(self.leaves(items))
+        if not leaves:
+            return frozenset()
+        match = _sre_compile.compile(_sre_parse.SubPattern(self.state, [
+            (_sre_parse.BRANCH, (None, [_sre_parse.SubPattern(self.state, [leaf]) for leaf in leaves]))
+        ])).fullmatch
+        return frozenset(c for c in self.probes if match(c))
+
+    def first(self, items):
+        """Characters a match of `items` can start with, and whether it can be empty."""
+        first = set()
+        for op, av in items:
+            name = str(op)
+            if name in _CHAR_OPS:
+                return first | self.chars([(op, av)]), False
+            if name in ("MAX_REPEAT", "MIN_REPEAT"):
+                chars, empty = self.first(av[2])
+                first |= chars
+                if av[0] and not empty:
+                    return first, False
+            elif name == "BRANCH":
+                branches = [self.first(b) for b in av[1]]
+                first.update(*(chars for chars, _ in branches))
+                if not any(empty for _, empty in branches):
+                    return first, False
+            elif name == "SUBPATTERN":
+                chars, empty = self.first(av[-1])
+                first |= chars
+                if not empty:
+                    return first, False
+        return first, True
+
+    def fence(self, pending, chars):
+        # an earlier repetition that cannot match `chars` cannot run past them
+        return [(p, fences + [chars]) for p, fences in pending if p & chars]
+
+    def sequence(self, items, pending, repeated):
+        """`pending` after matching `items`; `repeated`: inside a group repeated more than once."""
+        for op, av in items:
+            name = str(op)
+            if name in ("GROUPREF", "GROUPREF_EXISTS"):
+                raise _Refused("backreferences are not supported")
+            if name in ("ATOMIC_GROUP", "POSSESSIVE_REPEAT"):
+                raise _Refused("atomic groups and possessive quantifiers are not supported")
+            if name in _CHAR_OPS:
+                pending = self.fence(pending, self.chars([(op, av)]))
+            elif name in ("MAX_REPEAT", "MIN_REPEAT"):
+                pending = self.repeat(av, pending, repeated)
+            elif name == "BRANCH":
+                if repeated:
+                    raise _Refused("alternation inside a repeated group can backtrack exponentially")
+                pending = [p for branch in av[1] for p in self.sequence(branch, pending, repeated)]
+            elif name == "SUBPATTERN":
+                pending = self.sequence(av[-1], pending, repeated)
+            elif name in ("ASSERT", "ASSERT_NOT"):
+                self.sequence(av[1], [], repeated)
+        return pending
+
+    def repeat(self, av, pending, repeated):
+        lo, hi, body = av
+        if hi == 0:
+            return pending
+        if lo == hi:
+            return self.sequence(body, pending, repeated or hi > 1)
+        if repeated:
+            raise _Refused("nested quantifiers can backtrack exponentially")
+        if hi == _sre_parse.MAXREPEAT:
+            self.open_repeats += 1
+        self.sequence(body, [], hi > 1)
+        chars = self.chars(body)
+        first, empty = self.first(body)
+        if empty:
+            first = chars
+        for p, fences in pending:
+            if p & first and all(p & f & chars for f in fences):
+                raise _Refused("adjacent quantifiers that can match the same characters backtrack heavily")
+        if lo:
+            pending = self.fence(pending, chars)
+        return pending + [(chars, [])]
+
+
+def regex_problem(pattern):
+    """
+    Why `pattern` is refused for `matches`, or None. Python regexes have no
+    timeout, so patterns that can backtrack badly are refused up front:
+    backreferences, a quantifier or alternation inside a repeated group
+    (exponential), two variable repetitions that can match the same
+    characters with nothing between them that only one of them can match
+    (`a*a*`, `.*x.*`: polynomial), and more than MAX_OPEN_REPEATS unbounded
+    repetitions. What is left costs about linear time per start position;
+    with user values capped at MAX_MATCH_INPUT characters, that bounds the
+    cost of one match.
+    """
+    if not isinstance(pattern, str):
+        return "patterns must be strings"
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        return f"patterns are limited to {MAX_PATTERN_LENGTH} characters"
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except (re.error, OverflowError, RecursionError) as e:
+        return f"invalid pattern: {e}"
+    screen = _Screen(parsed)
+    try:
+        screen.sequence(parsed, [], False)
+    except _Refused as e:
+        return str(e)
+    if screen.open_repeats > MAX_OPEN_REPEATS:
+        return f"at most {MAX_OPEN_REPEATS} unbounded repetitions (*, +, {{n,}}) per pattern"
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _regex(pattern):
+    """Compiled `pattern`, or None if regex_problem refuses it."""
+    if not isinstance(pattern, str) or regex_problem(pattern):
+        return None
+    return re.compile(pattern)
+
+
+# op -> (parse, compare): the user value, parsed, compared with each parsed clause value
+_ORDERED = {
+    "lt": (_number, operator.lt),
+    "lte": (_number, operator.le),
+    "gt": (_number, operator.gt),
+    "gte": (_number, operator.ge),
+    "semver_eq": (_version, operator.eq),
+    "semver_lt": (_version, operator.lt),
+    "semver_lte": (_version, operator.le),
+    "semver_gt": (_version, operator.gt),
+    "semver_gte": (_version, operator.ge),
+    "date_before": (_timestamp, operator.lt),
+    "date_after": (_timestamp, operator.gt),
+}
+_EXPECTED = {
+    _number: "a finite number",
+    _version: "a semantic version such as 1.4.0",
+    _timestamp: "an ISO 8601 date/time or epoch milliseconds",
+}
+
+
+def clause_match(user: dict, clause: dict, segments=None) -> bool:
+    """`segments` maps segment keys to their members, for `in_segment` clauses."""
     attr = clause.get("attr")
     op = clause.get("op")
     values = clause.get("values", [])
@@ -19,10 +316,252 @@ def clause_match(user: dict, clause: dict) -> bool:
         return v in values
     if op == "contains" and isinstance(v, str):
         return any(str(x).lower() in v.lower() for x in values)
+    if op == "in_segment" and isinstance(v, str):
+        return any(v in (segments or {}).get(x, ()) for x in values if isinstance(x, str))
+    if op == "starts_with" and isinstance(v, str):
+        return any(v.lower().startswith(str(x).lower()) for x in values)
+    if op == "ends_with" and isinstance(v, str):
+        return any(v.lower().endswith(str(x).lower()) for x in values)
+    if op == "matches" and isinstance(v, str) and len(v) <= MAX_MATCH_INPUT:
+        return any(r is not None and r.search(v) is not None for r in map(_regex, values))
+    if op in _ORDERED:
+        parse, compare = _ORDERED[op]
+        a = parse(v)
+        return a is not None and any(b is not None and compare(a, b) for b in map(parse, values))
     return False
 
-def rule_matches(user: dict, clauses: list) -> bool:
+
+def rule_matches(user: dict, clauses: list, segments=None) -> bool:
     for c in clauses or []:
-        if not clause_match(user, c):
+        if not clause_match(user, c, segments):
             return False
     return True
+
+
+def validate_clause(clause) -> None:
+    if not isinstance(clause, dict):
+        raise ClauseError("Each clause must be an object.")
+    attr = clause.get("attr")
+    if not isinstance(attr, str) or not attr:
+        raise ClauseError("Clause 'attr' must be a non-empty string.")
+    op = clause.get("op")
+    if op not in OPERATORS:
+        raise ClauseError(f"Unsupported clause op {op!r}; expected one of {', '.join(OPERATORS)}.")
+    if not isinstance(clause.get("values"), list):
+        raise ClauseError("Clause 'values' must be a list.")
+    values = clause["values"]
+    if op == "in_segment" and not all(isinstance(x, str) and x for x in values):
+        raise ClauseError("Clause 'values' of in_segment must be segment keys.")
+    if op in ("starts_with", "ends_with") and not all(isinstance(x, str) for x in values):
+        raise ClauseError(f"Clause 'values' of {op} must be strings.")
+    if op == "matches":
+        for x in values:
+            problem = regex_problem(x)
+            if problem:
+                raise ClauseError(f"Clause pattern {x!r} refused: {problem}.")
+    if op in _ORDERED:
+        parse = _ORDERED[op][0]
+        for x in values:
+            if parse(x) is None:
+                raise ClauseError(f"Clause value {x!r} is not {_EXPECTED[parse]} ({op}).")
+
+
+def validate_clauses(clauses) -> None:
+    if not isinstance(clauses, list):
+        raise ClauseError("Clauses must be a list.")
+    for i, clause in enumerate(clauses):
+        try:
+            validate_clause(clause)
+        except ClauseError as e:
+            raise ClauseError(f"Clause {i}: {e}") from None
+
+
+def segment_keys(clauses) -> set:
+    """Keys of the segments that `in_segment` clauses in `clauses` refer to."""
+    keys = set()
+    if isinstance(clauses, (list, tuple)):
+        for c in clauses:
+            if isinstance(c, dict) and c.get("op") == "in_segment" and isinstance(c.get("values"), list):
+                keys.update(x for x in c["values"] if isinstance(x, str))
+    return keys
+
+
+# --- compiled matchers -------------------------------------------------------
+# compile_clause/compile_rule turn stored JSON into callables(user) -> bool with
+# exactly the semantics of clause_match/rule_matches above. Shapes the compiler
+# does not recognise (legacy rows saved before validation) fall back to the
+# interpreter so results never change.
+
+def _always(user):
+    return True
+
+
+def _never(user):
+    return False
+
+
+def _compile_membership(attr, values):
+    hashable, unhashable = set(), []
+    for x in values:
+        try:
+            hashable.add(x)
+        except TypeError:
+            unhashable.append(x)
+    members = frozenset(hashable)
+    unhashable = tuple(unhashable)
+
+    def match(user):
+        v = user.get(attr)
+        try:
+            if v in members:
+                return True
+        except TypeError:
+            # unhashable user value (list/dict): only equality can match
+            return v in values
+        return bool(unhashable) and v in unhashable
+
+    return match
+
+
+def _compile_contains(attr, values):
+    needles = tuple(str(x).lower() for x in values)
+    if not needles:
+        return _never
+
+    def match(user):
+        v = user.get(attr)
+        if not isinstance(v, str):
+            return False
+        v = v.lower()
+        for n in needles:
+            if n in v:
+                return True
+        return False
+
+    return match
+
+
+def _compile_segments(attr, values, segments):
+    # unknown segments match nobody, like an empty one
+    sets = tuple(segments[k] for k in dict.fromkeys(values) if k in segments)
+    if not sets:
+        return _never
+    if len(sets) == 1:
+        members = sets[0]
+
+        def match(user):
+            v = user.get(attr)
+            return isinstance(v, str) and v in members
+
+        return match
+
+    def match_any(user):
+        v = user.get(attr)
+        if not isinstance(v, str):
+            return False
+        for members in sets:
+            if v in members:
+                return True
+        return False
+
+    return match_any
+
+
+def _compile_affix(attr, op, values):
+    # str.startswith/endswith take a tuple: one call tries every needle
+    needles = tuple(str(x).lower() for x in values)
+    if not needles:
+        return _never
+    if op == "starts_with":
+        def match(user):
+            v = user.get(attr)
+            return isinstance(v, str) and v.lower().startswith(needles)
+    else:
+        def match(user):
+            v = user.get(attr)
+            return isinstance(v, str) and v.lower().endswith(needles)
+    return match
+
+
+def _compile_regex(attr, values):
+    patterns = tuple(r for r in map(_regex, values) if r is not None)
+    if not patterns:
+        return _never
+
+    def match(user):
+        v = user.get(attr)
+        if not isinstance(v, str) or len(v) > MAX_MATCH_INPUT:
+            return False
+        for p in patterns:
+            if p.search(v) is not None:
+                return True
+        return False
+
+    return match
+
+
+def _compile_ordered(attr, op, values):
+    # Clause values are parsed here, once; "any value" reduces to one bound.
+    parse, compare = _ORDERED[op]
+    bounds = [b for b in map(parse, values) if b is not None]
+    if not bounds:
+        return _never
+    if compare is operator.eq:
+        members = frozenset(bounds)
+
+        def match_eq(user):
+            a = parse(user.get(attr))
+            return a is not None and a in members
+
+        return match_eq
+    bound = max(bounds) if compare in (operator.lt, operator.le) else min(bounds)
+
+    def match(user):
+        a = parse(user.get(attr))
+        return a is not None and compare(a, bound)
+
+    return match
+
+
+def compile_clause(clause, segments=None):
+    segments = segments or {}
+    try:
+        validate_clause(clause)
+    except ClauseError:
+        if not isinstance(clause, dict):
+            return lambda user: clause_match(user, clause, segments)
+        if not clause.get("attr") or not clause.get("op") or clause.get("op") not in OPERATORS:
+            return _never
+        return lambda user: clause_match(user, clause, segments)
+
+    attr, op, values = clause["attr"], clause["op"], clause["values"]
+    if op in ("equals", "in"):
+        return _compile_membership(attr, values)
+    if op == "in_segment":
+        return _compile_segments(attr, values, segments)
+    if op in ("starts_with", "ends_with"):
+        return _compile_affix(attr, op, values)
+    if op == "matches":
+        return _compile_regex(attr, values)
+    if op in _ORDERED:
+        return _compile_ordered(attr, op, values)
+    return _compile_contains(attr, values)
+
+
+def compile_rule(clauses, segments=None):
+    """`segments` maps segment keys to their members, for `in_segment` clauses."""
+    if not isinstance(clauses, (list, tuple)):
+        return lambda user: rule_matches(user, clauses, segments)
+    matchers = tuple(compile_clause(c, segments) for c in clauses)
+    if not matchers:
+        return _always
+    if len(matchers) == 1:
+        return matchers[0]
+
+    def match(user):
+        for m in matchers:
+            if not m(user):
+                return False
+        return True
+
+    return match
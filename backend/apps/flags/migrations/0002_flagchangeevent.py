@@ -0,0 +1,26 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_environment_config_version"),
+        ("flags", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlagChangeEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(max_length=32)),
+                ("flag_key", models.CharField(blank=True, max_length=64)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("environment", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="change_events", to="core.environment")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["environment", "id"], name="flags_flagc_environ_7d49d7_idx")],
+            },
+        ),
+    ]
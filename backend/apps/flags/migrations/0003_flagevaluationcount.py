@@ -0,0 +1,28 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_organization_audit_retention_days"),
+        ("flags", "0002_flagchangeevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FlagEvaluationCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bucket_start", models.DateTimeField()),
+                ("flag_key", models.CharField(max_length=64)),
+                ("value", models.CharField(max_length=255)),
+                ("reason", models.CharField(max_length=32)),
+                ("count", models.PositiveBigIntegerField(default=0)),
+                ("environment", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="evaluation_counts", to="core.environment")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("environment", "bucket_start", "flag_key", "value", "reason"), name="flag_evaluation_count_key")],
+            },
+        ),
+    ]
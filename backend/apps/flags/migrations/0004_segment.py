@@ -0,0 +1,43 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_organization_audit_retention_days"),
+        ("flags", "0003_flagevaluationcount"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Segment",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("key", models.SlugField(max_length=64)),
+                ("name", models.CharField(max_length=255)),
+                ("description", models.TextField(blank=True)),
+                ("size", models.PositiveBigIntegerField(default=0)),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                ("project", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="segments", to="core.project")),
+            ],
+            options={
+                "unique_together": {("project", "key")},
+            },
+        ),
+        migrations.CreateModel(
+            name="SegmentChunk",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("bucket", models.PositiveIntegerField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                ("data", models.BinaryField(default=b"")),
+                ("segment", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="chunks", to="flags.segment")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("segment", "bucket"), name="segment_chunk_bucket")],
+            },
+        ),
+    ]
@@ -42,3 +42,58 @@ class FlagRule(models.Model):
 
     class Meta:
         ordering = ["priority", "id"]
+
+class FlagChangeEvent(models.Model):
+    """Append-only log of config changes; feeds the SDK change stream (SSE)."""
+    environment = models.ForeignKey(Environment, on_delete=models.CASCADE, related_name="change_events")
+    kind = models.CharField(max_length=32)
+    flag_key = models.CharField(max_length=64, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["environment", "id"])]
+
+class FlagEvaluationCount(models.Model):
+    """Evaluations served per (flag, value, reason) and time bucket; written by apps.flags.counters."""
+    environment = models.ForeignKey(Environment, on_delete=models.CASCADE, related_name="evaluation_counts")
+    bucket_start = models.DateTimeField()
+    flag_key = models.CharField(max_length=64)
+    value = models.CharField(max_length=255)  # JSON of the served value
+    reason = models.CharField(max_length=32)
+    count = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["environment", "bucket_start", "flag_key", "value", "reason"],
+                name="flag_evaluation_count_key",
+            )
+        ]
+
+class Segment(models.Model):
+    """A named set of user keys in a project, matched by `in_segment` clauses (see apps.flags.segments)."""
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="segments")
+    key = models.SlugField(max_length=64)
+    name = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)  # bumped by every membership change
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("project", "key")
+
+    def __str__(self):
+        return f"{self.project.org.slug}/{self.project.key}:{self.key}"
+
+class SegmentChunk(models.Model):
+    """One hash bucket of a segment's members: the keys sorted, newline-joined and zlib-compressed."""
+    segment = models.ForeignKey(Segment, on_delete=models.CASCADE, related_name="chunks")
+    bucket = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    data = models.BinaryField(default=b"")
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["segment", "bucket"], name="segment_chunk_bucket")]
@@ -0,0 +1,147 @@
+"""
+Environment promote and clone: copy every flag's state and rules from one
+environment of a project to another.
+
+`promote(source, target)` compares the two environments flag by flag and
+writes only what differs: missing states are created, changed states are
+updated, and a state whose rules differ gets the source's rule list. It takes
+a fixed number of queries however many flags the project has (reads: two;
+writes: one bulk_create/bulk_update each), then one config_changed for the
+target. The diff is read and applied in one transaction that holds the
+target environment's row and its states locked, so a concurrent promote or
+state edit cannot change the target between the two. With dry_run it only
+returns the diff.
+
+`clone_environment(source, ...)` creates a new environment (with its own SDK
+keys) and promotes the source into it.
+"""
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.audit.services import audit
+from apps.core.models import Environment
+from apps.flags.bulk import AUDIT_KEYS_LIMIT, DEFAULT_STATE
+from apps.flags.models import FeatureFlag, FlagRule, FlagState
+from apps.flags.signals import config_changed, muted
+from apps.flags.snapshot import RULE_FIELDS, STATE_FIELDS, rule_specs
+
+
+def _states(env, flag_ids=None, lock=False):
+    qs = FlagState.objects.filter(environment=env).select_related("flag").prefetch_related(
+        Prefetch("rules", queryset=FlagRule.objects.order_by("priority", "id"))
+    )
+    if flag_ids is not None:
+        qs = qs.filter(flag_id__in=flag_ids)
+    if lock:
+        qs = qs.select_for_update(of=("self",))
+    return list(qs)
+
+
+def promote(source, target, flag_keys=None, actor=None, dry_run=False):
+    """
+    Make `target`'s states and rules match `source`'s, for all flags or only
+    `flag_keys`. Returns {"summary": {...}, "changes": [per changed flag]}.
+    """
+    if source.project_id != target.project_id:
+        raise ValueError("source and target must belong to the same project")
+    with transaction.atomic():
+        result = _promote(source, target, flag_keys, dry_run)
+    if dry_run or not result["changes"]:
+        return result
+    keys = [c["flag"] for c in result["changes"]]
+    audit(
+        actor,
+        source.project.org,
+        "environment.promote",
+        {
+            "project": source.project.key,
+            "env": target.key,
+            "from": source.key,
+            **result["summary"],
+            "flags": keys[:AUDIT_KEYS_LIMIT],
+            "truncated": len(keys) > AUDIT_KEYS_LIMIT,
+        },
+    )
+    return result
+
+
+def _promote(source, target, flag_keys, dry_run):
+    if not dry_run:
+        # Serializes promotes into target; the states lock below does not cover states not created yet.
+        Environment.objects.select_for_update().only("id").get(pk=target.pk)
+    flag_ids = None
+    if flag_keys is not None:
+        flags = FeatureFlag.objects.filter(project_id=source.project_id, key__in=flag_keys)
+        flag_ids = list(flags.values_list("id", flat=True))
+    sources = _states(source, flag_ids)
+    targets = {st.flag_id: st for st in _states(target, flag_ids, lock=not dry_run)}
+
+    now = timezone.now()
+    new_states, changed_states, replaced, rule_lists, changes = [], [], [], [], []
+    unchanged = 0
+    for src in sources:
+        src_rules = rule_specs(src)
+        dst = targets.get(src.flag_id)
+        if dst is None:
+            dst = FlagState(flag_id=src.flag_id, environment=target, **{f: getattr(src, f) for f in STATE_FIELDS})
+            new_states.append(dst)
+            rule_lists.append((dst, src_rules))
+            changes.append({"flag": src.flag.key, "action": "create", "rules": {"from": 0, "to": len(src_rules)}})
+            continue
+        fields = {
+            f: {"from": getattr(dst, f), "to": getattr(src, f)}
+            for f in STATE_FIELDS
+            if getattr(dst, f) != getattr(src, f)
+        }
+        dst_rules = rule_specs(dst)
+        if not fields and dst_rules == src_rules:
+            unchanged += 1
+            continue
+        change = {"flag": src.flag.key, "action": "update", "fields": fields}
+        if fields:
+            for f in fields:
+                setattr(dst, f, getattr(src, f))
+            dst.updated_at = now  # bulk_update skips auto_now
+            changed_states.append(dst)
+        if dst_rules != src_rules:
+            replaced.append(dst.id)
+            rule_lists.append((dst, src_rules))
+            change["rules"] = {"from": len(dst_rules), "to": len(src_rules)}
+        changes.append(change)
+
+    summary = {"created": len(new_states), "updated": len(changes) - len(new_states), "unchanged": unchanged}
+    result = {"source": source.key, "target": target.key, "dry_run": dry_run, "summary": summary, "changes": changes}
+    if dry_run or not changes:
+        return result
+
+    with muted():
+        FlagState.objects.bulk_create(new_states)
+        FlagState.objects.bulk_update(changed_states, [*STATE_FIELDS, "updated_at"])
+        if replaced:
+            FlagRule.objects.filter(state_id__in=replaced).delete()
+        FlagRule.objects.bulk_create(
+            FlagRule(state=state, priority=priority, **{f: rule[f] for f in RULE_FIELDS})
+            for state, rules in rule_lists
+            for priority, rule in enumerate(rules)
+        )
+        config_changed([target.id], "environment.promoted")
+    return result
+
+
+def clone_environment(source, name, key, actor=None):
+    """Create environment `key` in source's project as a copy of `source`."""
+    with transaction.atomic():
+        env = Environment.objects.create(project=source.project, name=name, key=key)
+        result = promote(source, env, actor=actor)
+    return env, result
+
+
+def create_default_states(env):
+    """Give a new environment the default (off) state of every existing flag."""
+    flag_ids = list(FeatureFlag.objects.filter(project_id=env.project_id).values_list("id", flat=True))
+    FlagState.objects.bulk_create(
+        FlagState(flag_id=flag_id, environment=env, **{f: DEFAULT_STATE[f] for f in STATE_FIELDS})
+        for flag_id in flag_ids
+    )
+    return len(flag_ids)
@@ -0,0 +1,297 @@
+"""
+Immutable, precompiled per-environment rulesets and the per-worker cache
+that serves them to the SDK evaluate endpoint.
+
+A ruleset is built once per (environment, config_version). Readers look it
+up with a plain dict read and never take a lock; a rebuilt ruleset replaces
+the previous one with a single dict assignment.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+from django.db.models import Prefetch, Q
+
+from apps.core.metrics import Gauge, cache_lookup
+from apps.flags.bucketing import salt, rule_salt, bucket_bytes
+from apps.flags.eval import compile_rule, segment_keys
+from apps.flags.models import FlagState, FlagRule
+from apps.flags.segments import project_segments
+
+
+@dataclass(frozen=True)
+class CompiledRule:
+    id: int
+    clauses: list  # raw JSON, kept for ruleset_payload()
+    matches: object  # compiled clauses: callable(user) -> bool
+    rollout_percentage: int
+    salt: bytes
+    result: dict  # shared, treat as read-only
+
+
+@dataclass(frozen=True)
+class CompiledFlag:
+    key: str
+    enabled: bool
+    rollout_percentage: int
+    salt: bytes
+    rules: tuple
+    off_result: dict  # shared, treat as read-only
+    excluded_result: dict
+    default_result: dict
+
+
+@dataclass(frozen=True)
+class Ruleset:
+    environment_id: int
+    environment_key: str
+    version: int
+    flags: tuple
+    segments: dict = field(default_factory=dict)  # segment key -> frozenset of members, shared
+
+    def select(self, keys=None, prefix=None):
+        """Sub-ruleset holding only flags named in `keys` or starting with `prefix`."""
+        wanted = set(keys or ())
+        flags = tuple(
+            f for f in self.flags
+            if f.key in wanted or (prefix and f.key.startswith(prefix))
+        )
+        return Ruleset(self.environment_id, self.environment_key, self.version, flags, self.segments)
+
+
+class Result(dict):
+    """
+    A shared evaluation result. It knows which environment and flag produced
+    it and hashes by identity, so apps.flags.counters can count results as-is
+    without building keys or serializing values on the hot path.
+    """
+    __slots__ = ("environment_id", "flag_key")
+    __hash__ = object.__hash__
+
+
+def _result(environment_id, flag_key, value, reason, variation):
+    result = Result(value=value, reason=reason, variation=variation)
+    result.environment_id = environment_id
+    result.flag_key = flag_key
+    return result
+
+
+def compile_state(st, segments=None):
+    flag_key = st.flag.key
+    env_id = st.environment_id
+    on_value = st.on_variation.get("value")
+    off_value = st.off_variation.get("value")
+    variation = {"on": on_value, "off": off_value}
+    rules = tuple(
+        CompiledRule(
+            id=rule.id,
+            clauses=rule.clauses,
+            matches=compile_rule(rule.clauses, segments),
+            rollout_percentage=rule.rollout_percentage,
+            salt=rule_salt(flag_key, rule.id),
+            result=_result(env_id, flag_key, rule.variation.get("value"), "rule_match", variation),
+        )
+        for rule in st.rules.all()
+    )
+    return CompiledFlag(
+        key=flag_key,
+        enabled=st.enabled,
+        rollout_percentage=st.rollout_percentage,
+        salt=salt(flag_key),
+        rules=rules,
+        off_result=_result(env_id, flag_key, off_value, "off", variation),
+        excluded_result=_result(env_id, flag_key, off_value, "rollout_excluded", variation),
+        default_result=_result(env_id, flag_key, st.default_variation.get("value"), "default", variation),
+    )
+
+
+def selection_filter(keys=None, prefix=None):
+    q = Q(flag__key__in=list(keys or ()))
+    if prefix:
+        q |= Q(flag__key__startswith=prefix)
+    return q
+
+
+def state_queryset(env, keys=None, prefix=None):
+    qs = FlagState.objects.filter(environment=env)
+    if keys is not None or prefix:
+        qs = qs.filter(selection_filter(keys, prefix))
+    return (
+        qs
+        .select_related("flag")
+        .prefetch_related(Prefetch("rules", queryset=FlagRule.objects.order_by("priority", "id")))
+        .order_by("id")
+    )
+
+
+def load_ruleset(env, keys=None, prefix=None):
+    # Read the version before the rows: a concurrent change can only make the
+    # cached copy newer than its version, never older.
+    version = env.config_version
+    states = list(state_queryset(env, keys, prefix))
+    wanted = set().union(*(segment_keys(rule.clauses) for st in states for rule in st.rules.all()))
+    segments = project_segments(env.project_id, wanted) if wanted else {}
+    flags = tuple(compile_state(st, segments) for st in states)
+    return Ruleset(
+        environment_id=env.id, environment_key=env.key, version=version, flags=flags, segments=segments
+    )
+
+
+def evaluate_flag(flag, user, user_key_bytes):
+    if not flag.enabled:
+        return flag.off_result
+
+    if flag.rollout_percentage < 100:
+        if bucket_bytes(user_key_bytes, flag.salt) >= flag.rollout_percentage:
+            return flag.excluded_result
+
+    for rule in flag.rules:
+        if rule.matches(user):
+            if rule.rollout_percentage < 100:
+                if bucket_bytes(user_key_bytes, rule.salt) >= rule.rollout_percentage:
+                    continue
+            return rule.result
+
+    return flag.default_result
+
+
+def evaluate(ruleset, user):
+    user_key_bytes = str(user.get("key") or "").encode("utf-8")
+    return {flag.key: evaluate_flag(flag, user, user_key_bytes) for flag in ruleset.flags}
+
+
+def evaluate_profiled(ruleset, user):
+    """
+    evaluate() that also measures itself, for sampled metrics requests.
+    Returns (results, rules_tried, clause_match_seconds, bucketing_seconds).
+    Same decisions as evaluate_flag, step for step.
+    """
+    clock = time.perf_counter
+    user_key_bytes = str(user.get("key") or "").encode("utf-8")
+    results = {}
+    rules_tried = 0
+    match_time = bucket_time = 0.0
+    for flag in ruleset.flags:
+        if not flag.enabled:
+            results[flag.key] = flag.off_result
+            continue
+        if flag.rollout_percentage < 100:
+            t = clock()
+            excluded = bucket_bytes(user_key_bytes, flag.salt) >= flag.rollout_percentage
+            bucket_time += clock() - t
+            if excluded:
+                results[flag.key] = flag.excluded_result
+                continue
+        result = flag.default_result
+        for rule in flag.rules:
+            rules_tried += 1
+            t = clock()
+            matched = rule.matches(user)
+            match_time += clock() - t
+            if not matched:
+                continue
+            if rule.rollout_percentage < 100:
+                t = clock()
+                excluded = bucket_bytes(user_key_bytes, rule.salt) >= rule.rollout_percentage
+                bucket_time += clock() - t
+                if excluded:
+                    continue
+            result = rule.result
+            break
+        results[flag.key] = result
+    return results, rules_tried, match_time, bucket_time
+
+
+def ruleset_payload(ruleset):
+    """JSON form of a ruleset, as downloaded by server-side SDKs for local evaluation."""
+    return {
+        "environment": ruleset.environment_key,
+        "version": ruleset.version,
+        "flags": [
+            {
+                "key": f.key,
+                "enabled": f.enabled,
+                "rollout_percentage": f.rollout_percentage,
+                "on_value": f.off_result["variation"]["on"],
+                "off_value": f.off_result["value"],
+                "default_value": f.default_result["value"],
+                "rules": [
+                    {
+                        "id": r.id,
+                        "clauses": r.clauses,
+                        "rollout_percentage": r.rollout_percentage,
+                        "value": r.result["value"],
+                    }
+                    for r in f.rules
+                ],
+            }
+            for f in ruleset.flags
+        ],
+        # members of the segments that in_segment clauses above refer to
+        "segments": {key: sorted(members) for key, members in ruleset.segments.items()},
+    }
+
+
+_rulesets = {}  # environment_id -> Ruleset
+_compile_lock = threading.Lock()
+
+Gauge(
+    "flagship_rulesets_cached", "Compiled rulesets held by this worker.",
+    lambda: [((), len(_rulesets))],
+)
+
+
+def get_ruleset(env):
+    """
+    Return the compiled ruleset for `env` at `env.config_version`.
+    A hit costs no queries; a miss compiles (one compile at a time per worker).
+    """
+    rs = _rulesets.get(env.id)
+    if rs is not None and rs.version == env.config_version:
+        cache_lookup("ruleset", True)
+        return rs
+    cache_lookup("ruleset", False)
+    with _compile_lock:
+        rs = _rulesets.get(env.id)
+        if rs is not None and rs.version >= env.config_version:
+            return rs
+        rs = load_ruleset(env)
+        _rulesets[env.id] = rs
+    return rs
+
+
+def get_selected_ruleset(env, keys=None, prefix=None):
+    """
+    Ruleset restricted to the requested flag keys / key prefix. Served from
+    the cached full ruleset when it is current, otherwise only the selected
+    flags are loaded (and the partial result is not cached).
+    """
+    if keys is None and not prefix:
+        return get_ruleset(env)
+    rs = _rulesets.get(env.id)
+    hit = rs is not None and rs.version == env.config_version
+    cache_lookup("ruleset", hit)
+    if hit:
+        return rs.select(keys, prefix)
+    return load_ruleset(env, keys, prefix)
+
+
+async def aget_selected_ruleset(env, keys=None, prefix=None):
+    """
+    get_selected_ruleset for async views: a current cached ruleset is a dict
+    read on the event loop; only compiling one (queries) runs in a thread.
+    """
+    rs = _rulesets.get(env.id)
+    if rs is not None and rs.version == env.config_version:
+        cache_lookup("ruleset", True)
+        return rs if keys is None and not prefix else rs.select(keys, prefix)
+    return await sync_to_async(get_selected_ruleset)(env, keys, prefix)
+
+
+def discard_ruleset(environment_id):
+    _rulesets.pop(environment_id, None)
+
+
+def clear_rulesets():
+    _rulesets.clear()
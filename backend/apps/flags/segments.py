@@ -0,0 +1,168 @@
+"""
+User segments: named per-project sets of user keys, referenced from rule
+clauses as {"attr": "key", "op": "in_segment", "values": ["beta-testers"]}.
+
+Storage. A member belongs to one of BUCKETS hash buckets (crc32 of the key);
+each non-empty bucket is one SegmentChunk row holding its keys sorted,
+newline-joined and zlib-compressed. A segment of a million keys is at most
+BUCKETS rows of a few KB each instead of a million rows plus an index.
+apply_changes() rewrites only the buckets an upload touches, so adding or
+removing a handful of keys costs a handful of small row updates however
+large the segment is. Uploads of one segment are serialized by a row lock
+on the Segment.
+
+Evaluation. A ruleset that references segments loads their members into
+frozensets (exact, O(1) lookups) held in a per-worker cache keyed by segment
+id and version: all environments of the project share one copy, and a
+ruleset recompiled for an unrelated change reuses it without reading the
+chunks again. Every membership change bumps Segment.version, and saving the
+segment bumps config_version of the project's environments
+(apps.flags.signals), so rulesets, SDK caches and streams pick it up.
+"""
+import threading
+import zlib
+from collections import defaultdict
+
+from django.db import transaction
+
+from apps.audit.services import audit
+from apps.core.metrics import Gauge, cache_lookup
+from apps.flags.models import Segment, SegmentChunk
+
+# Changing this re-buckets every key: stored segments would have to be rewritten.
+BUCKETS = 256
+MAX_KEY_LENGTH = 256
+
+
+class SegmentError(ValueError):
+    pass
+
+
+def bucket(key):
+    return zlib.crc32(key.encode("utf-8")) % BUCKETS
+
+
+def encode(keys):
+    return zlib.compress("\n".join(sorted(keys)).encode("utf-8")) if keys else b""
+
+
+def decode(data):
+    return zlib.decompress(data).decode("utf-8").split("\n") if data else []
+
+
+def clean_keys(keys, field):
+    """`keys` as a set, or SegmentError naming `field` if any is not a valid user key."""
+    if not isinstance(keys, (list, tuple, set, frozenset)):
+        raise SegmentError(f"'{field}' must be a list of user keys.")
+    for key in keys:
+        if not isinstance(key, str) or not key or len(key) > MAX_KEY_LENGTH or "\n" in key:
+            raise SegmentError(
+                f"'{field}' contains {key!r}: user keys must be non-empty strings of at most "
+                f"{MAX_KEY_LENGTH} characters without newlines."
+            )
+    return set(keys)
+
+
+def apply_changes(segment, add=(), remove=(), actor=None):
+    """
+    Add and remove members of `segment`, rewriting only the affected buckets.
+    Returns {"segment", "added", "removed", "size", "version"}; added/removed
+    count actual changes (adding a member twice is a no-op).
+    """
+    add, remove = clean_keys(add, "add"), clean_keys(remove, "remove")
+    both = add & remove
+    if both:
+        raise SegmentError(f"Keys both added and removed: {', '.join(sorted(both)[:10])}.")
+    changes = defaultdict(lambda: (set(), set()))
+    for key in add:
+        changes[bucket(key)][0].add(key)
+    for key in remove:
+        changes[bucket(key)][1].add(key)
+
+    added = removed = 0
+    with transaction.atomic():
+        segment = Segment.objects.select_related("project__org").select_for_update().get(pk=segment.pk)
+        chunks = {c.bucket: c for c in SegmentChunk.objects.filter(segment=segment, bucket__in=list(changes))}
+        new_chunks, changed_chunks = [], []
+        for b, (adds, removes) in changes.items():
+            chunk = chunks.get(b) or SegmentChunk(segment=segment, bucket=b)
+            keys = set(decode(chunk.data))
+            before = len(keys)
+            keys |= adds
+            grown = len(keys) - before
+            keys -= removes
+            shrunk = before + grown - len(keys)
+            if not grown and not shrunk:
+                continue
+            added += grown
+            removed += shrunk
+            chunk.data, chunk.count = encode(keys), len(keys)
+            (changed_chunks if chunk.pk else new_chunks).append(chunk)
+        if new_chunks or changed_chunks:
+            SegmentChunk.objects.bulk_create(new_chunks)
+            SegmentChunk.objects.bulk_update(changed_chunks, ["data", "count"])
+            segment.size += added - removed
+            segment.version += 1
+            segment.save(update_fields=["size", "version", "updated_at"])  # -> config_changed (signals)
+
+    result = {"segment": segment.key, "added": added, "removed": removed, "size": segment.size,
+              "version": segment.version}
+    if added or removed:
+        audit(actor, segment.project.org, "segment.members", {"project": segment.project.key, **result})
+    return result
+
+
+def is_member(segment, key):
+    """Whether `key` is in `segment`, from the database (reads one bucket)."""
+    data = (
+        SegmentChunk.objects.filter(segment=segment, bucket=bucket(key)).values_list("data", flat=True).first()
+    )
+    return key in decode(data)
+
+
+def load_members(segment_id):
+    members = set()
+    for data in SegmentChunk.objects.filter(segment_id=segment_id).values_list("data", flat=True):
+        members.update(decode(data))
+    return frozenset(members)
+
+
+# --- per-worker member cache -------------------------------------------------
+
+_members = {}  # segment id -> (version, frozenset of keys)
+_load_lock = threading.Lock()
+
+Gauge(
+    "flagship_segment_members_cached", "Segment members held in memory by this worker.",
+    lambda: [((), sum(len(keys) for _, keys in list(_members.values())))],
+)
+
+
+def members(segment_id, version):
+    """Members of the segment at `version` (or newer); a miss reads its chunks."""
+    cached = _members.get(segment_id)
+    if cached is not None and cached[0] == version:
+        cache_lookup("segment", True)
+        return cached[1]
+    cache_lookup("segment", False)
+    with _load_lock:
+        cached = _members.get(segment_id)
+        if cached is not None and cached[0] >= version:
+            return cached[1]
+        keys = load_members(segment_id)
+        _members[segment_id] = (version, keys)
+    return keys
+
+
+def project_segments(project_id, keys):
+    """{segment key: frozenset of members} for those of `keys` that exist in the project."""
+    rows = Segment.objects.filter(project_id=project_id, key__in=list(keys)).values_list("id", "key", "version")
+    return {key: members(segment_id, version) for segment_id, key, version in rows}
+
+
+def discard_members(segment_id):
+    _members.pop(segment_id, None)
+
+
+def clear_members():
+    _members.clear()
@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from apps.flags.models import FeatureFlag, FlagState, FlagRule
+from apps.core.models import Project
+from apps.flags.models import FeatureFlag, FlagState, FlagRule, Segment
+from apps.flags.eval import validate_clauses, ClauseError
 
 
 class FeatureFlagSerializer(serializers.ModelSerializer):
@@ -15,6 +18,13 @@ class FlagRuleSerializer(serializers.ModelSerializer):
         fields = ["id", "state", "priority", "clauses", "variation", "rollout_percentage", "created_at"]
         read_only_fields = ["created_at"]
 
+    def validate_clauses(self, value):
+        try:
+            validate_clauses(value)
+        except ClauseError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
 
 class FlagStateSerializer(serializers.ModelSerializer):
     rules = FlagRuleSerializer(many=True, read_only=True)
@@ -41,3 +51,81 @@ class FlagStateUpdateSerializer(serializers.ModelSerializer):
         if value < 0 or value > 100:
             raise serializers.ValidationError("Rollout must be between 0 and 100.")
         return value
+
+
+class SegmentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Segment
+        fields = ["id", "project", "key", "name", "description", "size", "version", "created_at", "updated_at"]
+        read_only_fields = ["size", "version", "created_at", "updated_at"]
+
+
+# ✅ Bulk import (POST /api/flags/bulk/, manage.py import_flags). Plain
+# serializers so validating thousands of definitions costs no per-row queries;
+# keys and environments are checked against the project once, in validate().
+class RuleDefinitionSerializer(serializers.Serializer):
+    clauses = serializers.JSONField()
+    variation = serializers.DictField(required=False, default=dict)
+    rollout_percentage = serializers.IntegerField(min_value=0, max_value=100, default=100)
+
+    def validate_clauses(self, value):
+        try:
+            validate_clauses(value)
+        except ClauseError as e:
+            raise serializers.ValidationError(str(e))
+        return value
+
+
+class StateDefinitionSerializer(serializers.Serializer):
+    enabled = serializers.BooleanField(default=False)
+    rollout_percentage = serializers.IntegerField(min_value=0, max_value=100, default=100)
+    on_variation = serializers.DictField(default=lambda: {"value": True})
+    off_variation = serializers.DictField(default=lambda: {"value": False})
+    default_variation = serializers.DictField(default=lambda: {"value": False})
+    rules = RuleDefinitionSerializer(many=True, default=list)
+
+
+class FlagDefinitionSerializer(serializers.Serializer):
+    key = serializers.SlugField(max_length=64)
+    name = serializers.CharField(max_length=255, required=False, allow_blank=True, default="")
+    description = serializers.CharField(required=False, allow_blank=True, default="")
+    # {environment key: state}; environments left out get the same disabled
+    # default state a flag created in the UI gets
+    environments = serializers.DictField(child=StateDefinitionSerializer(), default=dict)
+
+
+class BulkFlagImportSerializer(serializers.Serializer):
+    project = serializers.PrimaryKeyRelatedField(queryset=Project.objects.select_related("org"))
+    flags = FlagDefinitionSerializer(many=True, allow_empty=False)
+    # "error": refuse the whole import if any key exists; "skip": leave existing flags alone
+    on_conflict = serializers.ChoiceField(choices=["error", "skip"], default="error")
+
+    def validate_flags(self, value):
+        limit = self.context.get("max_flags", settings.FLAG_BULK_MAX_FLAGS)
+        if limit is not None and len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} flags per import.")
+        seen = set()
+        duplicates = sorted({f["key"] for f in value if f["key"] in seen or seen.add(f["key"])})
+        if duplicates:
+            raise serializers.ValidationError(f"Duplicate keys: {', '.join(duplicates)}.")
+        return value
+
+    def validate(self, attrs):
+        project = attrs["project"]
+        env_keys = set(project.environments.values_list("key", flat=True))
+        errors = {}
+        for i, f in enumerate(attrs["flags"]):
+            unknown = sorted(set(f["environments"]) - env_keys)
+            if unknown:
+                errors[i] = {"environments": [f"Unknown environment(s) in this project: {', '.join(unknown)}."]}
+        keys = [f["key"] for f in attrs["flags"]]
+        existing = set(FeatureFlag.objects.filter(project=project, key__in=keys).values_list("key", flat=True))
+        if existing and attrs["on_conflict"] == "error":
+            for i, f in enumerate(attrs["flags"]):
+                if f["key"] in existing:
+                    errors.setdefault(i, {})["key"] = ["A flag with this key already exists in the project."]
+        if errors:
+            # keyed by index, like the per-definition errors of the nested list
+            raise serializers.ValidationError({"flags": errors})
+        attrs["existing"] = existing
+        return attrs
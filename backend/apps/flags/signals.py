@@ -0,0 +1,130 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.core.models import Environment
+from apps.core.sdk_keys import invalidate_environments
+from apps.flags.models import FeatureFlag, FlagState, FlagRule, FlagChangeEvent, Segment
+from apps.flags.ruleset import discard_ruleset
+from apps.flags.segments import discard_members
+
+
+def config_changed(environment_ids, kind, flag_key=""):
+    """
+    Invalidate cached rulesets for the given environments and publish a change
+    event to SDK streams. Call this after writes that bypass model signals
+    (bulk_create, bulk_update, queryset.update).
+    """
+    environment_ids = list(environment_ids)
+    if not environment_ids:
+        return
+    Environment.objects.filter(pk__in=environment_ids).update(config_version=F("config_version") + 1)
+    invalidate_environments(environment_ids)
+    FlagChangeEvent.objects.bulk_create(
+        FlagChangeEvent(environment_id=env_id, kind=kind, flag_key=flag_key) for env_id in environment_ids
+    )
+
+
+_muted = threading.local()
+
+
+@contextmanager
+def muted():
+    """
+    Skip the per-row handlers below for bulk writes (deletes cascade through
+    them row by row) that call config_changed once themselves.
+    """
+    _muted.depth = getattr(_muted, "depth", 0) + 1
+    try:
+        yield
+    finally:
+        _muted.depth -= 1
+
+
+def _is_muted():
+    return getattr(_muted, "depth", 0) > 0
+
+
+def _environment_survives(kwargs):
+    # Cascades from an environment/project/org delete must not log events
+    # against the environment that is being removed in the same transaction.
+    origin = kwargs.get("origin")
+    return origin is None or isinstance(origin, (FeatureFlag, FlagState, FlagRule, Segment))
+
+
+@receiver(post_save, sender=FeatureFlag)
+@receiver(post_delete, sender=FeatureFlag)
+def flag_changed(sender, instance, **kwargs):
+    # A new flag has no states yet; whoever creates them calls config_changed.
+    if kwargs.get("created") or _is_muted():
+        return
+    if "created" in kwargs:
+        kind = "flag.updated"
+    elif _environment_survives(kwargs):
+        kind = "flag.deleted"
+    else:
+        return
+    env_ids = Environment.objects.filter(project_id=instance.project_id).values_list("id", flat=True)
+    config_changed(env_ids, kind, instance.key)
+
+
+@receiver(post_save, sender=FlagState)
+@receiver(post_delete, sender=FlagState)
+def flag_state_changed(sender, instance, **kwargs):
+    if _is_muted():
+        return
+    if "created" in kwargs:
+        kind = "flagstate.updated"
+    elif _environment_survives(kwargs):
+        kind = "flagstate.deleted"
+    else:
+        return
+    if FlagState.flag.is_cached(instance):
+        flag_key = instance.flag.key
+    else:
+        flag_key = FeatureFlag.objects.filter(pk=instance.flag_id).values_list("key", flat=True).first() or ""
+    config_changed([instance.environment_id], kind, flag_key)
+
+
+@receiver(post_save, sender=FlagRule)
+@receiver(post_delete, sender=FlagRule)
+def flag_rule_changed(sender, instance, **kwargs):
+    if _is_muted():
+        return
+    if "created" in kwargs:
+        kind = "rule.updated"
+    elif _environment_survives(kwargs):
+        kind = "rule.deleted"
+    else:
+        return
+    row = FlagState.objects.filter(pk=instance.state_id).values_list("environment_id", "flag__key").first()
+    if row:
+        config_changed([row[0]], kind, row[1])
+
+
+@receiver(post_save, sender=Segment)
+@receiver(post_delete, sender=Segment)
+def segment_changed(sender, instance, **kwargs):
+    # A new segment is empty: it matches nobody, as it did while it did not exist.
+    if kwargs.get("created"):
+        return
+    if "created" not in kwargs:
+        discard_members(instance.id)
+    if _is_muted():
+        return
+    if "created" in kwargs:
+        kind = "segment.updated"
+    elif _environment_survives(kwargs):
+        kind = "segment.deleted"
+    else:
+        return
+    env_ids = Environment.objects.filter(project_id=instance.project_id).values_list("id", flat=True)
+    config_changed(env_ids, kind)
+
+
+@receiver(post_delete, sender=Environment)
+def environment_deleted(sender, instance, **kwargs):
+    discard_ruleset(instance.id)
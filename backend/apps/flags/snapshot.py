@@ -0,0 +1,255 @@
+"""
+Project configuration snapshots as NDJSON: streamed export, diff-based import.
+
+    {"type": "project", "format": 1, "key": "web", "name": "Web", "description": ""}
+    {"type": "environment", "key": "production", "name": "Production"}
+    {"type": "flag", "key": "new_checkout", "name": "...", "description": "", "environments": {
+        "production": {"enabled": true, "rollout_percentage": 20, "on_variation": {...}, ...,
+                       "rules": [{"clauses": [...], "variation": {...}, "rollout_percentage": 100}]}}}
+
+Flag lines use the definition format of POST /api/flags/bulk/. Ids, SDK keys
+and timestamps are not part of a snapshot, so it can be restored into any
+project, in any org.
+
+Export walks the project's flags in id order with `.iterator(chunk_size)` (a
+server-side cursor on PostgreSQL) and prefetches states and rules per chunk:
+three queries per chunk, and memory bounded by the chunk size however large
+the project is.
+
+Import reads the same lines in chunks of flags, compares each chunk with the
+database and writes only what differs: new and changed flags and states with
+bulk_create/bulk_update, and a fresh rule list for each state whose rules
+changed. Importing the same snapshot twice writes nothing the second time.
+The whole import is one transaction; affected environments get a single
+config_changed.
+"""
+import json
+
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from apps.audit.services import audit
+from apps.core.models import Environment
+from apps.flags.bulk import DEFAULT_STATE
+from apps.flags.models import FeatureFlag, FlagRule, FlagState
+from apps.flags.serializers import FlagDefinitionSerializer
+from apps.flags.signals import config_changed, muted
+
+FORMAT = 1
+CHUNK_SIZE = 500
+STATE_FIELDS = ("enabled", "rollout_percentage", "on_variation", "off_variation", "default_variation")
+RULE_FIELDS = ("clauses", "variation", "rollout_percentage")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _line(record):
+    return json.dumps(record, separators=(",", ":")) + "\n"
+
+
+def _flags_with_config(qs):
+    rules = Prefetch("rules", queryset=FlagRule.objects.order_by("priority", "id"))
+    return qs.prefetch_related(Prefetch("states", queryset=FlagState.objects.prefetch_related(rules)))
+
+
+def rule_specs(state):
+    return [{f: getattr(r, f) for f in RULE_FIELDS} for r in state.rules.all()]
+
+
+def export_project(project, chunk_size=CHUNK_SIZE):
+    """Yield the project's snapshot as NDJSON lines."""
+    yield _line({
+        "type": "project", "format": FORMAT,
+        "key": project.key, "name": project.name, "description": project.description,
+    })
+    env_keys = {}
+    for env in project.environments.order_by("id"):
+        env_keys[env.id] = env.key
+        yield _line({"type": "environment", "key": env.key, "name": env.name})
+    flags = _flags_with_config(FeatureFlag.objects.filter(project=project).order_by("id"))
+    for flag in flags.iterator(chunk_size=chunk_size):
+        yield _line({
+            "type": "flag",
+            "key": flag.key,
+            "name": flag.name,
+            "description": flag.description,
+            "environments": {
+                env_keys[st.environment_id]: {**{f: getattr(st, f) for f in STATE_FIELDS}, "rules": rule_specs(st)}
+                for st in flag.states.all()
+            },
+        })
+
+
+class _Import:
+    def __init__(self, project):
+        self.project = project
+        self.envs = {e.key: e for e in project.environments.all()}
+        self.touched = set()  # environment ids whose config changed
+        self.seen = set()
+        self.flags_started = False
+        self.stats = {
+            "environments": {"created": 0},
+            "flags": {"created": 0, "updated": 0, "unchanged": 0, "deleted": 0},
+            "states": {"created": 0, "updated": 0, "unchanged": 0},
+            "rules": {"created": 0, "deleted": 0},
+        }
+
+    def environment(self, record, where):
+        if self.flags_started:
+            raise SnapshotError(f"{where}: environments must come before flags")
+        key, name = record.get("key"), record.get("name")
+        if not isinstance(key, str) or not key:
+            raise SnapshotError(f"{where}: environment needs a key")
+        if key not in self.envs:
+            self.envs[key] = Environment.objects.create(project=self.project, key=key, name=name or key)
+            self.stats["environments"]["created"] += 1
+
+    def definition(self, record, where):
+        self.flags_started = True
+        serializer = FlagDefinitionSerializer(data=record)
+        if not serializer.is_valid():
+            raise SnapshotError(f"{where}: {json.dumps(serializer.errors)}")
+        d = serializer.validated_data
+        if d["key"] in self.seen:
+            raise SnapshotError(f"{where}: flag {d['key']!r} appears twice")
+        unknown = sorted(set(d["environments"]) - set(self.envs))
+        if unknown:
+            raise SnapshotError(f"{where}: unknown environment(s) {', '.join(unknown)}")
+        self.seen.add(d["key"])
+        return d
+
+    def apply(self, batch):
+        """Write the differences between `batch` (validated definitions) and the database."""
+        stats, now = self.stats, timezone.now()
+        existing = {
+            f.key: f
+            for f in _flags_with_config(
+                FeatureFlag.objects.filter(project=self.project, key__in=[d["key"] for d in batch])
+            )
+        }
+        new_flags, changed_flags = [], []
+        for d in batch:
+            name = d["name"] or d["key"]
+            flag = existing.get(d["key"])
+            if flag is None:
+                new_flags.append(
+                    FeatureFlag(project=self.project, key=d["key"], name=name, description=d["description"])
+                )
+            elif (flag.name, flag.description) != (name, d["description"]):
+                flag.name, flag.description = name, d["description"]
+                changed_flags.append(flag)
+            else:
+                stats["flags"]["unchanged"] += 1
+        FeatureFlag.objects.bulk_create(new_flags)
+        FeatureFlag.objects.bulk_update(changed_flags, ["name", "description"])
+        stats["flags"]["created"] += len(new_flags)
+        stats["flags"]["updated"] += len(changed_flags)
+
+        new_states, changed_states, replaced = [], [], []
+        rule_lists = []  # (state, rule specs) to write
+        created = {f.key: f for f in new_flags}
+        for d in batch:
+            flag = created.get(d["key"]) or existing[d["key"]]
+            current = {} if d["key"] in created else {st.environment_id: st for st in flag.states.all()}
+            for env in self.envs.values():
+                spec = d["environments"].get(env.key)
+                state = current.get(env.id)
+                if state is None:
+                    fields = spec or DEFAULT_STATE
+                    state = FlagState(flag=flag, environment=env, **{f: fields[f] for f in STATE_FIELDS})
+                    new_states.append(state)
+                    rule_lists.append((state, spec["rules"] if spec else []))
+                    self.touched.add(env.id)
+                    continue
+                if spec is None:
+                    continue  # not in the snapshot: leave as is
+                changed = False
+                if any(getattr(state, f) != spec[f] for f in STATE_FIELDS):
+                    for f in STATE_FIELDS:
+                        setattr(state, f, spec[f])
+                    state.updated_at = now  # bulk_update skips auto_now
+                    changed_states.append(state)
+                    changed = True
+                if rule_specs(state) != spec["rules"]:
+                    rule_lists.append((state, spec["rules"]))
+                    replaced.append(state.id)
+                    stats["rules"]["deleted"] += len(state.rules.all())
+                    changed = True
+                if changed:
+                    self.touched.add(env.id)
+                else:
+                    stats["states"]["unchanged"] += 1
+        FlagState.objects.bulk_create(new_states)
+        FlagState.objects.bulk_update(changed_states, [*STATE_FIELDS, "updated_at"])
+        stats["states"]["created"] += len(new_states)
+        stats["states"]["updated"] += len(changed_states)
+
+        if replaced:
+            FlagRule.objects.filter(state_id__in=replaced).delete()
+        rules = FlagRule.objects.bulk_create(
+            FlagRule(state=state, priority=priority, **{f: rule[f] for f in RULE_FIELDS})
+            for state, specs in rule_lists
+            for priority, rule in enumerate(specs)
+        )
+        stats["rules"]["created"] += len(rules)
+
+    def prune(self):
+        """Delete the project's flags the snapshot does not mention."""
+        stale = [
+            pk for pk, key in FeatureFlag.objects.filter(project=self.project).values_list("id", "key").iterator()
+            if key not in self.seen
+        ]
+        for i in range(0, len(stale), CHUNK_SIZE):
+            FeatureFlag.objects.filter(id__in=stale[i:i + CHUNK_SIZE]).delete()
+        self.stats["flags"]["deleted"] += len(stale)
+        if stale:
+            self.touched.update(env.id for env in self.envs.values())
+
+
+def import_project(project, lines, actor=None, prune=False, dry_run=False, chunk_size=CHUNK_SIZE):
+    """
+    Bring `project` in line with the snapshot `lines` (an iterable of NDJSON
+    str/bytes lines). With `prune`, flags missing from the snapshot are
+    deleted. `dry_run` computes the same counts and rolls everything back.
+    Returns {"environments"|"flags"|"states"|"rules": {action: count}}.
+    """
+    with transaction.atomic(), muted():
+        run = _Import(project)
+        batch = []
+        for n, raw in enumerate(lines, 1):
+            if not raw.strip():
+                continue
+            where = f"line {n}"
+            try:
+                record = json.loads(raw)
+            except ValueError as e:
+                raise SnapshotError(f"{where}: invalid JSON ({e})")
+            kind = record.get("type") if isinstance(record, dict) else None
+            if kind == "flag":
+                batch.append(run.definition(record, where))
+                if len(batch) >= chunk_size:
+                    run.apply(batch)
+                    batch = []
+            elif kind == "environment":
+                run.environment(record, where)
+            elif kind == "project":
+                if record.get("format") != FORMAT:
+                    raise SnapshotError(f"{where}: unsupported snapshot format {record.get('format')!r}")
+            else:
+                raise SnapshotError(f"{where}: unknown record type {kind!r}")
+        if batch:
+            run.apply(batch)
+        if prune:
+            run.prune()
+        if dry_run:
+            transaction.set_rollback(True)
+        elif run.touched:
+            config_changed(run.touched, "project.imported")
+
+    stats = run.stats
+    if not dry_run and (run.touched or stats["flags"]["updated"] or stats["environments"]["created"]):
+        audit(actor, project.org, "project.import", {"project": project.key, "prune": prune, **stats})
+    return stats
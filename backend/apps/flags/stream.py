@@ -0,0 +1,195 @@
+"""
+Server-Sent Events stream of config changes per environment.
+
+GET /api/sdk/stream/ (X-Client-Key / X-Server-Key header, or ?client_key= for
+browser EventSource). Each FlagChangeEvent for the environment is pushed as
+
+    id: <event id>
+    event: change
+    data: {"kind": "flagstate.updated", "flag": "new_checkout"}
+
+Reconnecting clients send Last-Event-ID (or ?last_event_id=) and get every
+event they missed replayed first, in pages of REPLAY_PAGE. A stream that
+falls SDK_STREAM_QUEUE_SIZE events behind is closed, so its client
+reconnects and catches up that way; so are all streams if the hub's poll
+fails.
+
+This is an async view and must be served by the ASGI app (config.asgi), where
+an idle connection is just a suspended coroutine. Per worker process a single
+ChangeHub task polls the event table and fans new rows out to subscriber
+queues, so thousands of idle streams cost one query per poll interval.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from apps.core import metrics
+from apps.core.sdk_keys import environment_for_key, CLIENT, SERVER
+from apps.flags.models import FlagChangeEvent
+
+REPLAY_PAGE = 1000
+PRUNE_EVERY = 600  # polls
+CLOSED = None  # queued in place of an event: the stream ends
+
+log = logging.getLogger(__name__)
+
+
+def expired_events(now=None):
+    cutoff = (now or timezone.now()) - timedelta(hours=settings.SDK_STREAM_EVENT_RETENTION_HOURS)
+    return FlagChangeEvent.objects.filter(created_at__lt=cutoff)
+
+
+def prune_events(now=None):
+    """
+    Delete change events older than SDK_STREAM_EVENT_RETENTION_HOURS. Runs
+    from prune_audit_logs and, while streams are open, from the hub.
+    """
+    deleted, _ = expired_events(now).delete()
+    return deleted
+
+
+class ChangeHub:
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # environment_id -> {asyncio.Queue}
+        self._task = None
+        self._last_id = None
+
+    async def subscribe(self, environment_id):
+        queue = asyncio.Queue(maxsize=settings.SDK_STREAM_QUEUE_SIZE)
+        self._subscribers[environment_id].add(queue)
+        if self._task is None or self._task.done():
+            # Read the tail before returning: every event committed after
+            # subscribe() is then published to the new queue.
+            if self._last_id is None:
+                self._last_id = await FlagChangeEvent.objects.order_by("-id").values_list("id", flat=True).afirst() or 0
+            if self._task is None or self._task.done():
+                self._task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, environment_id, queue):
+        queues = self._subscribers.get(environment_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[environment_id]
+
+    def _publish(self, event):
+        for queue in list(self._subscribers.get(event.environment_id, ())):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Slow consumer: end its stream rather than skip events.
+                self._close(event.environment_id, queue)
+
+    def _close(self, environment_id, queue):
+        # The client reconnects with Last-Event-ID and the table replays what it missed.
+        self.unsubscribe(environment_id, queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(CLOSED)
+
+    async def _poll(self):
+        polls = 0
+        try:
+            while self._subscribers:
+                async for event in FlagChangeEvent.objects.filter(id__gt=self._last_id).order_by("id"):
+                    self._last_id = event.id
+                    self._publish(event)
+                polls += 1
+                if polls % PRUNE_EVERY == 0:
+                    await sync_to_async(prune_events)()
+                await asyncio.sleep(settings.SDK_STREAM_POLL_INTERVAL)
+        except Exception:
+            # Without the task every open stream would stay silent. Their
+            # clients reconnect, which starts a new one.
+            log.exception("SDK stream poll failed; closing %d streams", sum(map(len, self._subscribers.values())))
+            for environment_id, queues in list(self._subscribers.items()):
+                for queue in list(queues):
+                    self._close(environment_id, queue)
+        # Restart from the then-current tail when the next subscriber arrives.
+        self._last_id = None
+
+
+hub = ChangeHub()
+
+metrics.Gauge(
+    "flagship_stream_subscribers", "Open SSE streams on this worker.",
+    lambda: [((), sum(len(q) for q in hub._subscribers.values()))],
+)
+
+
+def format_event(event):
+    data = json.dumps({"kind": event.kind, "flag": event.flag_key}, separators=(",", ":"))
+    return f"id: {event.id}\nevent: change\ndata: {data}\n\n"
+
+
+async def _events(environment_id, last_id):
+    # Subscribe before replaying so nothing that lands in between is lost;
+    # duplicates are dropped by id.
+    queue = await hub.subscribe(environment_id)
+    try:
+        yield f"retry: {settings.SDK_STREAM_RETRY_MS}\n\n"
+        # Replay up to the table's current end, which is past the tail the
+        # hub publishes from: the queue carries on from there.
+        replayed = REPLAY_PAGE if last_id is not None else 0
+        while replayed == REPLAY_PAGE:
+            replayed = 0
+            page = FlagChangeEvent.objects.filter(environment_id=environment_id, id__gt=last_id).order_by("id")
+            async for event in page[:REPLAY_PAGE]:
+                replayed += 1
+                last_id = event.id
+                yield format_event(event)
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.SDK_STREAM_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if event is CLOSED:
+                return
+            if last_id is not None and event.id <= last_id:
+                continue
+            last_id = event.id
+            yield format_event(event)
+    finally:
+        hub.unsubscribe(environment_id, queue)
+
+
+async def sdk_stream(request):
+    if request.method != "GET":
+        return JsonResponse({"detail": "Method not allowed"}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "Streaming requires the ASGI server (config.asgi)"}, status=501)
+
+    sdk_key = (
+        request.headers.get("X-Client-Key")
+        or request.headers.get("X-Server-Key")
+        or request.GET.get("client_key")
+    )
+    if not sdk_key:
+        return JsonResponse({"detail": "Missing X-Client-Key"}, status=401)
+    env = await sync_to_async(environment_for_key)(CLIENT, sdk_key)
+    if not env:
+        env = await sync_to_async(environment_for_key)(SERVER, sdk_key)
+    if not env:
+        return JsonResponse({"detail": "Invalid SDK key"}, status=401)
+
+    metrics.SDK_REQUESTS.inc((str(env.id), "stream"))
+    raw_last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        last_id = int(raw_last_id) if raw_last_id else None
+    except ValueError:
+        return JsonResponse({"detail": "Invalid Last-Event-ID"}, status=400)
+
+    response = StreamingHttpResponse(_events(env.id, last_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,1424 @@
+import asyncio
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import F
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.accounts.models import User
+from apps.audit.models import AuditLog
+from apps.core.models import Organization, Membership, Project, Environment
+from apps.flags.bucketing import salt, rule_salt, bucket, bucket_array
+from apps.flags.eval import (
+    MAX_MATCH_INPUT, ClauseError, _parse_version, clause_match, compile_clause, compile_rule, regex_problem,
+    rule_matches, stable_percent, validate_clause,
+)
+from apps.flags.counters import counters
+from apps.flags.models import (
+    FeatureFlag, FlagState, FlagRule, FlagChangeEvent, FlagEvaluationCount, Segment, SegmentChunk,
+)
+from apps.flags.ruleset import clear_rulesets
+from apps.flags.segments import BUCKETS, apply_changes, clear_members
+from apps.flags.signals import config_changed
+from apps.flags.stream import ChangeHub, prune_events
+
+SIZES = (1, 100, 5000)
+RULES_PER_FLAG = 3
+
+
+def seed_project(org, n_flags, n_rules):
+    project = Project.objects.create(org=org, name=f"p{n_flags}", key=f"p{n_flags}")
+    env = Environment.objects.create(project=project, name="Production", key="prod")
+    flags = FeatureFlag.objects.bulk_create(
+        FeatureFlag(project=project, key=f"flag_{i}", name=f"Flag {i}") for i in range(n_flags)
+    )
+    states = FlagState.objects.bulk_create(
+        FlagState(
+            flag=flag,
+            environment=env,
+            enabled=i % 4 != 0,
+            rollout_percentage=50 if i % 3 == 0 else 100,
+            on_variation={"value": True},
+            off_variation={"value": False},
+            default_variation={"value": False},
+        )
+        for i, flag in enumerate(flags)
+    )
+    FlagRule.objects.bulk_create(
+        FlagRule(
+            state=st,
+            priority=p,
+            clauses=[{"attr": "country", "op": "in", "values": ["US", "CA"]}],
+            variation={"value": True},
+            rollout_percentage=100 if p else 50,
+        )
+        for st in states
+        for p in range(n_rules)
+    )
+    return project, env
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class QueryCountTests(TestCase):
+    """
+    Every endpoint below must cost the same number of queries whether the
+    environment holds 1 flag or 5,000.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("dev@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Acme")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        cls.seeded = {n: seed_project(cls.org, n, RULES_PER_FLAG) for n in SIZES}
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def count_queries(self, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            response = fn()
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        return len(ctx.captured_queries)
+
+    def assert_constant(self, make_request, expected):
+        # warm per-user caches (role map) so every measured size sees the same state
+        make_request(*self.seeded[SIZES[0]])
+        for n in SIZES:
+            project, env = self.seeded[n]
+            with self.subTest(flags=n):
+                self.assertEqual(self.count_queries(lambda: make_request(project, env)), expected)
+
+    def evaluate(self, env):
+        return self.client.post(
+            "/api/sdk/evaluate/",
+            {"user": {"key": "user_1", "country": "US"}},
+            format="json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key,
+        )
+
+    def test_sdk_evaluate_cold(self):
+        def make_request(project, env):
+            clear_rulesets()
+            caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+            return self.evaluate(env)
+
+        # key lookup, states + flags, rules
+        self.assert_constant(make_request, 3)
+
+    def test_sdk_evaluate_cached(self):
+        for _, env in self.seeded.values():
+            self.evaluate(env)
+        # the environment row (current config_version); the ruleset comes from cache
+        self.assert_constant(lambda project, env: self.evaluate(env), 1)
+
+    def test_sdk_evaluate_returns_every_flag(self):
+        for n, (_, env) in self.seeded.items():
+            self.assertEqual(len(self.evaluate(env).data["flags"]), n)
+
+    def test_sdk_evaluate_selected_flags(self):
+        _, env = self.seeded[5000]
+        body = {"user": {"key": "user_1"}, "flags": ["flag_7", "flag_42"], "prefix": "flag_499"}
+        response = self.client.post("/api/sdk/evaluate/", body, format="json", HTTP_X_CLIENT_KEY=env.client_sdk_key)
+        expected = {"flag_7", "flag_42", "flag_499", *(f"flag_499{i}" for i in range(10))}
+        self.assertEqual(set(response.data["flags"]), expected)
+
+        # served from the cached full ruleset once it exists
+        self.evaluate(env)
+        with CaptureQueriesContext(connection) as ctx:
+            cached = self.client.post(
+                "/api/sdk/evaluate/", body, format="json", HTTP_X_CLIENT_KEY=env.client_sdk_key
+            )
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(cached.data["flags"], response.data["flags"])
+
+    def test_sdk_evaluate_not_modified(self):
+        _, env = self.seeded[100]
+        first = self.evaluate(env)
+        etag = first["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            again = self.client.post(
+                "/api/sdk/evaluate/",
+                {"user": {"key": "user_1", "country": "US"}},
+                format="json",
+                HTTP_X_CLIENT_KEY=env.client_sdk_key,
+                HTTP_IF_NONE_MATCH=etag,
+            )
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+        other_user = self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "user_2"}}, format="json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(other_user.status_code, 200)
+
+        state = env.flag_states.first()
+        state.enabled = not state.enabled
+        state.save()
+        changed = self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "user_1", "country": "US"}}, format="json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_flag_rename_invalidates_ruleset(self):
+        project, env = self.seeded[1]
+        first = self.evaluate(env)
+        self.assertEqual(list(first.data["flags"]), ["flag_0"])
+        ruleset = self.client.get("/api/sdk/ruleset/", HTTP_X_SERVER_KEY=env.server_sdk_key)
+
+        flag = project.flags.get(key="flag_0")
+        response = self.client.patch(f"/api/flags/{flag.id}/", {"key": "renamed"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+
+        renamed = self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "user_1", "country": "US"}}, format="json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key, HTTP_IF_NONE_MATCH=first["ETag"],
+        )
+        self.assertEqual(renamed.status_code, 200)
+        self.assertEqual(list(renamed.data["flags"]), ["renamed"])
+
+        refreshed = self.client.get(
+            "/api/sdk/ruleset/", HTTP_X_SERVER_KEY=env.server_sdk_key, HTTP_IF_NONE_MATCH=ruleset["ETag"]
+        )
+        self.assertEqual(refreshed.status_code, 200)
+        self.assertEqual([f["key"] for f in refreshed.data["flags"]], ["renamed"])
+
+    def test_sdk_evaluate_shared_key_cache(self):
+        # with SDK_CACHE_URL every worker sees the invalidations, so known keys are cached too
+        with mock.patch("apps.core.sdk_keys._shared", return_value=True):
+            for _, env in self.seeded.values():
+                self.evaluate(env)
+            self.assert_constant(lambda project, env: self.evaluate(env), 0)
+
+            _, env = self.seeded[1]
+            etag = self.evaluate(env)["ETag"]
+            state = env.flag_states.first()
+            state.enabled = not state.enabled
+            state.save()
+            self.assertNotEqual(self.evaluate(env)["ETag"], etag)
+
+    def test_changes_made_by_other_workers(self):
+        # queryset.update() skips the signals, like a change made by another
+        # worker whose cache invalidation cannot reach this process
+        _, env = self.seeded[1]
+        etag = self.evaluate(env)["ETag"]
+        Environment.objects.filter(pk=env.pk).update(config_version=F("config_version") + 1)
+        again = self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "user_1", "country": "US"}}, format="json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key, HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(again.status_code, 200)
+        self.assertNotEqual(again["ETag"], etag)
+
+        Environment.objects.filter(pk=env.pk).update(client_sdk_key="c_revoked")
+        self.assertEqual(self.evaluate(env).status_code, 401)
+
+    def test_invalid_keys_are_negatively_cached(self):
+        post = lambda: self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "u"}}, format="json", HTTP_X_CLIENT_KEY="c_guess"
+        )
+        self.assertEqual(post().status_code, 401)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(post().status_code, 401)
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+    def test_rotated_key_stops_working_immediately(self):
+        _, env = self.seeded[1]
+        old_key = env.client_sdk_key
+        self.assertEqual(self.evaluate(env).status_code, 200)
+
+        admin = User.objects.create_user("admin@example.com", "pass12345")
+        Membership.objects.create(org=self.org, user=admin, role="admin")
+        self.client.force_authenticate(admin)
+        rotated = self.client.post(f"/api/environments/{env.id}/rotate_keys/")
+        self.assertEqual(rotated.status_code, 200)
+
+        self.assertEqual(self.evaluate(env).status_code, 401)
+        env.client_sdk_key = rotated.data["client_sdk_key"]
+        self.assertNotEqual(env.client_sdk_key, old_key)
+        self.assertEqual(self.evaluate(env).status_code, 200)
+
+    def test_role_map_read_per_request(self):
+        # a per-process cache cannot see other workers' invalidations: roles are read on every request
+        _, env = self.seeded[1]
+        self.assertEqual(self.count_queries(lambda: self.client.get("/api/environments/")), 2)
+        self.assertEqual(self.count_queries(lambda: self.client.get("/api/environments/")), 2)
+
+        # queryset.update() skips the signals, like a change made by another worker
+        Membership.objects.filter(user=self.user).update(role="viewer")
+        response = self.client.post("/api/flags/", {"project": env.project_id, "key": "k", "name": "K",
+                                                     "org": self.org.id}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_role_map_cached_and_invalidated(self):
+        _, env = self.seeded[1]
+        with mock.patch("apps.core.permissions._shared_cache", return_value=caches[settings.ROLE_CACHE_ALIAS]):
+            self.assertEqual(self.count_queries(lambda: self.client.get("/api/environments/")), 2)
+            self.assertEqual(self.count_queries(lambda: self.client.get("/api/environments/")), 1)
+
+            Membership.objects.filter(user=self.user).delete()
+            response = self.client.get("/api/environments/")
+            self.assertEqual(response.data, [])
+            response = self.client.get("/api/flag-states/", {"environment_id": env.id, "org_id": self.org.id})
+            self.assertEqual(response.status_code, 403)
+
+    def test_flag_list(self):
+        # role map, flags
+        self.assert_constant(lambda project, env: self.client.get("/api/flags/", {"project_id": project.id}), 2)
+
+    def test_flag_state_list(self):
+        # role map, states, prefetched rules
+        self.assert_constant(
+            lambda project, env: self.client.get("/api/flag-states/", {"environment_id": env.id}), 3
+        )
+
+    def test_flag_rule_list(self):
+        def make_request(project, env):
+            return self.client.get("/api/flag-rules/", {"state_id": env.flag_states.values_list("id", flat=True)[0]})
+
+        # state id lookup made by the test itself, role map, rules
+        self.assert_constant(make_request, 3)
+
+    def test_flag_rule_list_unfiltered(self):
+        # role map, rules
+        self.assertEqual(self.count_queries(lambda: self.client.get("/api/flag-rules/")), 2)
+
+
+class BucketingTests(SimpleTestCase):
+    user_keys = ["", "user_1", "vip_42", "ünïcødé", "漢字", "a" * 300] + [f"u{i}" for i in range(2000)]
+
+    def test_matches_stable_percent(self):
+        for flag_key in ("new_checkout", "", "ß"):
+            s = salt(flag_key)
+            self.assertEqual([bucket(k, s) for k in self.user_keys], [stable_percent(k, flag_key) for k in self.user_keys])
+        self.assertEqual(bucket("u1", rule_salt("f", 7)), stable_percent("u1", "f:rule:7"))
+
+    def test_bucket_array_matches_stable_percent(self):
+        try:
+            buckets = bucket_array(self.user_keys, salt("new_checkout"))
+        except RuntimeError:
+            raise unittest.SkipTest("NumPy not installed")
+        self.assertEqual(buckets.tolist(), [stable_percent(k, "new_checkout") for k in self.user_keys])
+
+
+class ClauseOperatorTests(SimpleTestCase):
+    def assertRefused(self, clause, message):
+        with self.assertRaisesMessage(ClauseError, message):
+            validate_clause(clause)
+
+    def test_validation(self):
+        self.assertRefused({"attr": "age", "op": "lt", "values": ["18"]}, "not a finite number")
+        self.assertRefused({"attr": "age", "op": "gte", "values": [True]}, "not a finite number")
+        self.assertRefused({"attr": "v", "op": "semver_gt", "values": ["1.02.0"]}, "semantic version")
+        self.assertRefused({"attr": "d", "op": "date_after", "values": ["2026-13-01"]}, "ISO 8601")
+        self.assertRefused({"attr": "email", "op": "ends_with", "values": [1]}, "must be strings")
+        self.assertRefused({"attr": "email", "op": "matches", "values": ["["]}, "invalid pattern")
+        for pattern in (r"(a+)+$", r"(ab|a)*c", r"(a)\1", r".*a.*b.*c", "x" * 300):
+            self.assertRefused({"attr": "email", "op": "matches", "values": [pattern]}, "refused")
+        validate_clause({"attr": "email", "op": "matches", "values": [r"^[^@]+@(acme|corp)\.com$"]})
+
+    def test_regex_cost_is_bounded(self):
+        # a refused pattern stored before validation never runs, even through the interpreter
+        evil = {"attr": "s", "op": "matches", "values": [r"^(a+)+$"]}
+        user = {"s": "a" * 40 + "!"}
+        self.assertFalse(compile_clause(evil)(user))
+        self.assertFalse(clause_match(user, evil))
+        long_value = {"s": "x" * (MAX_MATCH_INPUT + 1)}
+        self.assertFalse(compile_clause({"attr": "s", "op": "matches", "values": ["x"]})(long_value))
+
+        refused = [
+            r"(?:a{1,64}){1,64}b", r"(?:a|b?){20}c", r"^(?:a?){25}a{25}$", r"a*a*c", r".*.*x", r".*x.*y",
+            r"(a|aa)+$", r"(?i)a*A*c", r"\d*\w*!", "a?" * 20 + "a" * 20,
+        ]
+        for pattern in refused:
+            with self.subTest(pattern=pattern):
+                self.assertIsNotNone(regex_problem(pattern))
+                self.assertFalse(compile_clause({"attr": "s", "op": "matches", "values": [pattern]})(user))
+        accepted = [
+            r"^[a-z]+\.[a-z]+@", r"^\d+(\.\d+)?$", r"^https?://[a-z.]+/", r"^[a-z0-9.-]+\.[a-z]{2,}$",
+            r"^[^@]+@[^@]+$", r"beta|alpha", r"^(?:ab)*$",
+        ]
+        for pattern in accepted:
+            with self.subTest(pattern=pattern):
+                self.assertIsNone(regex_problem(pattern))
+                match = compile_clause({"attr": "s", "op": "matches", "values": [pattern]})
+                for value in ("a" * MAX_MATCH_INPUT, "a." * (MAX_MATCH_INPUT // 2), "1" * MAX_MATCH_INPUT):
+                    start = time.perf_counter()
+                    match({"s": value})
+                    self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_compiled_once(self):
+        clause = {"attr": "v", "op": "semver_lt", "values": ["1.10.0", "2.0.0-rc.1"]}
+        with mock.patch("apps.flags.eval._parse_version", wraps=_parse_version) as parse:
+            match = compile_clause(clause)
+            compiled = parse.call_count
+            for _ in range(3):
+                self.assertTrue(match({"v": "2.0.0-beta"}))
+                self.assertFalse(match({"v": "2.0.0"}))
+        self.assertEqual(parse.call_count, compiled + 6)  # after compiling, only the user values
+
+
+class CompiledRuleTests(SimpleTestCase):
+    """compile_clause/compile_rule must decide exactly like clause_match/rule_matches."""
+
+    SEGMENTS = {"beta": frozenset({"u1", "u3"}), "staff": frozenset({"u2"})}
+    CLAUSES = [
+        {"attr": "country", "op": "in", "values": ["US", "CA"]},
+        {"attr": "country", "op": "equals", "values": ["US"]},
+        {"attr": "plan", "op": "in", "values": [1, "pro", None, ["a"], {"k": 1}]},
+        {"attr": "plan", "op": "in", "values": []},
+        {"attr": "email", "op": "contains", "values": ["ACME", 7]},
+        {"attr": "email", "op": "contains", "values": []},
+        {"attr": "key", "op": "in_segment", "values": ["beta"]},
+        {"attr": "key", "op": "in_segment", "values": ["beta", "staff", "missing"]},
+        {"attr": "key", "op": "in_segment", "values": ["missing"]},
+        {"attr": "email", "op": "starts_with", "values": ["Ann", "bob"]},
+        {"attr": "email", "op": "ends_with", "values": ["@ACME.com"]},
+        {"attr": "email", "op": "matches", "values": [r"^[a-z]+@acme\.com$", r"\d"]},
+        {"attr": "email", "op": "matches", "values": [r"^(a+)+$"]},
+        *({"attr": "age", "op": op, "values": [18, 21.5]} for op in ("lt", "lte", "gt", "gte")),
+        *({"attr": "version", "op": op, "values": ["1.10.0", "2.0.0-rc.1"]}
+          for op in ("semver_eq", "semver_lt", "semver_lte", "semver_gt", "semver_gte")),
+        *({"attr": "signed_up", "op": op, "values": ["2026-01-01T00:00:00Z", 1767225600000]}
+          for op in ("date_before", "date_after")),
+        # legacy shapes saved before validation: compiled code falls back to the interpreter
+        {"attr": "country", "op": "unknown", "values": ["US"]},
+        {"op": "in", "values": ["US"]},
+        {"attr": "country", "op": "in", "values": "US"},
+        {"attr": "age", "op": "gt", "values": ["18", 20]},
+    ]
+    USERS = [
+        {},
+        {"key": "u1", "country": "US", "email": "ann@acme.com", "age": 18, "version": "1.10.0",
+         "signed_up": "2025-12-31T23:59:59Z", "plan": "pro"},
+        {"key": "u2", "country": "CA", "email": "Bob7@ACME.COM", "age": 21.5, "version": "2.0.0-rc.1",
+         "signed_up": 1767225600000, "plan": 1},
+        {"key": "u3", "country": "DE", "email": "carol@example.org", "age": 65, "version": "2.0.0",
+         "signed_up": "2026-06-01", "plan": ["a"]},
+        {"key": "u4", "country": None, "email": 12, "age": True, "version": "v1", "signed_up": "soon",
+         "plan": {"k": 1}},
+        {"key": "u5", "country": ["US"], "email": "a" * 40 + "!", "age": "30", "version": 1, "signed_up": None,
+         "plan": None},
+        {"key": 1, "email": "x" * (MAX_MATCH_INPUT + 1) + "1", "age": float("nan")},
+    ]
+
+    @staticmethod
+    def outcome(fn, *args):
+        # legacy shapes can make the interpreter raise; the compiled rule must raise alike
+        try:
+            return fn(*args)
+        except Exception as e:
+            return type(e)
+
+    def test_clauses(self):
+        for clause in self.CLAUSES:
+            match = compile_clause(clause, self.SEGMENTS)
+            for user in self.USERS:
+                with self.subTest(clause=clause, user=user):
+                    self.assertEqual(
+                        self.outcome(match, user), self.outcome(clause_match, user, clause, self.SEGMENTS)
+                    )
+
+    def test_rules(self):
+        rules = [[], None, self.CLAUSES[:2], [self.CLAUSES[0], self.CLAUSES[6]], self.CLAUSES[9:16:3]]
+        for clauses in rules:
+            match = compile_rule(clauses, self.SEGMENTS)
+            for user in self.USERS:
+                with self.subTest(clauses=clauses, user=user):
+                    self.assertEqual(
+                        self.outcome(match, user), self.outcome(rule_matches, user, clauses, self.SEGMENTS)
+                    )
+
+
+@override_settings(AUDIT_WRITER_MODE="sync")
+class ClauseValidationApiTests(TestCase):
+    """Malformed clauses are refused with a 400 when a rule is saved."""
+
+    INVALID = [
+        "not a list",
+        ["not a clause"],
+        [{"op": "in", "values": ["US"]}],
+        [{"attr": "country", "op": "unknown", "values": ["US"]}],
+        [{"attr": "country", "op": "in", "values": "US"}],
+        [{"attr": "age", "op": "gt", "values": ["18"]}],
+        [{"attr": "email", "op": "matches", "values": [r"^(a+)+$"]}],
+        [{"attr": "key", "op": "in_segment", "values": [""]}],
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("rules@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Rules")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        cls.project, cls.env = seed_project(cls.org, 1, 1)
+        cls.state = FlagState.objects.get(environment=cls.env)
+        cls.rule = cls.state.rules.get()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_rule_create_and_update(self):
+        valid = [{"attr": "country", "op": "in", "values": ["US"]}]
+        for clauses in self.INVALID:
+            with self.subTest(clauses=clauses):
+                created = self.client.post(
+                    "/api/flag-rules/",
+                    {"state": self.state.id, "priority": 1, "clauses": clauses, "variation": {"value": True}},
+                    format="json",
+                )
+                self.assertEqual(created.status_code, 400)
+                self.assertIn("clauses", created.data)
+                updated = self.client.patch(f"/api/flag-rules/{self.rule.id}/", {"clauses": clauses}, format="json")
+                self.assertEqual(updated.status_code, 400)
+        self.assertEqual(self.state.rules.count(), 1)
+        self.rule.refresh_from_db()
+        self.assertEqual(self.rule.clauses, [{"attr": "country", "op": "in", "values": ["US", "CA"]}])
+
+        response = self.client.patch(f"/api/flag-rules/{self.rule.id}/", {"clauses": valid}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def test_bulk_import(self):
+        flags = [
+            {"key": "ok", "name": "Ok"},
+            {"key": "bad", "name": "Bad", "environments": {"prod": {"rules": [{"clauses": self.INVALID[5]}]}}},
+        ]
+        response = self.client.post("/api/flags/bulk/", {"project": self.project.id, "flags": flags}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(FeatureFlag.objects.filter(project=self.project, key__in=["ok", "bad"]).exists())
+
+
+@override_settings(EVAL_COUNTER_FLUSH_INTERVAL=0)
+class BatchEvaluateTests(TestCase):
+    """sdk_evaluate_batch must answer every user exactly like sdk_evaluate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Batch")
+        cls.project, cls.env = seed_project(cls.org, 12, 2)
+        cls.users = [{"key": f"user_{i}", "country": ("US", "DE")[i % 2]} for i in range(6)]
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+
+    def batch(self, body, path="/api/sdk/evaluate/batch/"):
+        raw = body if isinstance(body, str) else json.dumps(body)
+        return self.client.post(
+            path, raw, content_type="application/json", HTTP_X_CLIENT_KEY=self.env.client_sdk_key
+        )
+
+    def single(self, user):
+        response = self.batch({"user": user}, path="/api/sdk/evaluate/")
+        return json.loads(response.content)["flags"]
+
+    def test_list(self):
+        response = self.batch({"users": self.users})
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["results"]
+        self.assertEqual([r["index"] for r in results], list(range(len(self.users))))
+        for user, result in zip(self.users, results):
+            self.assertEqual(result["key"], user["key"])
+            self.assertEqual(result["flags"], self.single(user))
+
+    def test_stream(self):
+        for body, path in (
+            ({"users": self.users, "stream": True}, "/api/sdk/evaluate/batch/"),
+            ({"users": self.users}, "/api/sdk/evaluate/batch/?stream=1"),
+        ):
+            with self.subTest(path=path):
+                response = self.batch(body, path=path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response["Content-Type"], "application/x-ndjson")
+                lines = b"".join(response.streaming_content).decode().splitlines()
+                listed = json.loads(self.batch({"users": self.users}).content)["results"]
+                self.assertEqual([json.loads(line) for line in lines], listed)
+
+    def test_selection(self):
+        results = json.loads(self.batch({"users": self.users[:1], "flags": ["flag_3"]}).content)["results"]
+        self.assertEqual(list(results[0]["flags"]), ["flag_3"])
+
+    def test_invalid_users_are_reported_per_row(self):
+        response = self.batch({"users": [{"key": "a"}, {}, "b", {"key": ""}]})
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)["results"]
+        self.assertEqual(results[0]["key"], "a")
+        self.assertEqual([r.get("error") for r in results[1:]], ["user.key is required"] * 3)
+
+    @override_settings(SDK_BATCH_MAX_USERS=3)
+    def test_malformed(self):
+        for body in ([{"key": "a"}], "[]", "42", '"users"', {}, {"users": {"key": "a"}}, {"users": self.users},
+                     {"users": self.users[:1], "flags": "flag_1"}):
+            with self.subTest(body=body):
+                self.assertEqual(self.batch(body).status_code, 400)
+        self.assertEqual(
+            self.client.post("/api/sdk/evaluate/batch/", {"users": []}, content_type="application/json").status_code,
+            401,
+        )
+
+
+CONFORMANCE_CORPUS = settings.BASE_DIR.parent / "sdk" / "conformance" / "cases.json"
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class AsyncEvaluateTests(TestCase):
+    """sdk_evaluate_async must answer exactly like sdk_evaluate."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Async")
+        cls.project, cls.env = seed_project(cls.org, 20, 2)
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+
+    def post(self, path, body, **headers):
+        raw = body if isinstance(body, str) else json.dumps(body)
+        return self.client.post(path, raw, content_type="application/json", **headers)
+
+    def both(self, body, **headers):
+        return [
+            self.post(path, body, **headers)
+            for path in ("/api/sdk/evaluate/", "/api/sdk/evaluate/async/")
+        ]
+
+    def test_same_responses(self):
+        key = {"HTTP_X_CLIENT_KEY": self.env.client_sdk_key}
+        bodies = [
+            {"user": {"key": "user_1", "country": "US"}},
+            {"user": {"key": "ü", "country": "CA"}, "flags": ["flag_3"], "prefix": "flag_1"},
+            {"user": {}},
+            {"user": {"key": "u"}, "flags": "flag_1"},
+            {"user": {"key": "u"}, "prefix": 5},
+        ]
+        for body in bodies:
+            with self.subTest(body=body):
+                sync, native = self.both(body, **key)
+                self.assertEqual(native.status_code, sync.status_code)
+                self.assertEqual(native.content, sync.content)
+                self.assertEqual(native.get("ETag"), sync.get("ETag"))
+
+        etag = self.post("/api/sdk/evaluate/", bodies[0], **key)["ETag"]
+        sync, native = self.both(bodies[0], HTTP_IF_NONE_MATCH=etag, **key)
+        self.assertEqual((sync.status_code, native.status_code), (304, 304))
+        sync, native = self.both(bodies[0])
+        self.assertEqual((sync.status_code, native.status_code), (401, 401))
+        sync, native = self.both(bodies[0], HTTP_X_CLIENT_KEY="nope")
+        self.assertEqual((native.status_code, native.json()), (sync.status_code, sync.data))
+        self.assertEqual(self.post("/api/sdk/evaluate/async/", "{", **key).status_code, 400)
+        self.assertEqual(self.client.get("/api/sdk/evaluate/async/", **key).status_code, 405)
+
+    async def test_asgi_middleware_chain(self):
+        # AsyncClient runs the middleware in async mode, as under uvicorn
+        client = AsyncClient()
+        body = {"user": {"key": "user_1", "country": "US"}}
+        key = {"X-Client-Key": self.env.client_sdk_key}
+        sync = await client.post("/api/sdk/evaluate/", body, content_type="application/json", headers=key)
+        native = await client.post("/api/sdk/evaluate/async/", body, content_type="application/json", headers=key)
+        self.assertEqual((sync.status_code, native.status_code), (200, 200))
+        self.assertEqual(native.content, sync.content)
+        self.assertEqual(native["X-Frame-Options"], "DENY")
+
+        login = await AsyncClient().get("/admin/login/")
+        self.assertEqual(login.status_code, 200)
+        self.assertIn(settings.CSRF_COOKIE_NAME, login.cookies)
+
+    def test_cached_requests_read_only_the_environment(self):
+        body = {"user": {"key": "user_1"}}
+        key = {"HTTP_X_CLIENT_KEY": self.env.client_sdk_key}
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.post("/api/sdk/evaluate/async/", body, **key).status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 3)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.post("/api/sdk/evaluate/async/", body, **key).status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+@override_settings(SDK_STREAM_POLL_INTERVAL=0.01, SDK_STREAM_HEARTBEAT=5)
+class StreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Stream")
+        cls.project, cls.env = seed_project(cls.org, 2, 1)
+        cls.other = Environment.objects.create(project=cls.project, name="Staging", key="staging")
+
+    def setUp(self):
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+        # a hub per test: each async test runs on its own event loop
+        patcher = mock.patch("apps.flags.stream.hub", ChangeHub())
+        self.hub = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def change(self, env, flag_key="flag_0"):
+        config_changed([env.id], "flagstate.updated", flag_key)
+        return FlagChangeEvent.objects.filter(environment=env).latest("id").id
+
+    async def open(self, **headers):
+        response = await AsyncClient().get("/api/sdk/stream/", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response
+
+    async def read(self, response, n):
+        """The ids of the next `n` events; [..., None] if the stream ends first."""
+        ids = []
+        while len(ids) < n:
+            try:
+                chunk = await asyncio.wait_for(response.streaming_content.__anext__(), 5)
+            except StopAsyncIteration:
+                ids.append(None)
+                break
+            chunk = chunk.decode()
+            if chunk.startswith("id: "):
+                ids.append(int(chunk.split("\n")[0][4:]))
+                self.assertIn('event: change\ndata: {"kind":"flagstate.updated","flag":', chunk)
+        return ids
+
+    async def test_auth(self):
+        client = AsyncClient()
+        self.assertEqual((await client.get("/api/sdk/stream/")).status_code, 401)
+        self.assertEqual((await client.get("/api/sdk/stream/", headers={"X-Client-Key": "c_nope"})).status_code, 401)
+        self.assertEqual((await client.post("/api/sdk/stream/")).status_code, 405)
+        bad_id = await client.get(
+            "/api/sdk/stream/", headers={"X-Client-Key": self.env.client_sdk_key, "Last-Event-ID": "x"}
+        )
+        self.assertEqual(bad_id.status_code, 400)
+        for response in (
+            await self.open(**{"X-Client-Key": self.env.client_sdk_key}),
+            await self.open(**{"X-Server-Key": self.env.server_sdk_key}),
+            await AsyncClient().get("/api/sdk/stream/", {"client_key": self.env.client_sdk_key}),
+        ):
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual((await response.streaming_content.__anext__()).decode(), "retry: 3000\n\n")
+            await response.streaming_content.aclose()
+
+    def test_requires_asgi(self):
+        response = self.client.get("/api/sdk/stream/", HTTP_X_CLIENT_KEY=self.env.client_sdk_key)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_live_events(self):
+        response = await self.open(**{"X-Client-Key": self.env.client_sdk_key})
+        self.assertEqual(await response.streaming_content.__anext__(), b"retry: 3000\n\n")
+        await sync_to_async(self.change)(self.other)  # another environment: not delivered
+        first = await sync_to_async(self.change)(self.env)
+        second = await sync_to_async(self.change)(self.env, "flag_1")
+        self.assertEqual(await self.read(response, 2), [first, second])
+        await response.streaming_content.aclose()
+
+    async def test_replay_and_resume(self):
+        seen = await sync_to_async(self.change)(self.env)
+        missed = [await sync_to_async(self.change)(self.env) for _ in range(3)]
+        await sync_to_async(self.change)(self.other)
+        response = await self.open(**{"X-Client-Key": self.env.client_sdk_key, "Last-Event-ID": str(seen)})
+        self.assertEqual(await self.read(response, 3), missed)
+        live = await sync_to_async(self.change)(self.env)
+        self.assertEqual(await self.read(response, 1), [live])
+        await response.streaming_content.aclose()
+
+        # EventSource cannot set headers: ?client_key=&last_event_id=
+        response = await AsyncClient().get(
+            "/api/sdk/stream/", {"client_key": self.env.client_sdk_key, "last_event_id": missed[-1]}
+        )
+        self.assertEqual(await self.read(response, 1), [live])
+        await response.streaming_content.aclose()
+
+    async def test_replay_runs_up_to_the_live_tail(self):
+        seen = await sync_to_async(self.change)(self.env)
+        missed = [await sync_to_async(self.change)(self.env) for _ in range(5)]
+        with mock.patch("apps.flags.stream.REPLAY_PAGE", 2):
+            response = await self.open(**{"X-Client-Key": self.env.client_sdk_key, "Last-Event-ID": str(seen)})
+            self.assertEqual(await self.read(response, 5), missed)
+        live = await sync_to_async(self.change)(self.env)
+        self.assertEqual(await self.read(response, 1), [live])
+        await response.streaming_content.aclose()
+
+    async def test_poll_failure_closes_streams(self):
+        response = await self.open(**{"X-Client-Key": self.env.client_sdk_key})
+        await response.streaming_content.__anext__()  # retry:, subscribed
+        with self.assertLogs("apps.flags.stream", "ERROR") as logs, \
+                mock.patch.object(FlagChangeEvent.objects, "filter", side_effect=DatabaseError("gone")):
+            self.assertEqual(await self.read(response, 1), [None])
+        self.assertIn("SDK stream poll failed; closing 1 streams", logs.output[0])
+        self.assertEqual(self.hub._subscribers, {})
+
+        # the reconnect starts a new poll task
+        resumed = await self.open(**{"X-Client-Key": self.env.client_sdk_key})
+        await resumed.streaming_content.__anext__()
+        live = await sync_to_async(self.change)(self.env)
+        self.assertEqual(await self.read(resumed, 1), [live])
+        await resumed.streaming_content.aclose()
+
+    @override_settings(SDK_STREAM_QUEUE_SIZE=2)
+    async def test_slow_consumer_is_closed_and_replays(self):
+        response = await self.open(**{"X-Client-Key": self.env.client_sdk_key})
+        await response.streaming_content.__anext__()  # retry:, subscribed
+        events = await sync_to_async(lambda: [self.change(self.env) for _ in range(5)])()
+        self.assertEqual(await self.read(response, 1), [None])
+        self.assertEqual(self.hub._subscribers, {})
+
+        resumed = await self.open(**{"X-Client-Key": self.env.client_sdk_key, "Last-Event-ID": str(events[0] - 1)})
+        self.assertEqual(await self.read(resumed, 5), events)
+        await resumed.streaming_content.aclose()
+
+    def test_prune(self):
+        self.change(self.env)
+        old = self.change(self.other)
+        FlagChangeEvent.objects.filter(id=old).update(created_at=timezone.now() - timedelta(hours=25))
+        out = io.StringIO()
+        call_command("prune_audit_logs", dry_run=True, stdout=out)
+        self.assertIn("stream change events: 1 older than 24 hours", out.getvalue())
+        self.assertEqual(FlagChangeEvent.objects.count(), 2)
+        self.assertEqual(prune_events(), 1)
+        self.assertFalse(FlagChangeEvent.objects.filter(id=old).exists())
+        self.assertEqual(FlagChangeEvent.objects.count(), 1)
+
+
+def seed_ruleset(org, name, payload):
+    """Create the flags/states/rules described by a /api/sdk/ruleset/ payload."""
+    project = Project.objects.create(org=org, name=name, key=name)
+    env = Environment.objects.create(project=project, name=payload["environment"], key=payload["environment"])
+    for f in payload["flags"]:
+        flag = FeatureFlag.objects.create(project=project, key=f["key"], name=f["key"])
+        state = FlagState.objects.create(
+            flag=flag,
+            environment=env,
+            enabled=f["enabled"],
+            rollout_percentage=f["rollout_percentage"],
+            on_variation={"value": f["on_value"]},
+            off_variation={"value": f["off_value"]},
+            default_variation={"value": f["default_value"]},
+        )
+        for priority, r in enumerate(f["rules"]):
+            FlagRule.objects.create(
+                id=r["id"],
+                state=state,
+                priority=priority,
+                clauses=r["clauses"],
+                variation={"value": r["value"]},
+                rollout_percentage=r["rollout_percentage"],
+            )
+    for key, members in payload.get("segments", {}).items():
+        apply_changes(Segment.objects.create(project=project, key=key, name=key), add=members)
+    return env
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class ConformanceTests(TestCase):
+    """
+    sdk/conformance/cases.json is shared with the Python SDK's test suite:
+    both the server and local SDK evaluation must produce these results.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.corpus = json.loads(CONFORMANCE_CORPUS.read_text())
+        org = Organization.objects.create(name="Conformance")
+        cls.envs = [seed_ruleset(org, f"case-{i}", case["ruleset"]) for i, case in enumerate(cls.corpus["cases"])]
+
+    def setUp(self):
+        clear_rulesets()
+        clear_members()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+
+    def test_sdk_evaluate_matches_corpus(self):
+        client = APIClient()
+        for case, env in zip(self.corpus["cases"], self.envs):
+            for expected in case["results"]:
+                with self.subTest(case=case["name"], user=expected["user"]):
+                    response = client.post(
+                        "/api/sdk/evaluate/", {"user": expected["user"]}, format="json",
+                        HTTP_X_CLIENT_KEY=env.client_sdk_key,
+                    )
+                    self.assertEqual(response.data["flags"], expected["flags"])
+
+    def test_ruleset_endpoint_matches_corpus(self):
+        client = APIClient()
+        for case, env in zip(self.corpus["cases"], self.envs):
+            with self.subTest(case=case["name"]):
+                response = client.get("/api/sdk/ruleset/", HTTP_X_SERVER_KEY=env.server_sdk_key)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data["flags"], case["ruleset"]["flags"])
+                self.assertEqual(response.data["segments"], case["ruleset"].get("segments", {}))
+
+                not_modified = client.get(
+                    "/api/sdk/ruleset/", HTTP_X_SERVER_KEY=env.server_sdk_key, HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+                self.assertEqual(not_modified.status_code, 304)
+
+    def test_ruleset_requires_server_key(self):
+        env = self.envs[0]
+        self.assertEqual(APIClient().get("/api/sdk/ruleset/").status_code, 401)
+        response = APIClient().get("/api/sdk/ruleset/", HTTP_X_SERVER_KEY=env.client_sdk_key)
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(EVAL_COUNTER_FLUSH_INTERVAL=0)
+class EvaluationCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("counts@example.com", "pass12345")
+        org = Organization.objects.create(name="Counts")
+        Membership.objects.create(org=org, user=cls.user, role="viewer")
+        cls.env = seed_ruleset(org, "counts", {"environment": "production", "flags": [
+            {"key": "on", "enabled": True, "rollout_percentage": 100, "on_value": True, "off_value": False,
+             "default_value": "fallback", "rules": [
+                 {"id": 1, "clauses": [{"attr": "plan", "op": "equals", "values": ["pro"]}],
+                  "rollout_percentage": 100, "value": {"tier": "pro"}},
+             ]},
+            {"key": "off", "enabled": False, "rollout_percentage": 100, "on_value": True, "off_value": False,
+             "default_value": False, "rules": []},
+        ]})
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+        counters.flush()
+        FlagEvaluationCount.objects.all().delete()
+
+    def evaluate(self, user):
+        response = APIClient().post(
+            "/api/sdk/evaluate/", {"user": user}, format="json", HTTP_X_CLIENT_KEY=self.env.client_sdk_key
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_counts_are_aggregated_and_added_on_flush(self):
+        for i in range(3):
+            self.evaluate({"key": f"u{i}", "plan": "pro"})
+        self.evaluate({"key": "u9"})
+        with self.assertNumQueries(1):  # the environment row; counting costs none
+            self.evaluate({"key": "u10", "plan": "pro"})
+        counters.flush()
+        self.evaluate({"key": "u11", "plan": "pro"})
+        counters.flush()
+
+        rows = {
+            (r.flag_key, r.value, r.reason): r.count
+            for r in FlagEvaluationCount.objects.filter(environment=self.env)
+        }
+        self.assertEqual(rows, {
+            ("on", '{"tier":"pro"}', "rule_match"): 5,
+            ("on", '"fallback"', "default"): 1,
+            ("off", "false", "off"): 6,
+        })
+
+    def test_api_reports_totals(self):
+        self.evaluate({"key": "u1", "plan": "pro"})
+        self.evaluate({"key": "u2"})
+        counters.flush()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/flag-evaluations/", {"environment_id": self.env.id, "flag": "on"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted((t["reason"], t["count"]) for t in response.data["totals"]),
+            [("default", 1), ("rule_match", 1)],
+        )
+        self.assertEqual(response.data["totals"][0]["flag"], "on")
+        self.assertIn({"tier": "pro"}, [t["value"] for t in response.data["totals"]])
+
+        for since in ("yesterday", "2026-13-01T00:00", "2026-02-30T00:00"):
+            with self.subTest(since=since):
+                response = client.get("/api/flag-evaluations/", {"environment_id": self.env.id, "since": since})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["detail"], "since must be an ISO 8601 datetime")
+
+        outsider = User.objects.create_user("outsider@example.com", "pass12345")
+        client.force_authenticate(outsider)
+        response = client.get("/api/flag-evaluations/", {"environment_id": self.env.id})
+        self.assertEqual(response.status_code, 404)
+
+
+def flag_definition(i, **environments):
+    return {
+        "key": f"imported_{i}",
+        "name": f"Imported {i}",
+        "environments": environments or {
+            "prod": {
+                "enabled": True,
+                "rollout_percentage": 50,
+                "rules": [
+                    {"clauses": [{"attr": "plan", "op": "equals", "values": ["pro"]}], "variation": {"value": "pro"}},
+                    {"clauses": [{"attr": "country", "op": "in", "values": ["US"]}], "rollout_percentage": 10},
+                ],
+            },
+        },
+    }
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class BulkImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("importer@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Importers")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        cls.project = Project.objects.create(org=cls.org, name="Legacy", key="legacy")
+        cls.envs = [
+            Environment.objects.create(project=cls.project, name=key, key=key) for key in ("dev", "staging", "prod")
+        ]
+        FeatureFlag.objects.create(project=cls.project, key="existing", name="Existing")
+
+    def setUp(self):
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, flags, **extra):
+        return self.client.post(
+            "/api/flags/bulk/", {"project": self.project.id, "flags": flags, **extra}, format="json"
+        )
+
+    def test_import_is_a_fixed_number_of_queries(self):
+        counts = []
+        # sizes below SQLite's 999-parameter batch split of bulk_create
+        for n, offset in ((5, 0), (30, 100)):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.post([flag_definition(offset + i) for i in range(n)])
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(response.data["created"], n)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+        prod = FlagState.objects.get(flag__key="imported_0", environment__key="prod")
+        self.assertEqual((prod.enabled, prod.rollout_percentage), (True, 50))
+        self.assertEqual(list(prod.rules.values_list("priority", "rollout_percentage")), [(0, 100), (1, 10)])
+        dev = FlagState.objects.get(flag__key="imported_0", environment__key="dev")
+        self.assertEqual((dev.enabled, dev.rules.count()), (False, 0))
+        self.assertEqual(Environment.objects.get(pk=self.envs[2].pk).config_version, 2)
+
+        entries = AuditLog.objects.filter(action="flag.bulk_create")
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(entries.order_by("id").first().metadata["count"], 5)
+
+    def test_invalid_definitions_write_nothing(self):
+        bad_clause = flag_definition(1, prod={"rules": [{"clauses": [{"attr": "x", "op": "regex", "values": []}]}]})
+        response = self.post([flag_definition(0), bad_clause, {"key": "not a slug"}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.data["flags"]), [1, 2])
+        self.assertIn("regex", str(response.data["flags"][1]))
+
+        response = self.post([flag_definition(0), flag_definition(2, qa={"enabled": True}), {"key": "existing"}])
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["flags"]
+        self.assertEqual(sorted(errors), [1, 2])
+        self.assertIn("qa", str(errors[1]["environments"]))
+        self.assertIn("key", errors[2])
+
+        response = self.post([flag_definition(0), flag_definition(0)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Duplicate", str(response.data["flags"]))
+        self.assertEqual(FeatureFlag.objects.filter(project=self.project).count(), 1)
+
+    def test_skip_existing(self):
+        response = self.post([{"key": "existing"}, flag_definition(0)], on_conflict="skip")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data["created"], response.data["skipped"]), (1, ["existing"]))
+        self.assertEqual(FlagState.objects.filter(flag__project=self.project).count(), 3)
+
+    def test_requires_developer_membership(self):
+        viewer = User.objects.create_user("viewer@example.com", "pass12345")
+        Membership.objects.create(org=self.org, user=viewer, role="viewer")
+        self.client.force_authenticate(viewer)
+        self.assertEqual(self.post([flag_definition(0)]).status_code, 403)
+        self.client.force_authenticate(User.objects.create_user("outsider@example.com", "pass12345"))
+        self.assertEqual(self.post([flag_definition(0)]).status_code, 404)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".ndjson") as f:
+            f.write("\n".join(json.dumps(flag_definition(i)) for i in range(3)))
+            f.flush()
+            call_command("import_flags", f.name, project="importers/legacy", actor=self.user.email, stdout=io.StringIO())
+        self.assertEqual(FeatureFlag.objects.filter(project=self.project).count(), 4)
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class SnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("snapshots@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Snapshots")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        cls.source, _ = seed_project(cls.org, 30, 2)
+        cls.target = Project.objects.create(org=cls.org, name="Restored", key="restored")
+
+    def setUp(self):
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, project):
+        response = self.client.get(f"/api/projects/{project.id}/export/")
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def restore(self, snapshot, **params):
+        query = "&".join(f"{k}=1" for k in params)
+        response = self.client.post(
+            f"/api/projects/{self.target.id}/import/?{query}", snapshot, content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 200, getattr(response, "data", None))
+        return response.data["changes"]
+
+    def test_round_trip_is_idempotent(self):
+        snapshot = self.export(self.source)
+        changes = self.restore(snapshot)
+        self.assertEqual(changes["environments"], {"created": 1})
+        self.assertEqual(changes["flags"], {"created": 30, "updated": 0, "unchanged": 0, "deleted": 0})
+        self.assertEqual(changes["states"], {"created": 30, "updated": 0, "unchanged": 0})
+        self.assertEqual(changes["rules"], {"created": 60, "deleted": 0})
+        # everything but the project line matches
+        self.assertEqual(self.export(self.target).splitlines()[1:], snapshot.splitlines()[1:])
+
+        version = Environment.objects.get(project=self.target, key="prod").config_version
+        changes = self.restore(snapshot)
+        self.assertEqual(changes["flags"]["unchanged"], 30)
+        self.assertEqual(changes["states"]["unchanged"], 30)
+        self.assertEqual(changes["rules"], {"created": 0, "deleted": 0})
+        self.assertEqual(Environment.objects.get(project=self.target, key="prod").config_version, version)
+
+    def test_only_differences_are_written(self):
+        self.restore(self.export(self.source))
+        state = FlagState.objects.get(flag__project=self.source, flag__key="flag_3", environment__key="prod")
+        state.enabled = not state.enabled
+        state.save()
+        state.rules.first().delete()
+        FeatureFlag.objects.filter(project=self.source, key="flag_7").delete()
+        snapshot = self.export(self.source)
+
+        preview = self.restore(snapshot, dry_run=True, prune=True)
+        self.assertEqual(FeatureFlag.objects.filter(project=self.target).count(), 30)
+        changes = self.restore(snapshot, prune=True)
+        self.assertEqual(changes, preview)
+        self.assertEqual(changes["flags"], {"created": 0, "updated": 0, "unchanged": 29, "deleted": 1})
+        self.assertEqual(changes["states"], {"created": 0, "updated": 1, "unchanged": 28})
+        self.assertEqual(changes["rules"], {"created": 1, "deleted": 2})
+        self.assertEqual(self.export(self.target).splitlines()[1:], snapshot.splitlines()[1:])
+        self.assertEqual(AuditLog.objects.filter(action="project.import").count(), 2)
+
+    def test_export_is_a_fixed_number_of_queries(self):
+        def queries(project):
+            with CaptureQueriesContext(connection) as ctx:
+                self.export(project)
+            return len(ctx.captured_queries)
+
+        small, _ = seed_project(self.org, 5, 2)
+        self.export(small)  # warm the role map
+        self.assertEqual(queries(small), queries(self.source))
+
+    def test_invalid_snapshot_writes_nothing(self):
+        lines = self.export(self.source).splitlines()
+        lines.insert(5, json.dumps({"type": "flag", "key": "broken", "environments": {"nowhere": {}}}))
+        response = self.client.post(
+            f"/api/projects/{self.target.id}/import/", "\n".join(lines), content_type="application/x-ndjson"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 6", response.data["detail"])
+        self.assertFalse(Environment.objects.filter(project=self.target).exists())
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class EnvironmentPromoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("promoter@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Promoters")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        cls.project, cls.staging = seed_project(cls.org, 40, 2)
+
+    def setUp(self):
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_env(self, project, key):
+        response = self.client.post("/api/environments/", {"project": project.id, "name": key, "key": key})
+        self.assertEqual(response.status_code, 201, response.data)
+        return Environment.objects.get(pk=response.data["id"])
+
+    def promote(self, source, target, **body):
+        response = self.client.post(
+            f"/api/environments/{source.id}/promote/", {"target": target.id, **body}, format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_new_environment_gets_states_for_existing_flags(self):
+        prod = self.create_env(self.project, "production")
+        states = FlagState.objects.filter(environment=prod)
+        self.assertEqual(states.count(), 40)
+        self.assertFalse(states.filter(enabled=True).exists())
+
+    def test_promote_diff_then_apply(self):
+        prod = self.create_env(self.project, "production")
+        preview = self.promote(self.staging, prod, dry_run=True)
+        self.assertEqual(preview["summary"], {"created": 0, "updated": 40, "unchanged": 0})
+        self.assertFalse(FlagRule.objects.filter(state__environment=prod).exists())
+        change = next(c for c in preview["changes"] if c["flag"] == "flag_1")
+        self.assertEqual(change["fields"]["enabled"], {"from": False, "to": True})
+        self.assertEqual(change["rules"], {"from": 0, "to": 2})
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.promote(self.staging, prod)
+        self.assertEqual(result["changes"], preview["changes"])
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertEqual(FlagRule.objects.filter(state__environment=prod).count(), 80)
+        self.assertEqual(Environment.objects.get(pk=prod.pk).config_version, 1)
+        self.assertEqual(self.promote(self.staging, prod)["summary"]["unchanged"], 40)
+
+        FlagState.objects.filter(environment=self.staging, flag__key="flag_2").update(rollout_percentage=5)
+        result = self.promote(self.staging, prod, flags=["flag_2", "flag_3"])
+        self.assertEqual(result["summary"], {"created": 0, "updated": 1, "unchanged": 1})
+
+    def test_promote_reads_target_inside_transaction(self):
+        prod = self.create_env(self.project, "production")
+        with CaptureQueriesContext(connection) as ctx:
+            self.promote(self.staging, prod)
+        sql = [q["sql"] for q in ctx.captured_queries]
+        savepoint = next(i for i, q in enumerate(sql) if q.startswith("SAVEPOINT"))
+        read = next(
+            i for i, q in enumerate(sql)
+            if q.startswith('SELECT "flags_flagstate"') and f'"environment_id" = {prod.id}' in q
+        )
+        self.assertLess(savepoint, read)
+        released = [i for i, q in enumerate(sql) if q.startswith("RELEASE SAVEPOINT")]
+        self.assertTrue(any(i > read for i in released))
+        if connection.features.has_select_for_update:
+            self.assertIn("FOR UPDATE", sql[read])
+
+    def test_clone(self):
+        response = self.client.post(
+            f"/api/environments/{self.staging.id}/clone/", {"name": "QA", "key": "qa"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data["copied"]["created"], 40)
+        qa = Environment.objects.get(pk=response.data["id"])
+        self.assertNotEqual(qa.client_sdk_key, self.staging.client_sdk_key)
+        source = {s.flag_id: (s.enabled, s.rollout_percentage, s.rules.count()) for s in self.staging.flag_states.all()}
+        copied = {s.flag_id: (s.enabled, s.rollout_percentage, s.rules.count()) for s in qa.flag_states.all()}
+        self.assertEqual(copied, source)
+
+    def test_permissions_and_targets(self):
+        other_project, other_env = seed_project(self.org, 1, 0)
+        response = self.client.post(
+            f"/api/environments/{self.staging.id}/promote/", {"target": other_env.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        prod = self.create_env(self.project, "production")
+        viewer = User.objects.create_user("promo-viewer@example.com", "pass12345")
+        Membership.objects.create(org=self.org, user=viewer, role="viewer")
+        self.client.force_authenticate(viewer)
+        response = self.client.post(
+            f"/api/environments/{self.staging.id}/promote/", {"target": prod.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class WarmupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        org = Organization.objects.create(name="Warm")
+        cls.envs = [seed_project(org, n, 1)[1] for n in (3, 4, 5)]
+        now = timezone.now()
+        for env, count in ((cls.envs[0], 10), (cls.envs[2], 500)):
+            FlagEvaluationCount.objects.create(
+                environment=env, bucket_start=now, flag_key="flag_0", value="true", reason="default", count=count,
+            )
+        FlagEvaluationCount.objects.create(
+            environment=cls.envs[1], bucket_start=now - timedelta(days=3),
+            flag_key="flag_0", value="true", reason="default", count=10_000,
+        )
+
+    def setUp(self):
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+
+    def evaluate(self, env):
+        return self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": "u1"}}, content_type="application/json",
+            HTTP_X_CLIENT_KEY=env.client_sdk_key,
+        )
+
+    def test_warms_busiest_environments(self):
+        out = io.StringIO()
+        call_command("warm_flags", "--limit", "1", "--json", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual([e["id"] for e in report["environments"]], [self.envs[2].id])
+        self.assertEqual(report["environments"][0]["flags"], 5)
+
+        with self.assertNumQueries(1):  # the environment row
+            self.assertEqual(self.evaluate(self.envs[2]).status_code, 200)
+        with self.assertNumQueries(3):  # not warmed: key lookup and ruleset load
+            self.evaluate(self.envs[0])
+
+    def test_report(self):
+        out = io.StringIO()
+        call_command("warm_flags", stdout=out)
+        self.assertIn("Warmed 2 environments, 8 flags", out.getvalue())
+
+
+@override_settings(EVAL_COUNTER_FLUSH_INTERVAL=0)
+class WarmupOnStartTests(TransactionTestCase):
+    def setUp(self):
+        org = Organization.objects.create(name="Warm ASGI")
+        self.env = seed_project(org, 3, 1)[1]
+        FlagEvaluationCount.objects.create(
+            environment=self.env, bucket_start=timezone.now(), flag_key="flag_0", value="true", reason="default",
+            count=10,
+        )
+        clear_rulesets()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+
+    def test_asgi_app_loaded_in_running_loop(self):
+        async def load():
+            # what uvicorn does: Config.load() imports the app inside the server's event loop
+            sys.modules.pop("config.asgi", None)
+            importlib.import_module("config.asgi")
+
+        with self.assertLogs("apps.flags.warmup", "INFO") as logs:
+            asyncio.run(load())
+        self.assertEqual(len(logs.records), 1)
+        self.assertTrue(logs.output[0].startswith("INFO:apps.flags.warmup:flag warm-up: 1 environments, 3 flags"))
+        with self.assertNumQueries(1):  # the environment row; the ruleset was compiled by the warm-up
+            response = self.client.post(
+                "/api/sdk/evaluate/", {"user": {"key": "u1"}}, content_type="application/json",
+                HTTP_X_CLIENT_KEY=self.env.client_sdk_key,
+            )
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(AUDIT_WRITER_MODE="sync", EVAL_COUNTER_FLUSH_INTERVAL=0)
+class SegmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("segments@example.com", "pass12345")
+        cls.viewer = User.objects.create_user("segment-viewer@example.com", "pass12345")
+        cls.org = Organization.objects.create(name="Segments")
+        Membership.objects.create(org=cls.org, user=cls.user, role="developer")
+        Membership.objects.create(org=cls.org, user=cls.viewer, role="viewer")
+        cls.env = seed_ruleset(cls.org, "segments", {"environment": "prod", "flags": [
+            {"key": "beta", "enabled": True, "rollout_percentage": 100, "on_value": True, "off_value": False,
+             "default_value": False, "rules": [
+                 {"id": 7001, "clauses": [{"attr": "key", "op": "in_segment", "values": ["testers"]}],
+                  "rollout_percentage": 100, "value": True},
+             ]},
+        ], "segments": {"testers": [f"user_{i}" for i in range(0, 2000, 2)]}})
+        cls.segment = Segment.objects.get(project=cls.env.project, key="testers")
+
+    def setUp(self):
+        clear_rulesets()
+        clear_members()
+        caches[settings.SDK_KEY_CACHE_ALIAS].clear()
+        caches[settings.ROLE_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def evaluate(self, key):
+        response = self.client.post(
+            "/api/sdk/evaluate/", {"user": {"key": key}}, format="json", HTTP_X_CLIENT_KEY=self.env.client_sdk_key
+        )
+        return response.data["flags"]["beta"]["reason"]
+
+    def upload(self, **body):
+        return self.client.post(f"/api/segments/{self.segment.id}/members/", body, format="json")
+
+    def test_incremental_upload_rewrites_only_touched_buckets(self):
+        self.assertEqual(self.segment.size, 1000)
+        self.assertLessEqual(SegmentChunk.objects.filter(segment=self.segment).count(), BUCKETS)
+        before = dict(SegmentChunk.objects.filter(segment=self.segment).values_list("bucket", "data"))
+        version = Environment.objects.get(pk=self.env.pk).config_version
+
+        response = self.upload(add=["user_1", "user_0"], remove=["user_2", "nobody"])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data, {"segment": "testers", "added": 1, "removed": 1, "size": 1000, "version": 2})
+        after = dict(SegmentChunk.objects.filter(segment=self.segment).values_list("bucket", "data"))
+        self.assertLessEqual(sum(bytes(after[b]) != bytes(before.get(b, b"")) for b in after), 2)
+        self.assertEqual(Environment.objects.get(pk=self.env.pk).config_version, version + 1)
+        self.assertTrue(AuditLog.objects.filter(action="segment.members").exists())
+
+        response = self.client.get(f"/api/segments/{self.segment.id}/members/", {"key": "user_1"})
+        self.assertEqual(response.data["member"], True)
+        response = self.client.get(f"/api/segments/{self.segment.id}/members/", {"key": "user_2"})
+        self.assertEqual(response.data["member"], False)
+
+    def test_in_segment_evaluation_follows_uploads(self):
+        self.assertEqual(self.evaluate("user_4"), "rule_match")
+        self.assertEqual(self.evaluate("user_5"), "default")
+        self.assertEqual(self.upload(add=["user_5"], remove=["user_4"]).status_code, 200)
+        self.assertEqual(self.evaluate("user_4"), "default")
+        self.assertEqual(self.evaluate("user_5"), "rule_match")
+
+        # an unrelated change recompiles the ruleset but reuses the cached members
+        FlagState.objects.get(environment=self.env).save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.evaluate("user_5"), "rule_match")
+        self.assertFalse(any("segmentchunk" in q["sql"] for q in ctx.captured_queries))
+
+        ruleset = self.client.get("/api/sdk/ruleset/", HTTP_X_SERVER_KEY=self.env.server_sdk_key).data
+        self.assertEqual(len(ruleset["segments"]["testers"]), 1000)
+        self.assertIn("user_5", ruleset["segments"]["testers"])
+
+    def test_deleting_segment_stops_matching(self):
+        self.assertEqual(self.evaluate("user_4"), "rule_match")
+        self.assertEqual(self.client.delete(f"/api/segments/{self.segment.id}/").status_code, 204)
+        self.assertEqual(self.evaluate("user_4"), "default")
+        self.assertFalse(SegmentChunk.objects.filter(segment_id=self.segment.id).exists())
+
+    def test_validation_and_permissions(self):
+        response = self.upload(add=["a"], remove=["a"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.upload(add=["two\nlines"]).status_code, 400)
+        with override_settings(SEGMENT_UPLOAD_MAX_KEYS=2):
+            self.assertEqual(self.upload(add=["a", "b", "c"]).status_code, 400)
+        state = FlagState.objects.get(environment=self.env)
+        response = self.client.post("/api/flag-rules/", {
+            "state": state.id, "clauses": [{"attr": "key", "op": "in_segment", "values": [3]}],
+        }, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        self.client.force_authenticate(self.viewer)
+        self.assertEqual(self.upload(add=["x"]).status_code, 403)
+        response = self.client.post(
+            "/api/segments/", {"project": self.env.project_id, "key": "vip", "name": "VIP"}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_segment_members_command(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "members.txt")
+        with open(path, "w") as f:
+            f.write("alice\nbob\n\ncarol\n")
+        out = io.StringIO()
+        call_command(
+            "segment_members", "vip", "--project", f"{self.org.slug}/segments", "--create", "--add", path, stdout=out
+        )
+        self.assertIn("added 3, removed 0, 3 members", out.getvalue())
+        vip = Segment.objects.get(project=self.env.project, key="vip")
+        self.assertEqual(vip.size, 3)
@@ -1,13 +1,23 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from apps.flags.views import FeatureFlagViewSet, FlagStateViewSet, FlagRuleViewSet, sdk_evaluate
+from apps.flags.stream import sdk_stream
+from apps.flags.views import FeatureFlagViewSet, FlagStateViewSet, FlagRuleViewSet, SegmentViewSet, sdk_evaluate, sdk_evaluate_async, sdk_evaluate_batch, sdk_ruleset, flag_evaluations
+from apps.flags.views import project_export, project_import
 
 router = DefaultRouter()
 router.register(r"flags", FeatureFlagViewSet, basename="flag")
 router.register(r"flag-states", FlagStateViewSet, basename="flagstate")
 router.register(r"flag-rules", FlagRuleViewSet, basename="flagrule")
+router.register(r"segments", SegmentViewSet, basename="segment")
 
 urlpatterns = [
     path("", include(router.urls)),
     path("sdk/evaluate/", sdk_evaluate, name="sdk-evaluate"),
+    path("sdk/evaluate/async/", sdk_evaluate_async, name="sdk-evaluate-async"),
+    path("sdk/evaluate/batch/", sdk_evaluate_batch, name="sdk-evaluate-batch"),
+    path("sdk/stream/", sdk_stream, name="sdk-stream"),
+    path("sdk/ruleset/", sdk_ruleset, name="sdk-ruleset"),
+    path("flag-evaluations/", flag_evaluations, name="flag-evaluations"),
+    path("projects/<int:project_id>/export/", project_export, name="project-export"),
+    path("projects/<int:project_id>/import/", project_import, name="project-import"),
 ]
@@ -1,19 +1,47 @@
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import parse_etags
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 from rest_framework import status
 
-from apps.flags.models import FeatureFlag, FlagState, FlagRule
+from apps.core import metrics
+from apps.core.models import Environment, Project
+from apps.flags.models import FeatureFlag, FlagState, FlagRule, FlagEvaluationCount, Segment
 from apps.flags.serializers import (
     FeatureFlagSerializer,
     FlagStateSerializer,
     FlagRuleSerializer,
     FlagStateUpdateSerializer,
+    BulkFlagImportSerializer,
+    SegmentSerializer,
 )
-from apps.core.models import Environment
-from apps.core.permissions import HasMinRole
-from apps.flags.eval import stable_percent, rule_matches
+from apps.core.sdk_keys import aenvironment_for_key, environment_for_key, CLIENT, SERVER
+from apps.core.permissions import HasMinRole, has_role, member_org_ids
+from apps.flags.ruleset import (
+    aget_selected_ruleset,
+    get_ruleset,
+    get_selected_ruleset,
+    evaluate,
+    evaluate_profiled,
+    ruleset_payload,
+)
+from apps.flags.counters import counters, parse_value
+from apps.flags.bulk import import_flags
+from apps.flags.segments import SegmentError, apply_changes, is_member
+from apps.flags.snapshot import SnapshotError, export_project, import_project
+from apps.flags.signals import config_changed
 from apps.audit.services import audit
 
 
@@ -26,7 +54,7 @@ class FeatureFlagViewSet(viewsets.ModelViewSet):
         user = self.request.user
         qs = FeatureFlag.objects.select_related("project", "project__org")
         if not user.is_superuser:
-            qs = qs.filter(project__org__memberships__user=user).distinct()
+            qs = qs.filter(project__org_id__in=member_org_ids(self.request))
         project_id = self.request.query_params.get("project_id")
         if project_id:
             qs = qs.filter(project_id=project_id)
@@ -35,17 +63,48 @@ class FeatureFlagViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         obj = serializer.save()
         audit(self.request.user, obj.project.org, "flag.create", {"flag": obj.key, "project": obj.project.key})
-        for env in obj.project.environments.all():
-            FlagState.objects.get_or_create(
+        # a new flag has no states yet: one INSERT for all environments
+        env_ids = list(obj.project.environments.values_list("id", flat=True))
+        FlagState.objects.bulk_create(
+            FlagState(
                 flag=obj,
-                environment=env,
-                defaults={
-                    "enabled": False,
-                    "on_variation": {"value": True},
-                    "off_variation": {"value": False},
-                    "default_variation": {"value": False},
-                },
+                environment_id=env_id,
+                enabled=False,
+                on_variation={"value": True},
+                off_variation={"value": False},
+                default_variation={"value": False},
             )
+            for env_id in env_ids
+        )
+        config_changed(env_ids, "flagstate.updated", obj.key)
+
+    @action(detail=False, methods=["POST"])
+    def bulk(self, request):
+        """
+        POST /api/flags/bulk/ {"project": id, "flags": [...], "on_conflict": "error"|"skip"}
+
+        Create many flags, with per-environment states and rules, in one
+        transaction (apps.flags.bulk). Nothing is written unless every
+        definition is valid; errors come back per flag index.
+        """
+        project_id = request.data.get("project") if isinstance(request.data, dict) else None
+        _, denied = _project_for(request, project_id, self.min_role)
+        if denied is not None:
+            return denied
+
+        serializer = BulkFlagImportSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        flags = import_flags(data["project"], data["flags"], request.user, data["existing"])
+        return Response(
+            {
+                "project": data["project"].id,
+                "created": len(flags),
+                "skipped": sorted(data["existing"]),
+                "flags": FeatureFlagSerializer(flags, many=True).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
     # ✅ NEW: Audit on DELETE (Flag)
     def perform_destroy(self, instance):
@@ -63,6 +122,20 @@ class FeatureFlagViewSet(viewsets.ModelViewSet):
         instance.delete()
 
 
+def _project_for(request, project_id, min_role):
+    """(project, None) if the user holds min_role in its org, else (None, error response)."""
+    project = Project.objects.select_related("org").filter(pk=project_id).first() if str(project_id).isdigit() else None
+    if project is None:
+        return None, Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not has_role(request, project.org_id, "viewer"):
+        return None, Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not has_role(request, project.org_id, min_role):
+        return None, Response(
+            {"detail": "You do not have permission to perform this action."}, status=status.HTTP_403_FORBIDDEN
+        )
+    return project, None
+
+
 class FlagStateViewSet(viewsets.ModelViewSet):
     serializer_class = FlagStateSerializer
     permission_classes = [IsAuthenticated, HasMinRole]
@@ -74,7 +147,7 @@ class FlagStateViewSet(viewsets.ModelViewSet):
             "flag", "environment", "environment__project", "environment__project__org"
         ).prefetch_related("rules")
         if not user.is_superuser:
-            qs = qs.filter(environment__project__org__memberships__user=user).distinct()
+            qs = qs.filter(environment__project__org_id__in=member_org_ids(self.request))
 
         env_id = self.request.query_params.get("environment_id")
         if env_id:
@@ -160,7 +233,7 @@ class FlagRuleViewSet(viewsets.ModelViewSet):
             "state__flag",
         )
         if not user.is_superuser:
-            qs = qs.filter(state__environment__project__org__memberships__user=user).distinct()
+            qs = qs.filter(state__environment__project__org_id__in=member_org_ids(self.request))
         state_id = self.request.query_params.get("state_id")
         if state_id:
             qs = qs.filter(state_id=state_id)
@@ -216,66 +289,456 @@ class FlagRuleViewSet(viewsets.ModelViewSet):
         instance.delete()
 
 
+class SegmentViewSet(viewsets.ModelViewSet):
+    serializer_class = SegmentSerializer
+    permission_classes = [IsAuthenticated, HasMinRole]
+    min_role = "developer"
+
+    def get_queryset(self):
+        user = self.request.user
+        qs = Segment.objects.select_related("project", "project__org")
+        if not user.is_superuser:
+            qs = qs.filter(project__org_id__in=member_org_ids(self.request))
+        project_id = self.request.query_params.get("project_id")
+        if project_id:
+            qs = qs.filter(project_id=project_id)
+        return qs.order_by("key")
+
+    def _check_project(self, project):
+        if not has_role(self.request, project.org_id, self.min_role):
+            raise PermissionDenied()
+
+    def perform_create(self, serializer):
+        self._check_project(serializer.validated_data["project"])
+        obj = serializer.save()
+        audit(self.request.user, obj.project.org, "segment.create", {"segment": obj.key, "project": obj.project.key})
+
+    def perform_update(self, serializer):
+        self._check_project(serializer.instance.project)
+        self._check_project(serializer.validated_data.get("project", serializer.instance.project))
+        obj = serializer.save()
+        audit(self.request.user, obj.project.org, "segment.update", {"segment": obj.key, "project": obj.project.key})
+
+    def perform_destroy(self, instance):
+        self._check_project(instance.project)
+        audit(
+            self.request.user,
+            instance.project.org,
+            "segment.delete",
+            {"segment": instance.key, "project": instance.project.key, "size": instance.size},
+        )
+        instance.delete()
+
+    @action(detail=True, methods=["GET", "POST"])
+    def members(self, request, pk=None):
+        """
+        POST /api/segments/<id>/members/ {"add": [user keys], "remove": [user keys]}
+        GET  /api/segments/<id>/members/?key=<user key>
+
+        POST changes membership incrementally (apps.flags.segments): only the
+        hash buckets holding the given keys are rewritten. GET tells whether
+        one key is a member.
+        """
+        segment = self.get_object()
+        if request.method == "GET":
+            key = request.query_params.get("key")
+            if not key:
+                return Response({"detail": "Pass ?key=<user key>."}, status=status.HTTP_400_BAD_REQUEST)
+            return Response({"segment": segment.key, "key": key, "member": is_member(segment, key)})
+
+        self._check_project(segment.project)
+        data = request.data if isinstance(request.data, dict) else {}
+        add, remove = data.get("add", []), data.get("remove", [])
+        limit = settings.SEGMENT_UPLOAD_MAX_KEYS
+        if isinstance(add, list) and isinstance(remove, list) and len(add) + len(remove) > limit:
+            return Response(
+                {"detail": f"At most {limit} keys per upload; send larger changes in batches."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            result = apply_changes(segment, add, remove, actor=request.user)
+        except SegmentError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+
+def _client_environment(request):
+    """
+    Resolve the environment for the request's client key.
+    Returns (env, None) or (None, error_response).
+    """
+    client_key = request.headers.get("X-Client-Key") or request.query_params.get("client_key")
+    if not client_key:
+        return None, Response({"detail": "Missing X-Client-Key"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    env = environment_for_key(CLIENT, client_key)
+    if not env:
+        return None, Response({"detail": "Invalid client key"}, status=status.HTTP_401_UNAUTHORIZED)
+    return env, None
+
+
+def _parse_flag_selection(data):
+    """
+    Optional {"flags": [...keys], "prefix": "..."} restricting which flags are
+    evaluated. Returns (keys, prefix, error message).
+    """
+    keys = data.get("flags")
+    prefix = data.get("prefix") or None
+    if keys is not None and (not isinstance(keys, list) or not all(isinstance(k, str) for k in keys)):
+        return None, None, "flags must be a list of flag keys"
+    if prefix is not None and not isinstance(prefix, str):
+        return None, None, "prefix must be a string"
+    return keys, prefix, None
+
+
+def _flag_selection(data):
+    """_parse_flag_selection with the error as a 400 response."""
+    keys, prefix, message = _parse_flag_selection(data)
+    if message:
+        return None, None, Response({"detail": message}, status=status.HTTP_400_BAD_REQUEST)
+    return keys, prefix, None
+
+
+def _evaluate_input(data):
+    """
+    User context and flag selection of an evaluate request body, shared by
+    sdk_evaluate and sdk_evaluate_async. Returns (user, keys, prefix, error message).
+    """
+    user = data.get("user") or {}
+    if not isinstance(user, dict) or not str(user.get("key") or ""):
+        return None, None, None, "user.key is required"
+    keys, prefix, message = _parse_flag_selection(data)
+    return user, keys, prefix, message
+
+
+def _evaluate_etag(env, user, keys, prefix):
+    """
+    The evaluate response is fully determined by the environment's config
+    version, the user context and the flag selection, so the ETag is built
+    from exactly those without evaluating anything.
+    """
+    context = json.dumps([user, keys, prefix], sort_keys=True, separators=(",", ":"), default=str)
+    digest = hashlib.sha1(context.encode("utf-8")).hexdigest()[:20]
+    return f'"{env.id}-{env.config_version}-{digest}"'
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    tags = parse_etags(header)
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class _TimedResponse(Response):
+    """Response that reports its JSON rendering as the "serialization" stage."""
+
+    def __init__(self, *args, timer, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._timer = timer
+
+    @property
+    def rendered_content(self):
+        self._timer.restart()
+        content = super().rendered_content
+        self._timer.mark("serialization")
+        return content
+
+
+def _evaluate_payload(env, ruleset, user, timer):
+    if timer.sampled:
+        results, rules_tried, match_time, bucket_time = evaluate_profiled(ruleset, user)
+        timer.add("clause_match", match_time)
+        timer.add("bucketing", bucket_time)
+        metrics.RULES_EVALUATED.observe(rules_tried)
+    else:
+        results = evaluate(ruleset, user)
+    metrics.FLAGS_EVALUATED.observe(len(results))
+    counters.record(results)
+    return {"environment": env.key, "flags": results}
+
+
 @api_view(["POST"])
 @permission_classes([AllowAny])
 def sdk_evaluate(request):
-    client_key = request.headers.get("X-Client-Key") or request.query_params.get("client_key")
+    timer = metrics.evaluate_timer()
+    env, error = _client_environment(request)
+    timer.mark("key_lookup")
+    if error:
+        return error
+    metrics.SDK_REQUESTS.inc((str(env.id), "evaluate"))
+
+    user, keys, prefix, message = _evaluate_input(request.data or {})
+    if message:
+        return Response({"detail": message}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = _evaluate_etag(env, user, keys, prefix)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    timer.restart()
+    ruleset = get_selected_ruleset(env, keys, prefix)
+    timer.mark("db_load")
+    payload = _evaluate_payload(env, ruleset, user, timer)
+    if timer.sampled:
+        return _TimedResponse(payload, headers=headers, timer=timer)
+    return Response(payload, headers=headers)
+
+
+def _json(payload, code=200, headers=None):
+    """A JSON response rendered like DRF's JSONRenderer (compact, UTF-8)."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return HttpResponse(body, status=code, content_type="application/json", headers=headers)
+
+
+@csrf_exempt
+async def sdk_evaluate_async(request):
+    """
+    POST /api/sdk/evaluate/async/: sdk_evaluate as a native async view, for
+    the ASGI server. Same body, headers, ETag/304, metrics and counters, but
+    no DRF request cycle: the environment comes from the async ORM (or the
+    shared SDK cache, see apps.core.sdk_keys) and the current compiled
+    ruleset is an in-process cache read on the event loop. Bodies must be
+    JSON. The response bytes match sdk_evaluate's (compact JSON, UTF-8).
+    """
+    if request.method != "POST":
+        return _json({"detail": f'Method "{request.method}" not allowed.'}, code=405)
+    timer = metrics.evaluate_timer()
+    client_key = request.headers.get("X-Client-Key") or request.GET.get("client_key")
     if not client_key:
-        return Response({"detail": "Missing X-Client-Key"}, status=status.HTTP_401_UNAUTHORIZED)
-
-    env = Environment.objects.filter(client_sdk_key=client_key).select_related("project").first()
+        return _json({"detail": "Missing X-Client-Key"}, code=401)
+    env = await aenvironment_for_key(CLIENT, client_key)
+    timer.mark("key_lookup")
     if not env:
-        return Response({"detail": "Invalid client key"}, status=status.HTTP_401_UNAUTHORIZED)
+        return _json({"detail": "Invalid client key"}, code=401)
+    metrics.SDK_REQUESTS.inc((str(env.id), "evaluate"))
+
+    try:
+        data = (json.loads(request.body) if request.body else None) or {}
+    except ValueError as e:
+        return _json({"detail": f"JSON parse error - {e}"}, code=400)
+    if not isinstance(data, dict):
+        return _json({"detail": "Request body must be a JSON object"}, code=400)
+    user, keys, prefix, message = _evaluate_input(data)
+    if message:
+        return _json({"detail": message}, code=400)
+
+    etag = _evaluate_etag(env, user, keys, prefix)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return HttpResponse(status=304, headers=headers)
+
+    timer.restart()
+    ruleset = await aget_selected_ruleset(env, keys, prefix)
+    timer.mark("db_load")
+    payload = _evaluate_payload(env, ruleset, user, timer)
+    timer.restart()
+    response = _json(payload, headers=headers)
+    timer.mark("serialization")
+    return response
+
+
+def _batch_results(ruleset, users):
+    record = counters.record
+    for i, user in enumerate(users):
+        if not isinstance(user, dict) or not str(user.get("key") or ""):
+            yield {"index": i, "error": "user.key is required"}
+            continue
+        results = evaluate(ruleset, user)
+        record(results)
+        yield {"index": i, "key": str(user["key"]), "flags": results}
 
-    user = (request.data or {}).get("user") or {}
-    user_key = str(user.get("key") or "")
-    if not user_key:
-        return Response({"detail": "user.key is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    states = FlagState.objects.filter(environment=env).select_related("flag").prefetch_related("rules")
-    out = {}
+def _ndjson_lines(rows, chunk_size=256):
+    buf = []
+    for row in rows:
+        buf.append(json.dumps(row, separators=(",", ":")))
+        if len(buf) >= chunk_size:
+            yield "\n".join(buf) + "\n"
+            buf = []
+    if buf:
+        yield "\n".join(buf) + "\n"
 
-    for st in states:
-        flag_key = st.flag.key
 
-        if not st.enabled:
-            out[flag_key] = {
-                "value": st.off_variation.get("value"),
-                "reason": "off",
-                "variation": {"on": st.on_variation.get("value"), "off": st.off_variation.get("value")},
-            }
-            continue
+@api_view(["POST"])
+@permission_classes([AllowAny])
+def sdk_evaluate_batch(request):
+    """
+    Evaluate every flag for a list of users against one compiled ruleset.
+    Body: {"users": [{...}, ...], "stream": false}, plus the optional
+    "flags"/"prefix" selection accepted by sdk_evaluate. With "stream": true (or
+    ?stream=1) the response is NDJSON, one line per user, produced lazily.
+    """
+    env, error = _client_environment(request)
+    if error:
+        return error
+
+    data = request.data or {}
+    if not isinstance(data, dict):
+        return Response({"detail": "Body must be a JSON object"}, status=status.HTTP_400_BAD_REQUEST)
+    users = data.get("users")
+    if not isinstance(users, list):
+        return Response({"detail": "users must be a list"}, status=status.HTTP_400_BAD_REQUEST)
+    max_users = settings.SDK_BATCH_MAX_USERS
+    if len(users) > max_users:
+        return Response(
+            {"detail": f"At most {max_users} users per batch"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    keys, prefix, error = _flag_selection(data)
+    if error:
+        return error
+
+    metrics.SDK_REQUESTS.inc((str(env.id), "evaluate_batch"))
+    ruleset = get_selected_ruleset(env, keys, prefix)
+    stream = data.get("stream") is True or request.query_params.get("stream") in ("1", "true")
+    if stream:
+        return StreamingHttpResponse(
+            _ndjson_lines(_batch_results(ruleset, users)),
+            content_type="application/x-ndjson",
+        )
+    return Response({"environment": env.key, "results": list(_batch_results(ruleset, users))})
+
 
-        if st.rollout_percentage < 100:
-            pct = stable_percent(user_key, flag_key)
-            if pct >= st.rollout_percentage:
-                out[flag_key] = {
-                    "value": st.off_variation.get("value"),
-                    "reason": "rollout_excluded",
-                    "variation": {"on": st.on_variation.get("value"), "off": st.off_variation.get("value")},
-                }
-                continue
-
-        matched = False
-        for rule in st.rules.all().order_by("priority", "id"):
-            if rule_matches(user, rule.clauses):
-                if rule.rollout_percentage < 100:
-                    pct = stable_percent(user_key, f"{flag_key}:rule:{rule.id}")
-                    if pct >= rule.rollout_percentage:
-                        continue
-                out[flag_key] = {
-                    "value": rule.variation.get("value"),
-                    "reason": "rule_match",
-                    "variation": {"on": st.on_variation.get("value"), "off": st.off_variation.get("value")},
-                }
-                matched = True
-                break
-
-        if not matched:
-            out[flag_key] = {
-                "value": st.default_variation.get("value"),
-                "reason": "default",
-                "variation": {"on": st.on_variation.get("value"), "off": st.off_variation.get("value")},
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def sdk_ruleset(request):
+    """
+    Full compiled ruleset of the environment for server-side SDKs that
+    evaluate locally. Authenticated with the environment's server key;
+    supports If-None-Match so SDK refreshes are a cheap 304 when unchanged.
+    """
+    server_key = request.headers.get("X-Server-Key")
+    if not server_key:
+        return Response({"detail": "Missing X-Server-Key"}, status=status.HTTP_401_UNAUTHORIZED)
+    env = environment_for_key(SERVER, server_key)
+    if not env:
+        return Response({"detail": "Invalid server key"}, status=status.HTTP_401_UNAUTHORIZED)
+
+    metrics.SDK_REQUESTS.inc((str(env.id), "ruleset"))
+    etag = f'"{env.id}-{env.config_version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(ruleset_payload(get_ruleset(env)), headers=headers)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def flag_evaluations(request):
+    """
+    GET /api/flag-evaluations/?environment_id=&flag=&since=&until=
+
+    How often each flag served each value and why, from the evaluation
+    counters. Defaults to the last 24 hours; `series` is per time bucket,
+    `totals` sums the whole window.
+    """
+    params = request.query_params
+    env_id = params.get("environment_id")
+    if not env_id or not env_id.isdigit():
+        return Response({"detail": "environment_id is required"}, status=status.HTTP_400_BAD_REQUEST)
+    env = Environment.objects.select_related("project").filter(id=env_id).first()
+    if env is None or (not request.user.is_superuser and env.project.org_id not in member_org_ids(request)):
+        return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    window = {}
+    for name in ("since", "until"):
+        raw = params.get(name)
+        if raw:
+            try:
+                window[name] = parse_datetime(raw)
+            except ValueError:  # well formed but out of range, e.g. month 13
+                window[name] = None
+            if window[name] is None:
+                return Response({"detail": f"{name} must be an ISO 8601 datetime"}, status=status.HTTP_400_BAD_REQUEST)
+    until = window.get("until") or timezone.now()
+    since = window.get("since") or until - timedelta(hours=24)
+
+    qs = FlagEvaluationCount.objects.filter(environment=env, bucket_start__gte=since, bucket_start__lt=until)
+    if params.get("flag"):
+        qs = qs.filter(flag_key=params["flag"])
+    series = qs.order_by("bucket_start", "flag_key", "-count").values("bucket_start", "flag_key", "value", "reason", "count")
+    totals = (
+        qs.values("flag_key", "value", "reason")
+        .annotate(total=Sum("count"))
+        .order_by("flag_key", "-total")
+    )
+    return Response({
+        "environment": env.key,
+        "bucket_seconds": settings.EVAL_COUNTER_BUCKET_SECONDS,
+        "since": since,
+        "until": until,
+        "totals": [
+            {"flag": r["flag_key"], "value": parse_value(r["value"]), "reason": r["reason"], "count": r["total"]}
+            for r in totals
+        ],
+        "series": [
+            {
+                "bucket": r["bucket_start"],
+                "flag": r["flag_key"],
+                "value": parse_value(r["value"]),
+                "reason": r["reason"],
+                "count": r["count"],
             }
+            for r in series
+        ],
+    })
+
+
+def _buffered(lines, chunk_size=256):
+    buf = []
+    for line in lines:
+        buf.append(line)
+        if len(buf) >= chunk_size:
+            yield "".join(buf)
+            buf = []
+    if buf:
+        yield "".join(buf)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def project_export(request, project_id):
+    """
+    GET /api/projects/<id>/export/
+
+    The project's flags, per-environment states and rules as an NDJSON
+    snapshot (apps.flags.snapshot), streamed in constant memory.
+    """
+    project, denied = _project_for(request, project_id, "viewer")
+    if denied is not None:
+        return denied
+    response = StreamingHttpResponse(_buffered(export_project(project)), content_type="application/x-ndjson")
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%S")
+    response["Content-Disposition"] = f'attachment; filename="{project.org.slug}-{project.key}-{stamp}.ndjson"'
+    return response
 
-    return Response({"environment": env.key, "flags": out})
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def project_import(request, project_id):
+    """
+    POST /api/projects/<id>/import/?dry_run=1&prune=1  (body: NDJSON snapshot)
+
+    Apply a snapshot from project_export (of this or any other project):
+    only differences are written, in one transaction. `prune` deletes flags
+    the snapshot does not contain; `dry_run` reports the counts and rolls back.
+    """
+    project, denied = _project_for(request, project_id, "developer")
+    if denied is not None:
+        return denied
+    if request.stream is None:
+        return Response({"detail": "Request body must be an NDJSON snapshot."}, status=status.HTTP_400_BAD_REQUEST)
+    params = request.query_params
+    try:
+        changes = import_project(
+            project,
+            request.stream,  # read line by line, never as one body
+            request.user,
+            prune=params.get("prune") in ("1", "true"),
+            dry_run=params.get("dry_run") in ("1", "true"),
+        )
+    except SnapshotError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"project": project.id, "dry_run": params.get("dry_run") in ("1", "true"), "changes": changes})
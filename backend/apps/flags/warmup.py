@@ -0,0 +1,156 @@
+"""
+Process warm-up: do the work of the first requests before a worker serves.
+
+A fresh worker pays for its first DB connection, the URL resolver, and a
+ruleset compile plus SDK key lookup for every environment it is asked
+about. warm() does all of that up front for the busiest environments (most
+evaluations in FlagEvaluationCount over the last FLAG_WARMUP_WINDOW_HOURS)
+and returns a timing report.
+
+config.wsgi and config.asgi call FlagsConfig.prepare_worker() once the app
+is loaded, so warm-up finishes before the worker accepts connections.
+uvicorn loads the app from inside its running event loop, where the ORM
+refuses to run; there the warm-up runs on a thread, still before serving.
+When workers are forked after that (gunicorn --preload), the children
+inherit the compiled rulesets and cached keys. They must not share the
+master's DB connections, so gunicorn.conf.py's fork hooks close the
+master's connections before each worker fork (before_fork) and open the
+worker's own (after_fork). Only gunicorn's master runs them, not other forks
+the process makes.
+
+Connections opened here are reused by requests on the same thread, given
+persistent connections (CONN_MAX_AGE). That covers gunicorn sync workers.
+Under ASGI each request's sync code runs on its own thread, so there only
+the in-process caches carry over.
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Sum
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from apps.core.models import Environment
+from apps.core.sdk_keys import prime_environment
+from apps.flags.models import FlagEvaluationCount
+from apps.flags.ruleset import get_ruleset
+
+log = logging.getLogger(__name__)
+
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1e3
+
+
+def open_connections():
+    for conn in connections.all():
+        conn.ensure_connection()
+
+
+def busiest_environments(limit, hours):
+    """Ids of up to `limit` environments with the most evaluations in the last `hours`, busiest first."""
+    since = timezone.now() - timedelta(hours=hours)
+    rows = (
+        FlagEvaluationCount.objects.filter(bucket_start__gte=since)
+        .values("environment_id")
+        .annotate(total=Sum("count"))
+        .order_by("-total")[:limit]
+    )
+    return [row["environment_id"] for row in rows]
+
+
+def warm(limit=None, hours=None, environment_ids=None):
+    """
+    Open DB connections, load the URL resolver, and compile and cache the
+    rulesets and SDK keys of the busiest environments (or of
+    `environment_ids`). Returns {"connect_ms", "select_ms", "environments":
+    [{"id", "name", "flags", "ms"}], "total_ms"}.
+    """
+    limit = settings.FLAG_WARMUP_ENVIRONMENTS if limit is None else limit
+    hours = settings.FLAG_WARMUP_WINDOW_HOURS if hours is None else hours
+    started = time.perf_counter()
+
+    t = time.perf_counter()
+    open_connections()
+    get_resolver().resolve(reverse("sdk-evaluate"))
+    report = {"connect_ms": _ms(t)}
+
+    t = time.perf_counter()
+    if environment_ids is None:
+        environment_ids = busiest_environments(limit, hours)
+    envs = Environment.objects.select_related("project", "project__org").in_bulk(environment_ids)
+    report["select_ms"] = _ms(t)
+
+    report["environments"] = []
+    for env_id in environment_ids:
+        env = envs.get(env_id)
+        if env is None:
+            continue
+        t = time.perf_counter()
+        ruleset = get_ruleset(env)
+        prime_environment(env)
+        report["environments"].append({
+            "id": env.id,
+            "name": str(env),
+            "flags": len(ruleset.flags),
+            "ms": _ms(t),
+        })
+    report["total_ms"] = _ms(started)
+    return report
+
+
+def warm_on_start():
+    """
+    warm() for a server process about to serve, when FLAG_WARMUP_ON_START.
+    A failure (e.g. the database is not migrated yet) is logged and the
+    worker starts cold rather than not at all. Called from a running event
+    loop (uvicorn loads the app there), it warms up on a thread and waits
+    for it: nothing is served until the app is loaded anyway.
+    """
+    if not settings.FLAG_WARMUP_ON_START:
+        return
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        _warm_and_log()
+        return
+    thread = threading.Thread(target=_warm_on_thread, name="flag-warmup")
+    thread.start()
+    thread.join()
+
+
+def _warm_on_thread():
+    try:
+        _warm_and_log()
+    finally:
+        connections.close_all()
+
+
+def _warm_and_log():
+    try:
+        report = warm()
+    except Exception:
+        log.exception("flag warm-up failed; starting cold")
+        return
+    envs = report["environments"]
+    log.info(
+        "flag warm-up: %d environments, %d flags in %.1f ms (connect %.1f ms, select %.1f ms)",
+        len(envs), sum(e["flags"] for e in envs), report["total_ms"], report["connect_ms"], report["select_ms"],
+    )
+
+
+def before_fork():
+    # Sockets must not be shared with the children.
+    connections.close_all()
+
+
+def after_fork():
+    try:
+        open_connections()
+    except Exception:
+        log.exception("flag warm-up: could not open database connections after fork")
@@ -0,0 +1,53 @@
+"""
+stable_percent vs apps.flags.bucketing (scalar, list and NumPy batch).
+
+    python -m benchmarks.bucketing [--users 100000]
+"""
+import argparse
+import time
+
+from apps.flags.bucketing import salt, bucket, bucket_list, bucket_array
+from apps.flags.eval import stable_percent
+
+
+def timed(fn):
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--flag", default="new_checkout")
+    args = parser.parse_args()
+
+    keys = [f"user_{i}" for i in range(args.users)]
+    flag_salt = salt(args.flag)
+
+    base, expected = timed(lambda: [stable_percent(k, args.flag) for k in keys])
+    rows = [("stable_percent", base)]
+    t, got = timed(lambda: [bucket(k, flag_salt) for k in keys])
+    assert got == expected
+    rows.append(("bucket", t))
+    t, got = timed(lambda: bucket_list(keys, flag_salt))
+    assert got == expected
+    rows.append(("bucket_list", t))
+    try:
+        t, got = timed(lambda: bucket_array(keys, flag_salt))
+        assert got.tolist() == expected
+        rows.append(("bucket_array (numpy)", t))
+    except RuntimeError as e:
+        print(f"skipping bucket_array: {e}")
+
+    print(f"{args.users} users, buckets identical across all paths")
+    print(f"{'path':<24}{'ns/user':>10}{'speedup':>10}")
+    for name, t in rows:
+        print(f"{name:<24}{t / args.users * 1e9:>10.0f}{base / t:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Interpreted (clause_match/rule_matches) vs compiled (compile_rule) clause
+matching.
+
+    python -m benchmarks.clauses [--values 5000] [--number 20000]
+"""
+import argparse
+import timeit
+
+from apps.flags.eval import rule_matches, compile_rule
+
+
+def cases(n_values):
+    ids = [f"acct_{i}" for i in range(n_values)]
+    user = {"key": "u_1", "account": f"acct_{n_values - 1}", "email": "Someone@Example.COM", "country": "US"}
+    return [
+        ("equals", [{"attr": "country", "op": "equals", "values": ["US"]}], user),
+        (f"in ({n_values} values, last hit)", [{"attr": "account", "op": "in", "values": ids}], user),
+        (f"in ({n_values} values, miss)", [{"attr": "account", "op": "in", "values": ids}], {**user, "account": "nope"}),
+        ("contains (5 needles)", [{"attr": "email", "op": "contains", "values": ["foo", "bar", "baz", "qux", "example.com"]}], user),
+        ("3 clauses", [
+            {"attr": "country", "op": "in", "values": ["US", "CA", "GB"]},
+            {"attr": "email", "op": "contains", "values": ["@example.com"]},
+            {"attr": "account", "op": "in", "values": ids},
+        ], user),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--values", type=int, default=5000, help="size of the in-list")
+    parser.add_argument("--number", type=int, default=20000, help="evaluations per measurement")
+    args = parser.parse_args()
+
+    print(f"{'case':<34}{'interpreted':>14}{'compiled':>14}{'speedup':>10}")
+    for name, clauses, user in cases(args.values):
+        matcher = compile_rule(clauses)
+        assert matcher(user) == rule_matches(user, clauses)
+        interp = min(timeit.repeat(lambda: rule_matches(user, clauses), number=args.number, repeat=3))
+        comp = min(timeit.repeat(lambda: matcher(user), number=args.number, repeat=3))
+        per = 1e9 / args.number
+        print(f"{name:<34}{interp * per:>11.0f} ns{comp * per:>11.0f} ns{interp / comp:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Cost of evaluation counting on the evaluate path: counters.record() per
+evaluated user, next to the ruleset.evaluate() call it follows, on an
+in-memory ruleset (no database).
+
+    python -m benchmarks.counters [--flags 10 100 500] [--number 5000] [--threads 4]
+
+Nothing is flushed while measuring; the counts stay in memory.
+"""
+import argparse
+import os
+import threading
+import time
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+django.setup()
+
+from apps.flags.bucketing import salt, rule_salt  # noqa: E402
+from apps.flags.counters import EvaluationCounters  # noqa: E402
+from apps.flags.eval import compile_rule  # noqa: E402
+from apps.flags.ruleset import CompiledFlag, CompiledRule, Ruleset, _result, evaluate  # noqa: E402
+
+
+def make_ruleset(n_flags):
+    flags = []
+    for i in range(n_flags):
+        key = f"flag_{i}"
+        variation = {"on": True, "off": False}
+        clauses = [{"attr": "country", "op": "in", "values": ["US", "CA"]}]
+        rules = (CompiledRule(
+            id=i, clauses=clauses, matches=compile_rule(clauses), rollout_percentage=50,
+            salt=rule_salt(key, i), result=_result(1, key, True, "rule_match", variation),
+        ),)
+        flags.append(CompiledFlag(
+            key=key, enabled=i % 4 != 0, rollout_percentage=80 if i % 3 else 100, salt=salt(key), rules=rules,
+            off_result=_result(1, key, False, "off", variation),
+            excluded_result=_result(1, key, False, "rollout_excluded", variation),
+            default_result=_result(1, key, False, "default", variation),
+        ))
+    return Ruleset(1, "production", 1, tuple(flags))
+
+
+def threaded(fn, items, n_threads):
+    def work():
+        for item in items:
+            fn(item)
+
+    threads = [threading.Thread(target=work) for _ in range(n_threads)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flags", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--number", type=int, default=5000, help="evaluations per measurement")
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    counters = EvaluationCounters()
+    counters._ensure_started = lambda: None  # measure recording only
+    users = [{"key": f"user_{i}", "country": "US" if i % 2 else "DE"} for i in range(args.number)]
+
+    print(
+        f"{'flags':>6}{'evaluate':>13}{'record':>12}{'overhead':>10}"
+        f"{'record x1 thread':>19}{f'x{args.threads} threads':>14}"
+    )
+    for n in args.flags:
+        ruleset = make_ruleset(n)
+        results = [evaluate(ruleset, u) for u in users]
+
+        def run_evaluate():
+            for u in users:
+                evaluate(ruleset, u)
+
+        def run_record():
+            for r in results:
+                counters.record(r)
+
+        t_eval = min(timeit.repeat(run_evaluate, number=1, repeat=5)) / len(users)
+        t_record = min(timeit.repeat(run_record, number=1, repeat=5)) / len(users)
+        # Per-thread Counters: recording from N threads takes no lock, so the
+        # total time should scale with the work (GIL-bound), not contention.
+        t_one = threaded(counters.record, results, 1)
+        t_many = threaded(counters.record, results, args.threads)
+        print(
+            f"{n:>6}{t_eval * 1e6:>10.1f} us{t_record * 1e6:>9.2f} us{t_record / t_eval:>10.1%}"
+            f"{t_one * 1e3:>16.1f} ms{t_many * 1e3 / args.threads:>8.1f} ms/th"
+        )
+    print(f"\n{counters.pending():,} evaluations counted in memory, 0 database writes")
+
+
+if __name__ == "__main__":
+    main()
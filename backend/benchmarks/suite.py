@@ -0,0 +1,411 @@
+"""
+Evaluation engine benchmark suite.
+
+Builds a synthetic environment (flags, rules, clause operators, in-list and
+segment sizes and rollout mix are all configurable) in a throwaway test
+database and times:
+
+    stable_percent              one rollout bucket
+    clause_match[<op>]          interpreted clause, per operator
+    compile_clause[<op>]        compiled clause, per operator
+    rule_matches                interpreted rule (all clauses)
+    compile_rule                compiled rule (what the ruleset uses)
+    evaluate                    ruleset.evaluate() for all flags, in memory
+    sdk_evaluate                POST /api/sdk/evaluate/, ruleset cached
+    sdk_evaluate_cold           same with the ruleset cache cleared each call
+
+Each result reports ops/sec, p50/p99 per op and allocations (tracemalloc:
+peak bytes during one op, and bytes still held per op afterwards).
+
+    python -m benchmarks.suite                                  # run, print table
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json [--threshold 0.1]
+
+--compare exits with status 1 when any benchmark's median (p50) time per op
+grew by more than --threshold against the baseline; the median is far less
+sensitive to scheduler noise than mean ops/sec. Compare on the same machine
+and with the same options; the baseline records both.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from itertools import cycle, islice
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+BLOCK_SECONDS = 0.0002  # a timing block is at least this long
+MIN_BLOCKS = 20
+ALLOC_SAMPLES = 200
+
+PLANS = ["free", "starter", "pro", "enterprise"]
+COUNTRIES = ["US", "CA", "GB", "DE", "FR", "IN", "BR", "JP"]
+DOMAINS = ["example.com", "acme.io", "corp.net", "mail.org"]
+SEGMENT_KEY = "segment_0"
+
+
+# --- synthetic environment ---------------------------------------------------
+
+def clause_factories(in_size, rng):
+    return {
+        "equals": lambda: {"attr": "plan", "op": "equals", "values": [rng.choice(PLANS)]},
+        "in": lambda: {
+            "attr": "account", "op": "in",
+            "values": [f"acct_{rng.randrange(in_size * 4)}" for _ in range(in_size)],
+        },
+        "contains": lambda: {"attr": "email", "op": "contains", "values": [rng.choice(DOMAINS)]},
+        "in_segment": lambda: {"attr": "key", "op": "in_segment", "values": [SEGMENT_KEY]},
+        "starts_with": lambda: {"attr": "email", "op": "starts_with", "values": [f"user{rng.randrange(10)}"]},
+        "ends_with": lambda: {"attr": "email", "op": "ends_with", "values": [rng.choice(DOMAINS)]},
+        "matches": lambda: {"attr": "email", "op": "matches", "values": [rf"^user[0-9]*{rng.randrange(10)}@"]},
+        **{
+            op: (lambda op=op: {"attr": "sessions", "op": op, "values": [rng.randrange(100)]})
+            for op in ("lt", "lte", "gt", "gte")
+        },
+        **{
+            op: (lambda op=op: {"attr": "app_version", "op": op, "values": [f"{rng.randrange(1, 4)}.{rng.randrange(10)}.0"]})
+            for op in ("semver_eq", "semver_lt", "semver_lte", "semver_gt", "semver_gte")
+        },
+        **{
+            op: (lambda op=op: {"attr": "signed_up", "op": op, "values": [f"2025-{rng.randrange(1, 13):02d}-01"]})
+            for op in ("date_before", "date_after")
+        },
+    }
+
+
+def synthetic_segments(size):
+    """{segment key: members}: every other user key, so about half of the synthetic users are in it."""
+    return {SEGMENT_KEY: [f"user_{i}" for i in range(0, 2 * size, 2)]}
+
+
+def parse_mix(spec):
+    """"100:60,50:30,0:10" -> ([100, 50, 0], [60, 30, 10])"""
+    pcts, weights = [], []
+    for part in spec.split(","):
+        pct, _, weight = part.partition(":")
+        pcts.append(int(pct))
+        weights.append(float(weight or 1))
+    return pcts, weights
+
+
+def synthetic_flags(args, rng):
+    """Flag definitions in the /api/sdk/ruleset/ payload shape."""
+    factories = clause_factories(args.in_size, rng)
+    pcts, weights = parse_mix(args.rollout_mix)
+    flags = []
+    for i in range(args.flags):
+        rules = []
+        for r in range(args.rules):
+            ops = [args.ops[(r + c) % len(args.ops)] for c in range(args.clauses)]
+            rules.append({
+                "clauses": [factories[op]() for op in ops],
+                "rollout_percentage": rng.choices(pcts, weights)[0],
+                "value": f"variant_{r}",
+            })
+        flags.append({
+            "key": f"flag_{i}",
+            "enabled": rng.random() >= args.disabled,
+            "rollout_percentage": rng.choices(pcts, weights)[0],
+            "on_value": True,
+            "off_value": False,
+            "default_value": False,
+            "rules": rules,
+        })
+    return flags
+
+
+def synthetic_users(n, in_size, rng):
+    return [
+        {
+            "key": f"user_{i}",
+            "plan": rng.choice(PLANS),
+            "country": rng.choice(COUNTRIES),
+            "email": f"user{i}@{rng.choice(DOMAINS)}",
+            "account": f"acct_{rng.randrange(in_size * 4)}",
+            # derived from i, so that the draws above (and older baselines) stay the same
+            "sessions": i % 100,
+            "app_version": f"{i % 3 + 1}.{i % 10}.{i % 4}",
+            "signed_up": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T12:00:00Z",
+        }
+        for i in range(n)
+    ]
+
+
+def seed_project(project, flags, env_keys=("production",), segments=None):
+    """Create `flags` (and `segments`) in `project` with the same state and rules in each environment."""
+    from apps.core.models import Environment
+    from apps.flags.models import FeatureFlag, FlagRule, FlagState, Segment
+    from apps.flags.segments import apply_changes
+
+    envs = [Environment.objects.create(project=project, name=key.title(), key=key) for key in env_keys]
+    db_flags = FeatureFlag.objects.bulk_create(
+        FeatureFlag(project=project, key=f["key"], name=f["key"]) for f in flags
+    )
+    pairs = [(env, db_flag, f) for env in envs for db_flag, f in zip(db_flags, flags)]
+    states = FlagState.objects.bulk_create(
+        FlagState(
+            flag=db_flag,
+            environment=env,
+            enabled=f["enabled"],
+            rollout_percentage=f["rollout_percentage"],
+            on_variation={"value": f["on_value"]},
+            off_variation={"value": f["off_value"]},
+            default_variation={"value": f["default_value"]},
+        )
+        for env, db_flag, f in pairs
+    )
+    FlagRule.objects.bulk_create(
+        FlagRule(
+            state=state,
+            priority=p,
+            clauses=r["clauses"],
+            variation={"value": r["value"]},
+            rollout_percentage=r["rollout_percentage"],
+        )
+        for state, (_, _, f) in zip(states, pairs)
+        for p, r in enumerate(f["rules"])
+    )
+    for key, members in (segments or {}).items():
+        apply_changes(Segment.objects.create(project=project, key=key, name=key), add=members)
+    for env in envs:
+        env.refresh_from_db()
+    return envs
+
+
+def seed_environment(flags, segments=None):
+    from apps.core.models import Organization, Project
+
+    org = Organization.objects.create(name="Benchmark")
+    project = Project.objects.create(org=org, name="Benchmark", key="benchmark")
+    return seed_project(project, flags, segments=segments)[0]
+
+
+# --- measurement -------------------------------------------------------------
+
+def _block(fn, args, inner):
+    it = islice(args, inner)
+    t0 = time.perf_counter()
+    for a in it:
+        fn(a)
+    return time.perf_counter() - t0
+
+
+def measure(fn, args, min_time):
+    """
+    Per-op timings from blocks of `inner` calls (so that timer overhead is
+    negligible even for ~100 ns ops). Returns ops/sec, p50 and p99 in ns.
+    """
+    args = cycle(args)
+    inner = 1
+    while inner < 1 << 20 and _block(fn, args, inner) < BLOCK_SECONDS:
+        inner *= 2
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < MIN_BLOCKS or time.perf_counter() < deadline:
+        samples.append(_block(fn, args, inner) / inner)
+    samples.sort()
+    return {
+        "ops_per_sec": 1 / statistics.fmean(samples),
+        "p50_ns": samples[len(samples) // 2] * 1e9,
+        "p99_ns": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e9,
+    }
+
+
+def allocations(fn, args):
+    """Median peak bytes allocated during one op, and bytes retained per op."""
+    args = list(islice(cycle(args), ALLOC_SAMPLES))
+    fn(args[0])
+    tracemalloc.start()
+    try:
+        peaks = []
+        start = tracemalloc.get_traced_memory()[0]
+        for a in args:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            fn(a)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+    return {"alloc_peak_bytes": statistics.median(peaks), "retained_bytes_per_op": max(retained, 0) / len(args)}
+
+
+def benchmarks(args, flags, users, env):
+    from django.test import Client
+
+    from apps.flags.eval import clause_match, compile_clause, compile_rule, rule_matches, stable_percent
+    from apps.flags.ruleset import clear_rulesets, evaluate, get_ruleset
+
+    first_rule = next((r for f in flags for r in f["rules"]), None)
+    ruleset = get_ruleset(env)
+    segments = ruleset.segments
+    client = Client()
+    bodies = [json.dumps({"user": u}) for u in users]
+
+    def sdk_evaluate(body):
+        response = client.post(
+            "/api/sdk/evaluate/", body, content_type="application/json", HTTP_X_CLIENT_KEY=env.client_sdk_key
+        )
+        assert response.status_code == 200, response.status_code
+
+    def sdk_evaluate_cold(body):
+        clear_rulesets()
+        sdk_evaluate(body)
+
+    yield "stable_percent", (lambda k: stable_percent(k, "flag_0")), [u["key"] for u in users]
+    if first_rule is not None:
+        seen = set()
+        for clause in (c for f in flags for r in f["rules"] for c in r["clauses"]):
+            if clause["op"] not in seen:
+                seen.add(clause["op"])
+                yield f"clause_match[{clause['op']}]", (lambda u, c=clause: clause_match(u, c, segments)), users
+                yield f"compile_clause[{clause['op']}]", compile_clause(clause, segments), users
+        clauses = first_rule["clauses"]
+        compiled = compile_rule(clauses, segments)
+        yield "rule_matches", (lambda u: rule_matches(u, clauses, segments)), users
+        yield "compile_rule", compiled, users
+    yield "evaluate", (lambda u: evaluate(ruleset, u)), users
+    yield "sdk_evaluate", sdk_evaluate, bodies
+    yield "sdk_evaluate_cold", sdk_evaluate_cold, bodies
+
+
+# --- reporting ---------------------------------------------------------------
+
+def _fmt_ns(ns):
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def load_baseline(path, config):
+    """Results of a --save-baseline/--json report; warns if it was run with other options."""
+    with open(path) as f:
+        report = json.load(f)
+    if report["meta"].get("config") != config:
+        print("warning: baseline was recorded with different options:", report["meta"].get("config"))
+    return report["results"]
+
+
+def print_table(results, baseline=None, threshold=0.1):
+    regressions = []
+    header = f"{'benchmark':<30}{'ops/sec':>14}{'p50':>12}{'p99':>12}{'peak alloc':>12}{'retained/op':>13}"
+    if baseline:
+        header += f"{'p50 vs base':>14}"
+    print(header)
+    for name, r in results.items():
+        line = (
+            f"{name:<30}{r['ops_per_sec']:>14,.0f}{_fmt_ns(r['p50_ns']):>12}{_fmt_ns(r['p99_ns']):>12}"
+            f"{r['alloc_peak_bytes']:>10,.0f} B{r['retained_bytes_per_op']:>11,.0f} B"
+        )
+        if baseline:
+            base = baseline.get(name)
+            if base is None:
+                line += f"{'new':>14}"
+            else:
+                change = r["p50_ns"] / base["p50_ns"] - 1
+                mark = ""
+                if change > threshold:
+                    mark = "  REGRESSION"
+                    regressions.append(name)
+                elif change < -threshold:
+                    mark = "  faster"
+                line += f"{change:>+13.1%}{mark}"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flags", type=int, default=50, help="flags in the environment")
+    parser.add_argument("--rules", type=int, default=3, help="rules per flag")
+    parser.add_argument("--clauses", type=int, default=2, help="clauses per rule")
+    parser.add_argument("--ops", default="equals,in,contains", help="clause operators, cycled across clauses")
+    parser.add_argument("--in-size", type=int, default=100, help="values per `in` clause")
+    parser.add_argument("--segment-size", type=int, default=10000, help="members of the `in_segment` segment")
+    parser.add_argument("--rollout-mix", default="100:60,50:30,10:10", help="percentage:weight,... for flags and rules")
+    parser.add_argument("--disabled", type=float, default=0.1, help="fraction of flags turned off")
+    parser.add_argument("--users", type=int, default=1000, help="distinct synthetic users")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds per benchmark")
+    parser.add_argument("--only", help="comma-separated benchmark names (prefix match)")
+    parser.add_argument("--json", dest="json_out", help="write results here")
+    parser.add_argument("--save-baseline", help="write results as the baseline file")
+    parser.add_argument("--compare", help="baseline file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+    args.ops = [op.strip() for op in args.ops.split(",") if op.strip()]
+
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    from apps.flags.eval import OPERATORS
+
+    unknown = [op for op in args.ops if op not in OPERATORS]
+    if unknown:
+        parser.error(f"unknown operators {unknown}; available: {', '.join(OPERATORS)}")
+    settings.EVAL_COUNTER_FLUSH_INTERVAL = 0  # no background writes into the throwaway DB
+
+    config = {
+        k: v for k, v in vars(args).items() if k not in ("json_out", "save_baseline", "compare", "threshold", "only")
+    }
+    segments = None
+    if "in_segment" in args.ops:
+        segments = synthetic_segments(args.segment_size)
+    else:
+        del config["segment_size"]  # no segments: comparable with baselines from before the option
+    rng = random.Random(args.seed)
+    flags = synthetic_flags(args, rng)
+    users = synthetic_users(args.users, args.in_size, rng)
+    only = [p for p in (args.only or "").split(",") if p]
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        env = seed_environment(flags, segments)
+        results = {}
+        for name, fn, fn_args in benchmarks(args, flags, users, env):
+            if only and not any(name.startswith(p) for p in only):
+                continue
+            results[name] = {**measure(fn, fn_args, args.min_time), **allocations(fn, fn_args)}
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": f"{platform.system()} {platform.machine()}",
+            "config": config,
+        },
+        "results": results,
+    }
+
+    baseline = load_baseline(args.compare, config) if args.compare else None
+    flag_desc = f"{args.flags} flags x {args.rules} rules x {args.clauses} clauses ({', '.join(args.ops)})"
+    print(f"{flag_desc}, in-lists of {args.in_size}, rollout mix {args.rollout_mix}\n")
+    regressions = print_table(results, baseline, args.threshold)
+
+    for path in filter(None, (args.json_out, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"\nwrote {path}")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
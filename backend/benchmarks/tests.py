@@ -0,0 +1,80 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from django.test import SimpleTestCase
+
+from benchmarks.suite import load_baseline, print_table
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def result(p50_ns):
+    return {
+        "ops_per_sec": 1e9 / p50_ns,
+        "p50_ns": p50_ns,
+        "p99_ns": p50_ns * 2,
+        "alloc_peak_bytes": 64.0,
+        "retained_bytes_per_op": 8.0,
+    }
+
+
+class CompareTests(SimpleTestCase):
+    config = {"flags": 50, "rules": 3}
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "baseline.json")
+        report = {
+            "meta": {"created": "2026-01-01T00:00:00+00:00", "python": "3.11.7", "machine": "Linux x86_64",
+                     "config": self.config},
+            "results": {"evaluate": result(1000), "rule_matches": result(1000), "stable_percent": result(1000)},
+        }
+        with open(self.path, "w") as f:
+            json.dump(report, f)
+
+    def compare(self, results, config=None, threshold=0.1):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            baseline = load_baseline(self.path, config or self.config)
+            regressions = print_table(results, baseline, threshold)
+        return regressions, out.getvalue()
+
+    def test_regression_over_threshold(self):
+        results = {
+            "evaluate": result(1150),        # +15%
+            "rule_matches": result(1050),    # +5%, noise
+            "stable_percent": result(800),   # -20%
+            "compile_rule": result(500),     # not in the baseline
+        }
+        regressions, out = self.compare(results)
+        self.assertEqual(regressions, ["evaluate"])
+        lines = {line.split()[0]: line for line in out.splitlines()[1:]}
+        self.assertIn("+15.0%  REGRESSION", lines["evaluate"])
+        self.assertNotIn("REGRESSION", lines["rule_matches"])
+        self.assertIn("-20.0%  faster", lines["stable_percent"])
+        self.assertTrue(lines["compile_rule"].endswith("new"))
+        self.assertNotIn("warning", out)
+
+        regressions, _ = self.compare(results, threshold=0.2)
+        self.assertEqual(regressions, [])
+
+    def test_different_options_warn(self):
+        regressions, out = self.compare({"evaluate": result(1000)}, config={"flags": 10, "rules": 3})
+        self.assertEqual(regressions, [])
+        self.assertIn("warning: baseline was recorded with different options", out)
+
+    def test_committed_baseline(self):
+        with open(BASELINE) as f:
+            report = json.load(f)
+        self.assertEqual(set(report["meta"]), {"created", "python", "machine", "config"})
+        self.assertIn("evaluate", report["results"])
+        for name, r in report["results"].items():
+            with self.subTest(benchmark=name):
+                self.assertEqual(set(r), set(result(1)))
+        with redirect_stdout(io.StringIO()):
+            baseline = load_baseline(BASELINE, report["meta"]["config"])
+            self.assertEqual(print_table(baseline, baseline), [])
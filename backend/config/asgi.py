@@ -1,5 +1,9 @@
 import os
+from django.apps import apps
 from django.core.asgi import get_asgi_application
 
+# Serve with an ASGI server (e.g. `uvicorn config.asgi:application`) so the
+# async SDK change stream (/api/sdk/stream/) holds no worker thread per client.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 application = get_asgi_application()
+apps.get_app_config("flags").prepare_worker()
@@ -54,6 +54,16 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Prometheus metrics at GET /metrics (apps.core.metrics), served only with
+# "Authorization: Bearer <METRICS_TOKEN>" (404 when METRICS_TOKEN is unset,
+# unless DEBUG). METRICS_ENABLED=0 removes all instrumentation. Per-stage
+# sdk_evaluate timings are sampled.
+METRICS_ENABLED = env("METRICS_ENABLED", "1") == "1"
+METRICS_TOKEN = env("METRICS_TOKEN")
+METRICS_EVALUATE_SAMPLE_RATE = float(env("METRICS_EVALUATE_SAMPLE_RATE", "0.1"))
+if METRICS_ENABLED:
+    MIDDLEWARE.insert(0, "apps.core.middleware.MetricsMiddleware")
+
 ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
@@ -82,6 +92,39 @@ DATABASES = {
 
 AUTH_USER_MODEL = "accounts.User"
 
+# "sdk" holds the SDK key -> environment cache (apps.core.sdk_keys). Known
+# keys are only cached in a shared cache: set SDK_CACHE_URL=redis://... when
+# running several workers. The per-process default caches unknown keys and
+# reads known ones from the database (one query per SDK request).
+SDK_KEY_CACHE_ALIAS = "sdk"
+SDK_KEY_CACHE_TTL = int(env("SDK_KEY_CACHE_TTL", "5"))  # seconds
+SDK_KEY_NEGATIVE_TTL = int(env("SDK_KEY_NEGATIVE_TTL", "60"))  # seconds, unknown keys
+SDK_KEY_CACHE_MAX_ENTRIES = int(env("SDK_KEY_CACHE_MAX_ENTRIES", "10000"))
+
+# Per-user {org_id: role} map used by HasMinRole and tenant-scoped querysets.
+# Only cached across requests when ROLE_CACHE_ALIAS is a shared cache (CACHE_URL).
+ROLE_CACHE_ALIAS = "default"
+ROLE_CACHE_TTL = int(env("ROLE_CACHE_TTL", "30"))  # seconds
+
+CACHES = {
+    # Set CACHE_URL=redis://... with several workers so role maps can be
+    # cached: membership changes then invalidate them in every worker.
+    "default": (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": env("CACHE_URL")}
+        if env("CACHE_URL")
+        else {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    ),
+    SDK_KEY_CACHE_ALIAS: (
+        {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": env("SDK_CACHE_URL")}
+        if env("SDK_CACHE_URL")
+        else {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "sdk",
+            "OPTIONS": {"MAX_ENTRIES": SDK_KEY_CACHE_MAX_ENTRIES},
+        }
+    ),
+}
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -91,6 +134,49 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Upper bound on users accepted by POST /api/sdk/evaluate/batch/
+SDK_BATCH_MAX_USERS = int(env("SDK_BATCH_MAX_USERS", "50000"))
+
+# Upper bound on flag definitions per POST /api/flags/bulk/ (manage.py import_flags is not limited)
+FLAG_BULK_MAX_FLAGS = int(env("FLAG_BULK_MAX_FLAGS", "5000"))
+
+# Upper bound on keys added plus removed per POST /api/segments/<id>/members/
+# (manage.py segment_members is not limited)
+SEGMENT_UPLOAD_MAX_KEYS = int(env("SEGMENT_UPLOAD_MAX_KEYS", "100000"))
+
+# Worker warm-up (apps.flags.warmup, manage.py warm_flags): before serving,
+# open DB connections and compile the rulesets of the FLAG_WARMUP_ENVIRONMENTS
+# environments with the most evaluations in the last FLAG_WARMUP_WINDOW_HOURS.
+FLAG_WARMUP_ON_START = env("FLAG_WARMUP_ON_START", "1") == "1"
+FLAG_WARMUP_ENVIRONMENTS = int(env("FLAG_WARMUP_ENVIRONMENTS", "50"))
+FLAG_WARMUP_WINDOW_HOURS = int(env("FLAG_WARMUP_WINDOW_HOURS", "24"))
+
+# SDK change stream (GET /api/sdk/stream/, ASGI only)
+SDK_STREAM_POLL_INTERVAL = float(env("SDK_STREAM_POLL_INTERVAL", "1.0"))  # seconds
+SDK_STREAM_HEARTBEAT = float(env("SDK_STREAM_HEARTBEAT", "15"))  # seconds
+SDK_STREAM_RETRY_MS = int(env("SDK_STREAM_RETRY_MS", "3000"))
+SDK_STREAM_QUEUE_SIZE = int(env("SDK_STREAM_QUEUE_SIZE", "1000"))
+SDK_STREAM_EVENT_RETENTION_HOURS = int(env("SDK_STREAM_EVENT_RETENTION_HOURS", "24"))
+
+# Evaluation counters (apps.flags.counters): per-worker in-memory counts,
+# added to FlagEvaluationCount every flush interval in buckets of this size.
+EVAL_COUNTERS_ENABLED = env("EVAL_COUNTERS_ENABLED", "1") == "1"
+EVAL_COUNTER_BUCKET_SECONDS = int(env("EVAL_COUNTER_BUCKET_SECONDS", "3600"))
+EVAL_COUNTER_FLUSH_INTERVAL = float(env("EVAL_COUNTER_FLUSH_INTERVAL", "10"))  # seconds; 0 = manual
+
+# Audit log writer (apps.audit.writer). "async" queues entries and bulk-inserts
+# them from a background thread; "sync" writes inline.
+AUDIT_WRITER_MODE = env("AUDIT_WRITER_MODE", "async")
+AUDIT_BATCH_SIZE = int(env("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(env("AUDIT_FLUSH_INTERVAL", "1.0"))  # seconds
+AUDIT_QUEUE_SIZE = int(env("AUDIT_QUEUE_SIZE", "100000"))
+AUDIT_SPILL_PATH = env("AUDIT_SPILL_PATH", str(BASE_DIR / "audit-spill.ndjson"))
+
+# Audit retention (python manage.py prune_audit_logs). Organizations without
+# their own audit_retention_days use this; 0 keeps everything.
+AUDIT_RETENTION_DAYS = int(env("AUDIT_RETENTION_DAYS", "365"))
+AUDIT_ARCHIVE_DIR = env("AUDIT_ARCHIVE_DIR", str(BASE_DIR / "audit-archive"))
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -132,8 +218,14 @@ CSRF_TRUSTED_ORIGINS = [
 # ✅ Needed because your SDK uses X-Client-Key and UI uses Authorization
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "x-client-key",
+    "x-server-key",
+    "last-event-id",
+    "if-none-match",
 ]
 
+# Let browser SDKs read the evaluate ETag for conditional polling
+CORS_EXPOSE_HEADERS = ["etag"]
+
 # Render behind proxy (helps Django understand HTTPS)
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 
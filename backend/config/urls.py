@@ -1,17 +1,35 @@
+import hmac
+
+from django.conf import settings
 from django.contrib import admin
+from django.http import Http404, HttpResponse
 from django.urls import path, include
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 
+from apps.core import metrics
+
 @api_view(["GET"])
 @permission_classes([AllowAny])
 def health(_request):
     return Response({"status": "ok"})
 
+def metrics_view(request):
+    # Per-environment request rates and endpoint timings are not public:
+    # without METRICS_TOKEN the endpoint only exists in DEBUG.
+    if not settings.METRICS_ENABLED or not (settings.METRICS_TOKEN or settings.DEBUG):
+        raise Http404()
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get("Authorization", ""), expected):
+            return HttpResponse("Unauthorized\n", status=401, content_type="text/plain")
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("api/health/", health),
+    path("metrics", metrics_view, name="metrics"),
+    path("api/health/", health, name="health"),
     path("api/auth/", include("apps.accounts.urls")),
     path("api/", include("apps.core.urls")),
     path("api/", include("apps.flags.urls")),
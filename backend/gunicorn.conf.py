@@ -0,0 +1,22 @@
+"""
+gunicorn settings, read from the working directory (run gunicorn from
+backend/). With --preload the app, warm-up included (apps.flags.warmup), is
+loaded in the master before the workers are forked: these hooks keep the
+master's DB connections out of the workers. Without --preload the app is not
+loaded in the master and they do nothing.
+"""
+from django.apps import apps as django_apps
+
+
+def pre_fork(server, worker):
+    if django_apps.ready:
+        from apps.flags.warmup import before_fork
+
+        before_fork()
+
+
+def post_fork(server, worker):
+    if django_apps.ready:
+        from apps.flags.warmup import after_fork
+
+        after_fork()
@@ -39,18 +39,53 @@ const FIELD_OPTIONS = [
   { value: "segment", label: "Segment" },
 ];
 
+// Must match apps.flags.eval.OPERATORS on the backend.
 const OP_OPTIONS = [
   { value: "equals", label: "equals" },
-  { value: "not_equals", label: "not equals" },
-  { value: "contains", label: "contains" },
-  { value: "starts_with", label: "starts with" },
-  { value: "ends_with", label: "ends with" },
+  { value: "contains", label: "contains (any of, comma list)" },
   { value: "in", label: "in (comma list)" },
-  { value: "not_in", label: "not in (comma list)" },
+  { value: "in_segment", label: "in segment (segment keys)" },
+  { value: "starts_with", label: "starts with (any of, comma list)" },
+  { value: "ends_with", label: "ends with (any of, comma list)" },
+  { value: "matches", label: "matches regex" },
+  { value: "lt", label: "< (number)" },
+  { value: "lte", label: "≤ (number)" },
+  { value: "gt", label: "> (number)" },
+  { value: "gte", label: "≥ (number)" },
+  { value: "semver_eq", label: "version = (comma list)" },
+  { value: "semver_lt", label: "version <" },
+  { value: "semver_lte", label: "version ≤" },
+  { value: "semver_gt", label: "version >" },
+  { value: "semver_gte", label: "version ≥" },
+  { value: "date_before", label: "date before (ISO 8601)" },
+  { value: "date_after", label: "date after (ISO 8601)" },
 ];
 
+const LIST_OPS = ["in", "contains", "in_segment", "starts_with", "ends_with", "semver_eq"];
+const NUMBER_OPS = ["lt", "lte", "gt", "gte"];
+
+const PLACEHOLDERS: Record<string, string> = {
+  in: "e.g. US, CA, IN",
+  contains: "e.g. @acme.com",
+  in_segment: "e.g. beta-testers",
+  starts_with: "e.g. admin_",
+  ends_with: "e.g. @acme.com",
+  matches: "e.g. ^user_[0-9]+$",
+  lt: "e.g. 18",
+  lte: "e.g. 18",
+  gt: "e.g. 100",
+  gte: "e.g. 100",
+  semver_eq: "e.g. 2.1.0, 2.1.1",
+  semver_lt: "e.g. 2.0.0",
+  semver_lte: "e.g. 2.0.0",
+  semver_gt: "e.g. 1.4.0",
+  semver_gte: "e.g. 1.4.0",
+  date_before: "e.g. 2026-01-01T00:00:00Z",
+  date_after: "e.g. 2026-01-01",
+};
+
 function normalizeClauseValue(op: string, raw: string) {
-  if (op === "in" || op === "not_in") {
+  if (LIST_OPS.includes(op)) {
     return raw
       .split(",")
       .map((s) => s.trim())
@@ -65,6 +100,26 @@ function toTextValue(val: any) {
   return String(val);
 }
 
+// Backend clause shape is { attr, op, values: [...] }.
+function toApiClause(c: Clause) {
+  let values = Array.isArray(c.value) ? c.value : [c.value];
+  if (NUMBER_OPS.includes(c.op)) {
+    // numeric operators compare numbers only; keep unparsable input so the backend reports it
+    values = values.map((v) => (String(v).trim() !== "" && !isNaN(Number(v)) ? Number(v) : v));
+  }
+  return { attr: c.field, op: c.op, values };
+}
+
+function fromApiClause(c: any): Clause {
+  const op = c?.op ?? "equals";
+  const values = Array.isArray(c?.values) ? c.values : c?.value !== undefined ? [c.value] : [];
+  return {
+    field: c?.attr ?? c?.field ?? "key",
+    op,
+    value: LIST_OPS.includes(op) ? values : values[0] ?? "",
+  };
+}
+
 export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChanged }: Props) {
   const [loading, setLoading] = useState(false);
   const [rules, setRules] = useState<Rule[]>([]);
@@ -75,7 +130,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
   const [priority, setPriority] = useState<number>(1);
   const [rollout, setRollout] = useState<number>(100);
   const [variationValue, setVariationValue] = useState<"true" | "false">("true");
-  const [clauses, setClauses] = useState<Clause[]>([{ field: "key", op: "starts_with", value: "vip_" }]);
+  const [clauses, setClauses] = useState<Clause[]>([{ field: "key", op: "in", value: ["vip_1"] }]);
 
   // ✅ delete modal state
   const [deleteTarget, setDeleteTarget] = useState<Rule | null>(null);
@@ -115,7 +170,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
     setPriority(1);
     setRollout(100);
     setVariationValue("true");
-    setClauses([{ field: "key", op: "starts_with", value: "vip_" }]);
+    setClauses([{ field: "key", op: "in", value: ["vip_1"] }]);
   }
 
   function startEdit(rule: Rule) {
@@ -125,11 +180,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
     setVariationValue((rule.variation?.value ? "true" : "false") as any);
 
     const cs = Array.isArray(rule.clauses) ? rule.clauses : [];
-    const mapped: Clause[] = cs.map((c: any) => ({
-      field: c?.field ?? "key",
-      op: c?.op ?? "equals",
-      value: c?.value ?? "",
-    }));
+    const mapped: Clause[] = cs.map(fromApiClause);
     setClauses(mapped.length ? mapped : [{ field: "key", op: "equals", value: "" }]);
   }
 
@@ -154,11 +205,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
       priority: Number(priority),
       rollout_percentage: Number(rollout),
       variation: { value: variationValue === "true" },
-      clauses: clauses.map((c) => ({
-        field: c.field,
-        op: c.op,
-        value: c.value,
-      })),
+      clauses: clauses.map(toApiClause),
     };
 
     try {
@@ -330,7 +377,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
                 <div className="mt-4">
                   <div className="text-sm font-semibold text-white">Clauses</div>
                   <div className="text-xs text-slate-500 mt-1">
-                    Clauses are AND-ed. Use <span className="text-slate-200">in</span> / <span className="text-slate-200">not_in</span> with comma-separated values.
+                    Clauses are AND-ed. Use <span className="text-slate-200">in</span> / <span className="text-slate-200">contains</span> with comma-separated values.
                   </div>
 
                   <div className="mt-3 space-y-3">
@@ -373,7 +420,7 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
                         <div className="md:col-span-5">
                           <Input
                             label="Value"
-                            placeholder={c.op === "in" || c.op === "not_in" ? "e.g. US, CA, IN" : "e.g. vip_"}
+                            placeholder={PLACEHOLDERS[c.op] ?? "e.g. vip_1"}
                             value={toTextValue(c.value)}
                             onChange={(e) => {
                               const raw = e.target.value;
@@ -429,13 +476,11 @@ export function RulesDrawer({ open, onClose, stateId, flagName, envLabel, onChan
                         </div>
 
                         <div className="mt-2 text-xs text-slate-400 space-y-1">
-                          {(Array.isArray(r.clauses) ? r.clauses : []).map((c: any, idx: number) => (
+                          {(Array.isArray(r.clauses) ? r.clauses : []).map(fromApiClause).map((c, idx) => (
                             <div key={idx} className="truncate">
                               <span className="text-slate-200">{c.field}</span>{" "}
                               <span className="text-slate-500">{c.op}</span>{" "}
-                              <span className="text-slate-300">
-                                {Array.isArray(c.value) ? c.value.join(", ") : String(c.value)}
-                              </span>
+                              <span className="text-slate-300">{toTextValue(c.value)}</span>
                             </div>
                           ))}
                         </div>
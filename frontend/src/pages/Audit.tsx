@@ -2,23 +2,40 @@ import React, { useEffect, useState } from "react";
 import api from "../api/client";
 import { Card } from "../components/Card";
 import { Badge } from "../components/Badge";
+import { Button } from "../components/Button";
 import { Activity } from "lucide-react";
 
 type Audit = { id: number; action: string; metadata: any; created_at: string; actor_email?: string; actor_full_name?: string };
 
 export function Audit() {
   const [items, setItems] = useState<Audit[]>([]);
+  const [next, setNext] = useState<string | null>(null);
+  const [loading, setLoading] = useState(false);
 
   useEffect(() => {
     (async () => {
       const o = await api.get("/orgs/");
       if (o.data?.[0]?.id) {
         const a = await api.get("/audit/", { params: { org_id: o.data[0].id } });
-        setItems(a.data);
+        setItems(a.data.results);
+        setNext(a.data.next);
       }
     })();
   }, []);
 
+  async function loadMore() {
+    if (!next) return;
+    setLoading(true);
+    try {
+      // `next` is an absolute URL carrying the keyset cursor
+      const a = await api.get(next);
+      setItems((prev) => [...prev, ...a.data.results]);
+      setNext(a.data.next);
+    } finally {
+      setLoading(false);
+    }
+  }
+
   return (
     <div className="space-y-6">
       <div className="flex items-start justify-between gap-4">
@@ -40,7 +57,7 @@ export function Audit() {
           <div className="divide-y divide-slate-900">
             {items.length === 0 ? (
               <div className="px-4 py-6 text-sm text-slate-500">No audit events yet.</div>
-            ) : items.slice(0, 100).map((a) => (
+            ) : items.map((a) => (
               <div key={a.id} className="grid grid-cols-12 items-start px-4 py-4 bg-slate-950/30 gap-3">
                 <div className="col-span-3">
                   <div className="text-sm font-medium">{a.actor_full_name || "System"}</div>
@@ -53,6 +70,13 @@ export function Audit() {
             ))}
           </div>
         </div>
+        {next && (
+          <div className="mt-4 flex justify-center">
+            <Button variant="ghost" onClick={loadMore} disabled={loading}>
+              {loading ? "Loading…" : "Load more"}
+            </Button>
+          </div>
+        )}
       </Card>
     </div>
   );
@@ -0,0 +1,4 @@
+from flagship_sdk.client import FlagshipClient, FlagshipError
+from flagship_sdk.evaluator import Ruleset
+
+__all__ = ["FlagshipClient", "FlagshipError", "Ruleset"]
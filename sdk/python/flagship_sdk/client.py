@@ -0,0 +1,110 @@
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+
+from flagship_sdk.evaluator import Ruleset
+
+log = logging.getLogger("flagship_sdk")
+
+
+class FlagshipError(Exception):
+    pass
+
+
+class FlagshipClient:
+    """
+    Server-side client that evaluates flags locally.
+
+    The environment ruleset is downloaded from /api/sdk/ruleset/ with the
+    environment's server key, then refreshed by a daemon thread every
+    `refresh_interval` seconds (a 304 when nothing changed). Evaluation never
+    touches the network: it reads the current Ruleset, which is swapped in
+    atomically on refresh.
+
+        client = FlagshipClient("s_...", base_url="https://flags.example.com")
+        if client.variation("new_checkout", {"key": "user_123"}, False):
+            ...
+    """
+
+    def __init__(self, server_key, base_url="http://localhost:8000", refresh_interval=30.0,
+                 timeout=5.0, start=True):
+        self.server_key = server_key
+        self.base_url = base_url.rstrip("/")
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._ruleset = None
+        self._etag = None
+        self._stop = threading.Event()
+        self._thread = None
+        if start:
+            self.refresh()
+            self._thread = threading.Thread(target=self._run, name="flagship-refresh", daemon=True)
+            self._thread.start()
+
+    @property
+    def ruleset(self):
+        return self._ruleset
+
+    @property
+    def ready(self):
+        return self._ruleset is not None
+
+    def refresh(self):
+        """Fetch the ruleset now. Returns True if a new version was loaded."""
+        req = urllib.request.Request(
+            f"{self.base_url}/api/sdk/ruleset/",
+            headers={"X-Server-Key": self.server_key, "Accept": "application/json"},
+        )
+        if self._etag:
+            req.add_header("If-None-Match", self._etag)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = json.load(resp)
+                etag = resp.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return False
+            raise FlagshipError(f"ruleset download failed: HTTP {e.code}") from e
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            raise FlagshipError(f"ruleset download failed: {e}") from e
+        self.load(payload)
+        self._etag = etag
+        return True
+
+    def load(self, payload):
+        """Install a ruleset payload (e.g. from a file for offline use)."""
+        self._ruleset = Ruleset(payload)
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except FlagshipError as e:
+                # Keep serving the last good ruleset.
+                log.warning("%s", e)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout)
+
+    def evaluate(self, flag_key, user):
+        """Server-identical result dict ({"value", "reason", "variation"}) or None."""
+        rs = self._ruleset
+        if rs is None:
+            return None
+        return rs.evaluate(flag_key, user)
+
+    def evaluate_all(self, user):
+        rs = self._ruleset
+        if rs is None:
+            return {}
+        return rs.evaluate_all(user)
+
+    def variation(self, flag_key, user, default=None):
+        result = self.evaluate(flag_key, user)
+        if result is None:
+            return default
+        return result["value"]
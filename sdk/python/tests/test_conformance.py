@@ -0,0 +1,36 @@
+import json
+import pathlib
+import unittest
+
+from flagship_sdk import FlagshipClient, Ruleset
+
+CORPUS = pathlib.Path(__file__).resolve().parents[2] / "conformance" / "cases.json"
+
+
+class ConformanceTests(unittest.TestCase):
+    """Local evaluation must reproduce the server results recorded in the shared corpus."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cases = json.loads(CORPUS.read_text(encoding="utf-8"))["cases"]
+
+    def test_evaluate_all(self):
+        for case in self.cases:
+            ruleset = Ruleset(case["ruleset"])
+            for expected in case["results"]:
+                with self.subTest(case=case["name"], user=expected["user"]):
+                    self.assertEqual(ruleset.evaluate_all(expected["user"]), expected["flags"])
+
+    def test_single_flag_and_variation(self):
+        client = FlagshipClient("s_test", start=False)
+        self.assertEqual(client.variation("anything", {"key": "u"}, "fallback"), "fallback")
+        for case in self.cases:
+            client.load(case["ruleset"])
+            for expected in case["results"]:
+                for flag_key, result in expected["flags"].items():
+                    self.assertEqual(client.evaluate(flag_key, expected["user"]), result)
+                    self.assertEqual(client.variation(flag_key, expected["user"]), result["value"])
+
+
+if __name__ == "__main__":
+    unittest.main()